@@ -0,0 +1,69 @@
+// Swaps the contact list in place when a pagination, sort or A–Z link is
+// clicked.
+// Only the table and the pagination block are requested (X-Fragment),
+// and the next page is prefetched so the following click is instant.
+(() => {
+  const container = document.getElementById('contact-list');
+  if (!container || !window.fetch) {
+    return;
+  }
+
+  const fragments = new Map();
+
+  const fetchFragment = (url) => {
+    if (!fragments.has(url)) {
+      const request = fetch(url, {
+        headers: { 'X-Fragment': '1' },
+        credentials: 'same-origin',
+      })
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(response.status);
+          }
+          return response.text();
+        })
+        .catch((error) => {
+          fragments.delete(url);
+          throw error;
+        });
+      fragments.set(url, request);
+    }
+    return fragments.get(url);
+  };
+
+  const prefetchNext = () => {
+    const next = container.querySelector('.pagination a[rel="next"]');
+    if (next) {
+      fetchFragment(next.href).catch(() => {});
+    }
+  };
+
+  const show = (url, push) =>
+    fetchFragment(url)
+      .then((html) => {
+        container.innerHTML = html;
+        if (push) {
+          window.history.pushState({}, '', url);
+        }
+        prefetchNext();
+      })
+      .catch(() => {
+        window.location.href = url;
+      });
+
+  container.addEventListener('click', (event) => {
+    const link = event.target.closest('.pagination a, .table-sort, .jump-bar a');
+    if (!link || event.ctrlKey || event.metaKey || event.shiftKey) {
+      return;
+    }
+    event.preventDefault();
+    show(link.href, true);
+  });
+
+  window.addEventListener('popstate', () => show(window.location.href, false));
+
+  // Live updates (live.js) make the fetched pages stale
+  container.addEventListener('contacts:changed', () => fragments.clear());
+
+  prefetchNext();
+})();
@@ -0,0 +1,81 @@
+// Keeps the contact list up to date with the server-sent events of
+// contact.events: changed rows are updated in place, deleted (or hidden)
+// ones removed, and new contacts prepended on the first page of the
+// default listing.
+// After a "resync" (the stream fell behind) the list is reloaded once.
+(() => {
+  const container = document.getElementById('contact-list');
+  if (!container || !window.EventSource || !container.dataset.eventsUrl) {
+    return;
+  }
+
+  const COLUMNS = ['first_name', 'last_name', 'phone', 'email'];
+  const PAGE_SIZE = 10;
+
+  const changed = () => container.dispatchEvent(new CustomEvent('contacts:changed'));
+
+  const findRow = (id) => container.querySelector(`tr[data-contact-id="${id}"]`);
+
+  const fillRow = (row, contact) => {
+    const cells = row.querySelectorAll('td');
+    COLUMNS.forEach((column, index) => {
+      cells[index + 1].textContent = contact[column];
+    });
+  };
+
+  const buildRow = (contact) => {
+    const row = document.createElement('tr');
+    row.className = 'table-row';
+    row.dataset.contactId = contact.id;
+
+    const link = document.createElement('a');
+    link.className = 'table-link';
+    link.href = `${container.dataset.detailPrefix}${contact.id}${container.dataset.detailSuffix}`;
+    link.textContent = contact.id;
+
+    [link, ...COLUMNS].forEach(() => {
+      const cell = document.createElement('td');
+      cell.className = 'table-cel';
+      row.appendChild(cell);
+    });
+    row.firstChild.appendChild(link);
+    fillRow(row, contact);
+    return row;
+  };
+
+  const apply = (contact) => {
+    const row = findRow(contact.id);
+    if (contact.action === 'deleted') {
+      if (row) {
+        row.remove();
+      }
+    } else if (row) {
+      fillRow(row, contact);
+    } else if (contact.action === 'created') {
+      const body = container.querySelector('tbody[data-live-prepend]');
+      if (body) {
+        body.prepend(buildRow(contact));
+        while (body.rows.length > PAGE_SIZE) {
+          body.lastElementChild.remove();
+        }
+      }
+    }
+    changed();
+  };
+
+  const reload = () =>
+    fetch(window.location.href, {
+      headers: { 'X-Fragment': '1' },
+      credentials: 'same-origin',
+    })
+      .then((response) => (response.ok ? response.text() : Promise.reject(response.status)))
+      .then((html) => {
+        container.innerHTML = html;
+        changed();
+      })
+      .catch(() => {});
+
+  const source = new EventSource(container.dataset.eventsUrl);
+  source.addEventListener('contact', (event) => apply(JSON.parse(event.data)));
+  source.addEventListener('resync', reload);
+})();
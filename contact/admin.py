@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models import Q
 from contact import models
+from contact.paginators import EstimatedCountPaginator
 
 # Register your models here.
 
@@ -8,9 +10,17 @@ class ContactAdmin(admin.ModelAdmin):
     """
     Admin panel configuration for Contact model.
 
-    - Displays key contact details in the admin list view.
-    - Enables ordering by ID.
-    - Allows searching by ID, first name, and last name.
+    Tuned for very large tables:
+
+    - Displays key contact details, with owner and category loaded in the
+      same query (list_select_related).
+    - Orders by descending ID, which walks the primary key index.
+    - Searches by exact ID or by first/last name prefix, answered with
+      index range scans (see get_search_results).
+    - Uses an estimated count instead of COUNT(*) and never counts the
+      unfiltered table a second time.
+    - Uses autocomplete widgets for owner and category, and only filters
+      by small, bounded columns.
     """
 
     list_display = (
@@ -19,10 +29,42 @@ class ContactAdmin(admin.ModelAdmin):
         'last_name',
         'phone',
         'email',
+        'owner',
+        'category',
         )
     ordering = (
-        'id',)
-    search_fields = ('id', 'first_name', 'last_name',)
+        '-id',)
+    search_fields = ('=id', '^first_name', '^last_name',)
+    search_help_text = 'ID or the beginning of the first or last name.'
+    list_select_related = ('owner', 'category',)
+    list_filter = ('show', 'category',)
+    autocomplete_fields = ('owner', 'category',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches by ID or name prefix using index range scans.
+
+        ``istartswith`` becomes ``UPPER(...) LIKE`` and cannot use the name
+        indexes, so the prefix is matched as ``name >= term AND name <
+        term + U+10FFFF`` for the usual capitalizations of the term.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+
+        condition = Q()
+        for variant in {term, term.lower(), term.capitalize(), term.title()}:
+            for field in ('first_name', 'last_name'):
+                condition |= Q(**{
+                    f'{field}__gte': variant,
+                    f'{field}__lt': variant + '\U0010ffff',
+                })
+        return queryset.filter(condition), False
 
 @admin.register(models.Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -31,7 +73,34 @@ class CategoryAdmin(admin.ModelAdmin):
 
     - Displays the category name in the admin list view.
     - Enables ordering by ID.
+    - Allows searching by name (used by the Contact autocomplete).
     """
      
     list_display = ('name',)
-    ordering = ('id',)
\ No newline at end of file
+    ordering = ('id',)
+    search_fields = ('name',)
+
+
+@admin.register(models.AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the audit log.
+
+    - Filters by month (the indexed partition key) and action.
+    - Searches by exact target id.
+    - Never counts the whole table.
+    """
+
+    list_display = ('created_date', 'actor', 'action', 'target_type', 'target_id', 'changes')
+    list_filter = ('month', 'action', 'target_type')
+    list_select_related = ('actor',)
+    search_fields = ('=target_id',)
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
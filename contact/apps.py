@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ContactConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'contact'
+
+    def ready(self):
+        # Connect the signal receivers and register the system checks
+        from contact import checks, signals  # noqa: F401
@@ -0,0 +1,192 @@
+"""
+Field-level audit of the contact and profile forms.
+
+Views call `audit_form` after a successful ``form.save()`` (and
+`audit_deletion` before deleting a contact); the diff is computed from
+the form, queued in memory and written by `AuditWriter` in ``bulk_create``
+batches from a background thread (see `contact.buffers`), so auditing
+adds no query to the request.
+
+Audit entries must not be lost to a failed write: a batch whose insert
+fails is retried one entry at a time, and the entries that still fail
+(a locked or unreachable database) go back to the queue for the next
+flush. Values are made JSON-safe when queued, so a single odd value
+cannot poison a batch.
+
+Entries are kept in memory until written: the ones still queued when a
+process is killed with ``SIGKILL`` (or crashes, or is stopped by the OOM
+killer) are lost. A normal exit flushes them (a single attempt).
+"""
+
+import datetime
+import decimal
+import json
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, transaction
+from django.db.models.fields.files import FieldFile
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from contact.buffers import BackgroundFlusher
+from contact.models import AuditEntry
+
+logger = logging.getLogger('contact.audit')
+
+# Form fields recorded as changed, never with their values
+SECRET_FIELDS = {'password', 'password1', 'password2'}
+
+# Fields of a deleted contact kept in its last entry
+DELETED_FIELDS = ('first_name', 'last_name', 'phone', 'email', 'description', 'category', 'picture')
+
+
+def audit_value(value):
+    """Turns a form or model value into its JSON form."""
+    if isinstance(value, models.Model):
+        return value.pk
+    if isinstance(value, FieldFile):
+        return value.name or None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def form_changes(form):
+    """
+    The ``{"field": [old, new]}`` diff of a bound, valid form.
+
+    Only ``form.changed_data`` is looked at; the old values are the form's
+    initial data, taken from the instance before it was saved, and the new
+    ones are read from the saved instance.
+    """
+    model_fields = {field.name for field in form.instance._meta.concrete_fields}
+    changes = {}
+    for name in form.changed_data:
+        if name in SECRET_FIELDS:
+            changes['password'] = None
+            continue
+        old = form.initial.get(name)
+        if name in model_fields:
+            # The saved value: the stored picture name, the category id
+            new = form.instance.serializable_value(name)
+        else:
+            new = form.cleaned_data.get(name)
+        if old is None and new in ('', None):
+            continue
+        changes[name] = [audit_value(old), audit_value(new)]
+    return changes
+
+
+def month_of(moment):
+    moment = timezone.localtime(moment)
+    return moment.year * 100 + moment.month
+
+
+class AuditWriter(BackgroundFlusher):
+    """
+    Queues audit entries and inserts them in batches.
+
+    A failed batch is written again one entry at a time; entries that
+    still fail are put back at the head of the queue and the write
+    raises, so the flusher logs it and retries after its interval.
+    """
+
+    name = 'audit writer'
+    batch_size = 500
+
+    def reset(self):
+        self.entries = []
+
+    def take(self):
+        return self.entries
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            self.added()
+
+    def requeue(self, entries):
+        with self.lock:
+            self.entries[:0] = entries
+            self.pending += len(entries)
+
+    def write(self, entries):
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                AuditEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+            return
+        except Exception:
+            logger.warning('Inserting %d audit entries failed, writing them one by one',
+                           len(entries), exc_info=True)
+
+        failed = [entry for entry in entries if not self.write_one(entry)]
+        if failed:
+            self.requeue(failed)
+            raise RuntimeError(f'{len(failed)} audit entries could not be written, requeued.')
+
+    @classmethod
+    def write_one(cls, entry):
+        """Inserts a single entry; returns whether it was written."""
+        # A rolled back bulk insert may have given it an id
+        entry.pk = None
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                entry.save(force_insert=True)
+        except IntegrityError:
+            if entry.actor_id is None:
+                return False
+            # The actor was deleted meanwhile: SET_NULL, like the foreign key
+            entry.actor_id = None
+            return cls.write_one(entry)
+        except Exception:
+            return False
+        return True
+
+
+audit_writer = AuditWriter(
+    interval=getattr(settings, 'BUFFER_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'BUFFER_MAX_PENDING', 10000),
+)
+
+
+def audit(actor, action, target, changes):
+    """
+    Queues an audit entry.
+
+    Args:
+        actor (User): Who made the change.
+        action (str): ``create``, ``update`` or ``delete``.
+        target (Model): The contact or user changed.
+        changes (dict): The field diff; an empty update is not recorded.
+    """
+    if action == 'update' and not changes:
+        return
+    # Anything JSON cannot store becomes its text now, not a failed batch later
+    changes = json.loads(json.dumps(changes, default=str))
+    now = timezone.now()
+    audit_writer.add(AuditEntry(
+        created_date=now,
+        month=month_of(now),
+        actor_id=actor.pk if actor is not None and actor.is_authenticated else None,
+        action=action,
+        target_type=target._meta.model_name,
+        target_id=target.pk,
+        changes=changes,
+    ))
+
+
+def audit_form(actor, action, form):
+    """Queues the diff of a saved ModelForm (its instance is the target)."""
+    audit(actor, action, form.instance, form_changes(form))
+
+
+def audit_deletion(actor, instance):
+    """Queues the deletion of a contact, with its last values."""
+    values = model_to_dict(instance, fields=DELETED_FIELDS)
+    audit(actor, 'delete', instance, {
+        name: [audit_value(value), None]
+        for name, value in values.items() if value not in ('', None)
+    })
@@ -0,0 +1,214 @@
+"""
+Online backfills for data migrations on big tables.
+
+A schema change that needs the existing rows filled in (a derived column,
+a normalized copy of a field...) ships in two steps:
+
+1. The migration adds the column (nullable or with a constant default,
+   which is a metadata-only change) and declares the data change with the
+   `Backfill` operation. On small tables the rows are updated right away;
+   on big ones only a checkpoint is recorded and the migration returns.
+2. ``manage.py backfill`` updates the rows in short primary key ranges,
+   one transaction per batch with a pause between batches, so row locks
+   are held for milliseconds while the site keeps serving. Progress is
+   checkpointed in `BackfillCheckpoint` with every batch, so an
+   interrupted run resumes where it stopped, and the remaining range can
+   be split across parallel workers.
+
+Example::
+
+    operations = [
+        migrations.AddField(
+            'contact', 'phone_digits',
+            models.CharField(max_length=50, blank=True, default=''),
+        ),
+        Backfill(
+            'contact_phone_digits', 'contact',
+            updates={'phone_digits': Replace(F('phone'), Value(' '), Value(''))},
+        ),
+    ]
+
+The backfill covers the rows that existed when the migration ran: the code
+deployed with it must fill the column for the rows it writes.
+"""
+
+import time
+
+from django.db import router, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations.base import Operation
+from django.db.models import Max, Min
+
+from contact.caching import bump_snapshot_epoch
+
+# Tables spanning fewer primary keys than this are filled during migrate
+INLINE_ROWS = 10_000
+
+# Ranges are not split below this many primary keys per worker
+MIN_SPLIT_SPAN = 1_000
+
+
+class Backfill(Operation):
+    """
+    Migration operation that schedules a batched update of existing rows.
+
+    Args:
+        name (str): Unique name, used by ``manage.py backfill``.
+        model_name (str): Model of the migration's app to update.
+        updates (dict): ``QuerySet.update()`` keyword arguments (values or
+            expressions such as ``F()`` and database functions).
+        condition (Q | None): Only update the rows matching it.
+        inline_rows (int): Fill tables spanning fewer primary keys than
+            this during the migration itself.
+    """
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, name, model_name, updates, condition=None, inline_rows=INLINE_ROWS):
+        self.name = name
+        self.model_name = model_name
+        self.updates = updates
+        self.condition = condition
+        self.inline_rows = inline_rows
+
+    def state_forwards(self, app_label, state):
+        # Data only, the schema is unchanged
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        alias = schema_editor.connection.alias
+        if not router.allow_migrate_model(alias, model):
+            return
+
+        checkpoints = to_state.apps.get_model('contact', 'BackfillCheckpoint')
+        checkpoints.objects.using(alias).filter(name=self.name).delete()
+
+        bounds = model._base_manager.using(alias).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            # Empty table, nothing to fill
+            return
+
+        checkpoint = checkpoints.objects.using(alias).create(
+            name=self.name,
+            start=bounds['low'],
+            end=bounds['high'] + 1,
+            position=bounds['low'],
+        )
+        if checkpoint.end - checkpoint.start <= self.inline_rows:
+            run_range(self, model, checkpoint, using=alias)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # The updated rows are left as they are; only the progress is dropped
+        checkpoints = from_state.apps.get_model('contact', 'BackfillCheckpoint')
+        checkpoints.objects.using(schema_editor.connection.alias) \
+            .filter(name=self.name).delete()
+
+    def describe(self):
+        return f'Backfill {self.name} on {self.model_name}'
+
+    @property
+    def migration_name_fragment(self):
+        return f'backfill_{self.name}'
+
+    def apply(self, queryset):
+        """Updates the rows of one batch and returns how many were updated."""
+        if self.condition is not None:
+            queryset = queryset.filter(self.condition)
+        return queryset.update(**self.updates)
+
+
+def find_backfills():
+    """
+    Collects the `Backfill` operations declared in the migration files.
+
+    Returns:
+        dict: ``{name: (app_label, operation)}``.
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    backfills = {}
+    for (app_label, _), migration in loader.disk_migrations.items():
+        for operation in migration.operations:
+            if isinstance(operation, Backfill):
+                backfills[operation.name] = (app_label, operation)
+    return backfills
+
+
+def split_ranges(checkpoints, name, workers, using='default'):
+    """
+    Splits the unfinished ranges of a backfill until there is one per worker.
+
+    The range with the most primary keys left is halved each time; its
+    checkpoint keeps the first half and a new one takes the second.
+
+    Returns:
+        list: The unfinished checkpoints.
+    """
+    with transaction.atomic(using=using):
+        pending = list(
+            checkpoints.objects.using(using)
+            .select_for_update()
+            .filter(name=name, completed=False)
+            .order_by('start')
+        )
+        while pending and len(pending) < workers:
+            largest = max(pending, key=lambda checkpoint: checkpoint.end - checkpoint.position)
+            remaining = largest.end - largest.position
+            if remaining < 2 * MIN_SPLIT_SPAN:
+                break
+
+            middle = largest.position + remaining // 2
+            pending.append(checkpoints.objects.using(using).create(
+                name=name, start=middle, end=largest.end, position=middle,
+            ))
+            largest.end = middle
+            largest.save(using=using, update_fields=['end', 'updated_date'])
+    return pending
+
+
+def run_range(backfill, model, checkpoint, batch_size=1000, sleep=0.0,
+              using='default', progress=None, stop=None):
+    """
+    Processes a checkpointed range, one primary key batch at a time.
+
+    Each batch and the checkpoint advancing past it are committed together,
+    so a crash never skips nor repeats a batch.
+
+    Args:
+        backfill (Backfill): What to update.
+        model (Model): The model class to update.
+        checkpoint (BackfillCheckpoint): The range and its progress.
+        batch_size (int): Primary keys per batch (fewer rows on sparse ids).
+        sleep (float): Seconds to wait between batches.
+        using (str): Database alias.
+        progress (callable | None): Called with the checkpoint and the rows
+            updated after every batch.
+        stop (threading.Event | None): Stops after the current batch when set.
+    """
+    manager = model._base_manager.db_manager(using)
+
+    while checkpoint.position < checkpoint.end:
+        if stop is not None and stop.is_set():
+            return
+
+        batch_end = min(checkpoint.position + batch_size, checkpoint.end)
+        with transaction.atomic(using=using):
+            rows = backfill.apply(
+                manager.filter(pk__gte=checkpoint.position, pk__lt=batch_end)
+            )
+            checkpoint.position = batch_end
+            checkpoint.rows += rows
+            checkpoint.completed = batch_end >= checkpoint.end
+            checkpoint.save(
+                using=using,
+                update_fields=['position', 'rows', 'completed', 'updated_date'],
+            )
+
+        if rows and model._meta.label_lower == 'contact.contact':
+            # update() leaves updated_date alone: rebuild the listing in full
+            bump_snapshot_epoch()
+        if progress is not None:
+            progress(checkpoint, rows)
+        if sleep and not checkpoint.completed:
+            time.sleep(sleep)
@@ -0,0 +1,408 @@
+"""
+Online, incremental backups of the database.
+
+SQLite
+------
+
+The live database is first copied with SQLite's online backup API, a few
+pages at a time with a pause in between, so writers are only blocked for
+the duration of one step. The copy is checked with ``PRAGMA
+integrity_check`` and written out as gzip members of contiguous pages,
+compressed in parallel and streamed to the output file. Concatenated gzip
+members are a valid gzip file: ``gunzip < full.gz > db.sqlite3`` restores
+a full backup without Django.
+
+Every backup writes two companion files:
+
+- ``<backup>.json``, the manifest: page size and count, SHA-256 of the
+  database, the parent backup and the offset of every chunk;
+- ``<backup>.pages``, an 8-byte digest of every page.
+
+An incremental backup compares the page digests of a new copy with those
+of its parent and only stores the pages that changed, so a chain is
+``full <- incremental <- incremental...``. Restoring decompresses and
+writes the chunks of each backup of the chain in parallel (``pwrite`` at
+the page offset), truncates to the final page count and verifies the
+SHA-256 and the integrity of the result before it replaces the database.
+
+PostgreSQL
+----------
+
+``pg_dump`` in directory format with parallel jobs, and ``pg_restore`` with
+the same number of jobs.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.utils import timezone
+
+FORMAT_VERSION = 1
+
+# Size of the page digests stored in the .pages file
+PAGE_DIGEST_SIZE = 8
+
+# Uncompressed size of one chunk (one gzip member)
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class BackupError(Exception):
+    """A backup cannot be made, read or verified."""
+
+
+def manifest_path(path):
+    return Path(f'{path}.json')
+
+
+def pages_path(path):
+    return Path(f'{path}.pages')
+
+
+def load_manifest(path):
+    try:
+        with open(manifest_path(path)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError) as error:
+        raise BackupError(f'Cannot read the manifest of {path}: {error}')
+
+
+def bounded_map(pool, function, items, window):
+    """
+    Like ``pool.map``, but never more than ``window`` items in flight, so
+    a multi-gigabyte database is not read into memory at once.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# SQLite
+
+def snapshot_sqlite(source, target, pages=1024, sleep=0.05, progress=None):
+    """
+    Copies a live SQLite database with the online backup API.
+
+    Args:
+        source (Path): The database file.
+        target (Path): Where to write the copy.
+        pages (int): Pages copied per step.
+        sleep (float): Seconds between steps, when writers can proceed.
+        progress (callable | None): Called with ``(status, remaining, total)``.
+    """
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(target)
+    try:
+        source_db.backup(target_db, pages=pages, sleep=sleep, progress=progress)
+    finally:
+        target_db.close()
+        source_db.close()
+
+
+def integrity_errors(path):
+    """Returns the problems reported by ``PRAGMA integrity_check``."""
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = db.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        db.close()
+    return [row[0] for row in rows if row[0] != 'ok']
+
+
+def page_layout(path):
+    """Returns the page size and page count of an SQLite file."""
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        page_size = db.execute('PRAGMA page_size').fetchone()[0]
+        page_count = db.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        db.close()
+    return page_size, page_count
+
+
+def hash_pages(path, page_size):
+    """
+    Reads a database once, digesting every page and the whole file.
+
+    Returns:
+        tuple: The concatenated page digests and the file's SHA-256.
+    """
+    digests = bytearray()
+    whole = hashlib.sha256()
+    with open(path, 'rb') as db:
+        while block := db.read(page_size * 1024):
+            whole.update(block)
+            for start in range(0, len(block), page_size):
+                digests += hashlib.blake2b(
+                    block[start:start + page_size], digest_size=PAGE_DIGEST_SIZE
+                ).digest()
+    return bytes(digests), whole.hexdigest()
+
+
+def changed_runs(old_digests, new_digests, max_pages):
+    """
+    Yields ``(first_page, count)`` runs of pages that differ from the parent
+    backup (0-based page numbers), at most ``max_pages`` long.
+    """
+    size = PAGE_DIGEST_SIZE
+    first = None
+    for page in range(len(new_digests) // size):
+        digest = new_digests[page * size:(page + 1) * size]
+        changed = digest != old_digests[page * size:(page + 1) * size]
+        if changed and first is None:
+            first = page
+        if first is not None and (not changed or page - first == max_pages):
+            yield first, page - first
+            first = page if changed else None
+    if first is not None:
+        yield first, len(new_digests) // size - first
+
+
+def write_chunks(snapshot, output, runs, page_size, level=6, workers=1):
+    """
+    Compresses runs of pages in parallel and streams them, in order, to
+    the output file.
+
+    Returns:
+        list[dict]: The manifest entry of every chunk.
+    """
+    chunks = []
+    with open(snapshot, 'rb') as db, open(output, 'wb') as out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def compress(run):
+            first, count = run
+            data = os.pread(db.fileno(), count * page_size, first * page_size)
+            return run, gzip.compress(data, compresslevel=level, mtime=0)
+
+        for (first, count), data in bounded_map(pool, compress, runs, workers * 2):
+            chunks.append({
+                'offset': out.tell(),
+                'length': len(data),
+                'page': first,
+                'pages': count,
+            })
+            out.write(data)
+        out.flush()
+        os.fsync(out.fileno())
+    return chunks
+
+
+def backup_sqlite(database, output, parent=None, pages=1024, sleep=0.05,
+                  level=6, workers=1, progress=None):
+    """
+    Makes a full backup, or an incremental one when ``parent`` is given.
+
+    Returns:
+        dict: The manifest written next to the backup.
+    """
+    output = Path(output)
+    snapshot = output.with_name(output.name + '.snapshot')
+    try:
+        snapshot_sqlite(database, snapshot, pages=pages, sleep=sleep, progress=progress)
+
+        errors = integrity_errors(snapshot)
+        if errors:
+            raise BackupError('The copy failed the integrity check: ' + '; '.join(errors[:5]))
+
+        page_size, page_count = page_layout(snapshot)
+        digests, sha256 = hash_pages(snapshot, page_size)
+        max_pages = max(1, CHUNK_SIZE // page_size)
+
+        if parent is None:
+            runs = (
+                (first, min(max_pages, page_count - first))
+                for first in range(0, page_count, max_pages)
+            )
+            parent_entry = None
+        else:
+            parent_manifest = load_manifest(parent)
+            if parent_manifest['engine'] != 'sqlite' or parent_manifest['page_size'] != page_size:
+                raise BackupError(f'{parent} is not a compatible SQLite backup.')
+            old_digests = pages_path(parent).read_bytes()
+            runs = changed_runs(old_digests, digests, max_pages)
+            parent_entry = {
+                'file': os.path.relpath(parent, output.parent),
+                'sha256': parent_manifest['sha256'],
+            }
+
+        chunks = write_chunks(snapshot, output, runs, page_size, level, workers)
+    finally:
+        snapshot.unlink(missing_ok=True)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'engine': 'sqlite',
+        'type': 'full' if parent is None else 'incremental',
+        'created': timezone.now().isoformat(),
+        'page_size': page_size,
+        'page_count': page_count,
+        'sha256': sha256,
+        'parent': parent_entry,
+        'chunks': chunks,
+    }
+    pages_path(output).write_bytes(digests)
+    manifest_path(output).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def backup_chain(path):
+    """
+    Lists the backups needed to restore ``path``, from the full backup up.
+
+    Returns:
+        list[tuple]: ``(path, manifest)`` pairs.
+    """
+    chain = []
+    path = Path(path)
+    while True:
+        manifest = load_manifest(path)
+        if manifest.get('format') != FORMAT_VERSION or manifest.get('engine') != 'sqlite':
+            raise BackupError(f'{path} is not a supported SQLite backup.')
+        chain.append((path, manifest))
+
+        parent = manifest['parent']
+        if parent is None:
+            break
+        parent_path = path.parent / parent['file']
+        if load_manifest(parent_path)['sha256'] != parent['sha256']:
+            raise BackupError(f'{parent_path} is not the backup {path} was made from.')
+        path = parent_path
+
+    chain.reverse()
+    return chain
+
+
+def apply_chunks(path, manifest, fd, workers=1):
+    """Decompresses the chunks of one backup in parallel into the file ``fd``."""
+    page_size = manifest['page_size']
+    with open(path, 'rb') as backup, ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def apply(chunk):
+            data = gzip.decompress(
+                os.pread(backup.fileno(), chunk['length'], chunk['offset'])
+            )
+            if len(data) != chunk['pages'] * page_size:
+                raise BackupError(f"{path}: chunk at offset {chunk['offset']} is truncated.")
+            os.pwrite(fd, data, chunk['page'] * page_size)
+
+        for _ in bounded_map(pool, apply, manifest['chunks'], workers * 2):
+            pass
+
+
+def restore_sqlite(backup, target, workers=1, progress=None):
+    """
+    Rebuilds a database file from a backup chain and verifies it.
+
+    The result is written to ``<target>.restoring`` and only moved over the
+    target once its SHA-256 and integrity check pass.
+
+    Args:
+        backup (Path): The last backup of the chain.
+        target (Path | None): The database to replace; None only verifies.
+        workers (int): Chunks decompressed and written in parallel.
+        progress (callable | None): Called with each backup path applied.
+    """
+    chain = backup_chain(backup)
+    manifest = chain[-1][1]
+    restoring = Path(f'{target or backup}.restoring')
+
+    fd = os.open(restoring, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for path, step in chain:
+            if progress is not None:
+                progress(path)
+            apply_chunks(path, step, fd, workers)
+        os.ftruncate(fd, manifest['page_count'] * manifest['page_size'])
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        restoring.unlink(missing_ok=True)
+        raise
+    os.close(fd)
+
+    try:
+        _, sha256 = hash_pages(restoring, manifest['page_size'])
+        if sha256 != manifest['sha256']:
+            raise BackupError('The restored database does not match the backup checksum.')
+        errors = integrity_errors(restoring)
+        if errors:
+            raise BackupError('The restored database failed the integrity check: ' + '; '.join(errors[:5]))
+    except BaseException:
+        restoring.unlink(missing_ok=True)
+        raise
+
+    if target is None:
+        restoring.unlink()
+        return
+
+    # A leftover journal of the old database would be replayed on the new one
+    for suffix in ('-wal', '-shm', '-journal'):
+        Path(f'{target}{suffix}').unlink(missing_ok=True)
+    os.replace(restoring, target)
+
+
+# PostgreSQL
+
+def _pg_command(program, settings_dict):
+    """Connection arguments and environment for the PostgreSQL client tools."""
+    args = [program, '--no-password']
+    if settings_dict.get('HOST'):
+        args += ['--host', settings_dict['HOST']]
+    if settings_dict.get('PORT'):
+        args += ['--port', str(settings_dict['PORT'])]
+    if settings_dict.get('USER'):
+        args += ['--username', settings_dict['USER']]
+
+    env = dict(os.environ)
+    if settings_dict.get('PASSWORD'):
+        env['PGPASSWORD'] = settings_dict['PASSWORD']
+    return args, env
+
+
+def _run(args, env):
+    try:
+        process = subprocess.run(args, env=env, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise BackupError(f'{args[0]} is not installed.')
+    if process.returncode != 0:
+        raise BackupError(process.stderr.strip() or f'{args[0]} failed.')
+
+
+def backup_postgresql(settings_dict, output, level=6, workers=1):
+    """Dumps the database with ``pg_dump`` (directory format, parallel jobs)."""
+    args, env = _pg_command('pg_dump', settings_dict)
+    args += [
+        '--format', 'directory',
+        '--jobs', str(workers),
+        '--compress', str(level),
+        '--file', str(output),
+        settings_dict['NAME'],
+    ]
+    _run(args, env)
+
+
+def restore_postgresql(settings_dict, backup, workers=1, check=False):
+    """Restores a ``pg_dump`` directory with ``pg_restore`` (parallel jobs)."""
+    args, env = _pg_command('pg_restore', settings_dict)
+    if check:
+        # Reads the whole table of contents without touching the database
+        args = [args[0], '--list', str(backup)]
+    else:
+        args += [
+            '--jobs', str(workers),
+            '--clean', '--if-exists', '--no-owner',
+            '--dbname', settings_dict['NAME'],
+            str(backup),
+        ]
+    _run(args, env)
@@ -0,0 +1,226 @@
+"""
+Write buffers flushed in batches from a background thread.
+
+Some writes follow reads: counting the views of a contact page, for
+instance. Doing them in the request would turn every read into a write
+and, on SQLite, make readers queue for the single writer lock. A
+`BackgroundFlusher` collects them in memory instead and writes them every
+``interval`` seconds (or as soon as ``max_pending`` items are waiting) in
+a few batched queries.
+
+Pending items are flushed when the process exits (``atexit``; workers of
+``project.server`` run the exit handlers before leaving) and a forked
+child starts with empty buffers. Items still pending when a process is
+killed (``SIGKILL``, a crash, the OOM killer) are lost. A write that fails
+loses its batch too, unless the subclass puts the items back (see
+`contact.audit.AuditWriter`); a failed flush is retried after
+``interval`` seconds at the earliest.
+"""
+
+import abc
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from contact.caching import VIEWS_GENERATION_KEY, bump_generation
+from contact.models import Contact, ContactView
+from contact.sharding import all_contacts, shard_databases
+
+logger = logging.getLogger('contact.buffers')
+
+# Largest number of values sent in one ``__in`` query (SQLite limit)
+QUERY_CHUNK_SIZE = 900
+
+_flushers = weakref.WeakSet()
+
+
+def chunked(values):
+    for i in range(0, len(values), QUERY_CHUNK_SIZE):
+        yield values[i:i + QUERY_CHUNK_SIZE]
+
+
+class BackgroundFlusher(abc.ABC):
+    """
+    Base class of a buffer written by a background thread.
+
+    Subclasses keep their pending items in attributes reset by `reset`,
+    add to them under ``self.lock`` through `added`, and write a batch in
+    `write`, which gets what `take` returned.
+    """
+
+    name = 'buffer'
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pending = 0
+        self.reset()
+        _flushers.add(self)
+
+    @abc.abstractmethod
+    def reset(self):
+        """Sets up empty pending items (lock held, or before the thread)."""
+
+    @abc.abstractmethod
+    def take(self):
+        """Returns the pending items and empties the buffer (lock held)."""
+
+    @abc.abstractmethod
+    def write(self, items):
+        """Writes a batch returned by `take` (lock not held)."""
+
+    def added(self, count=1):
+        """Accounts for new items; call with ``self.lock`` held."""
+        self.pending += count
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name=f'{self.name}-flusher', daemon=True
+            )
+            self.thread.start()
+        if self.pending >= self.max_pending:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            # The connection of this thread outlives requests
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing the %s failed', self.name)
+                # Do not hammer a database that is down or locked
+                time.sleep(self.interval)
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            items = self.take()
+            self.pending = 0
+            self.reset()
+        self.write(items)
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pending = 0
+        self.reset()
+
+
+def flush_all():
+    """Writes what every buffer of the process still holds."""
+    for flusher in list(_flushers):
+        try:
+            flusher.flush()
+        except Exception:
+            logger.exception('Final flush of the %s failed', flusher.name)
+
+
+def _after_fork():
+    for flusher in list(_flushers):
+        flusher.after_fork()
+
+
+atexit.register(flush_all)
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class ViewCounter(BackgroundFlusher):
+    """
+    Counts contact page views in memory.
+
+    A flush adds the counts to ``Contact.view_count`` and to the per-user
+    `ContactView` rows with ``F()`` increments, so workers flushing at the
+    same time never lose views. ``last_viewed`` is the flush time: it is
+    precise to the flush interval.
+    """
+
+    name = 'view counter'
+
+    def reset(self):
+        self.contacts = defaultdict(int)
+        self.users = defaultdict(int)
+
+    def take(self):
+        return self.contacts, self.users
+
+    def record(self, contact_id, user_id=None):
+        with self.lock:
+            self.contacts[contact_id] += 1
+            if user_id is not None:
+                self.users[user_id, contact_id] += 1
+            self.added()
+
+    def write(self, items):
+        contacts, users = items
+        now = timezone.now()
+
+        # Contacts with the same count share one UPDATE, on every shard
+        by_count = defaultdict(list)
+        for contact_id, count in contacts.items():
+            by_count[count].append(contact_id)
+        for database in shard_databases():
+            with transaction.atomic(using=database):
+                for count, ids in by_count.items():
+                    for chunk in chunked(ids):
+                        Contact.objects.using(database).filter(pk__in=chunk).update(
+                            view_count=F('view_count') + count, last_viewed=now,
+                        )
+
+        if users:
+            # Views of contacts deleted since would bring their rows back
+            existing = set()
+            for chunk in chunked(list({contact_id for _, contact_id in users})):
+                existing.update(
+                    all_contacts(Contact.objects.filter(pk__in=chunk)).values_list('pk', flat=True)
+                )
+            users = {key: count for key, count in users.items() if key[1] in existing}
+
+        if users:
+            by_user = defaultdict(list)
+            for (user_id, contact_id), count in users.items():
+                by_user[user_id, count].append(contact_id)
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                # Missing rows first, so every key can be incremented
+                ContactView.objects.bulk_create(
+                    [
+                        ContactView(user_id=user_id, contact_id=contact_id, last_viewed=now)
+                        for user_id, contact_id in users
+                    ],
+                    batch_size=QUERY_CHUNK_SIZE // 4,
+                    ignore_conflicts=True,
+                )
+                for (user_id, count), ids in by_user.items():
+                    for chunk in chunked(ids):
+                        ContactView.objects.filter(user_id=user_id, contact_id__in=chunk).update(
+                            count=F('count') + count, last_viewed=now,
+                        )
+
+        bump_generation(VIEWS_GENERATION_KEY)
+
+
+view_counter = ViewCounter(
+    interval=getattr(settings, 'BUFFER_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'BUFFER_MAX_PENDING', 10000),
+)
+
+
+def record_contact_view(contact_id, user=None):
+    """Counts a view of a contact page (written later, in a batch)."""
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    view_counter.record(contact_id, user_id)
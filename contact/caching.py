@@ -0,0 +1,238 @@
+"""
+HTTP conditional request support for the contact pages.
+
+Detail pages are validated by the contact's ``updated_date``; listing
+pages by a *generation* counter kept in the Django cache and bumped on
+every Contact or Category change (see `contact.signals`).
+
+The generation lives in the ``default`` cache, so deployments with more
+than one worker process must configure a shared cache backend
+(Memcached, Redis or the database cache) in ``CACHES``; see
+`shared_cache`. Counters start at a random value rather than 1: a counter
+that starts over (a restarted process with a local cache, an evicted key)
+never hands out the values of its previous life, so an ETag a client kept
+from before cannot match again.
+"""
+
+import hashlib
+import secrets
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from contact.models import Contact
+from contact.sharding import all_contacts
+
+LISTING_GENERATION_KEY = 'contact:listing-generation'
+CATEGORY_GENERATION_KEY = 'contact:category-generation'
+# Bumped after each batch of view counts (see contact.buffers)
+VIEWS_GENERATION_KEY = 'contact:views-generation'
+# Bumped by contact changes made without touching updated_date
+SNAPSHOT_EPOCH_KEY = 'contact:snapshot-epoch'
+# Bumped when the initials counted by the A–Z jump bar may have changed
+JUMP_GENERATION_KEY = 'contact:jump-generation'
+
+# Cache backends whose data stays inside one process
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def shared_cache():
+    """Whether every process sees the same ``default`` cache (and counters)."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def new_generation():
+    """A random starting value for a generation counter."""
+    return secrets.randbits(48)
+
+
+def get_generation(key):
+    """Returns the current value of a generation counter."""
+    return cache.get_or_set(key, new_generation, timeout=None)
+
+
+def bump_generation(key):
+    """Increments a generation counter, invalidating every tag built from it."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter expired or was never created
+        cache.add(key, new_generation(), timeout=None)
+
+
+def bump_listing_generation():
+    """Invalidates every cached contact listing page."""
+    bump_generation(LISTING_GENERATION_KEY)
+
+
+def bump_snapshot_epoch():
+    """
+    Invalidates the listing after contacts were changed with
+    ``QuerySet.update()``, which leaves ``updated_date`` as it was: the
+    next listing snapshot is rebuilt in full instead of incrementally.
+    """
+    bump_generation(SNAPSHOT_EPOCH_KEY)
+    bump_jump_generation()
+    bump_listing_generation()
+
+
+def bump_jump_generation():
+    """Invalidates the A–Z jump tables (`contact.paginators.letter_offsets`)."""
+    bump_generation(JUMP_GENERATION_KEY)
+
+
+def bump_category_generation():
+    """Invalidates every page that shows a category name."""
+    bump_generation(CATEGORY_GENERATION_KEY)
+
+
+def _viewer_tag(request):
+    """
+    Part of the tag that depends on who is looking at the page.
+
+    The header changes with authentication, so anonymous and authenticated
+    views never share a tag.
+    """
+    return 'u' if request.user.is_authenticated else 'a'
+
+
+def _csrf_tag(request):
+    """Short hash of the CSRF secret, so a rotated token is never reused."""
+    secret = request.META.get('CSRF_COOKIE', '')
+    return hashlib.blake2s(secret.encode(), digest_size=6).hexdigest()
+
+
+def _has_pending_messages(request):
+    """Pages carrying flash messages must always be rendered in full."""
+    return len(get_messages(request)) > 0
+
+
+def _contact_validators(request, contact_id):
+    """
+    Loads the fields needed to validate a detail page.
+
+    The lookup is a single primary key query and its result is kept on the
+    request, so the ETag and Last-Modified functions share it.
+    """
+    cache_attr = '_contact_validators'
+    if not hasattr(request, cache_attr):
+        row = all_contacts(Contact.objects) \
+            .filter(pk=contact_id, show=True) \
+            .values_list('updated_date', 'owner_id') \
+            .first()
+        setattr(request, cache_attr, row)
+    return getattr(request, cache_attr)
+
+
+def contact_etag(request, contact_id):
+    """ETag of a contact detail page."""
+    if _has_pending_messages(request):
+        return None
+
+    row = _contact_validators(request, contact_id)
+    if row is None:
+        return None
+
+    updated_date, owner_id = row
+    is_owner = request.user.is_authenticated and request.user.pk == owner_id
+    parts = [
+        settings.HTTP_CACHE_VERSION,
+        'c', str(contact_id),
+        str(updated_date.timestamp()),
+        str(get_generation(CATEGORY_GENERATION_KEY)),
+        _viewer_tag(request),
+    ]
+    if is_owner:
+        # The Update/Delete buttons carry a CSRF token
+        parts += ['o', _csrf_tag(request)]
+    return '-'.join(parts)
+
+
+def contact_last_modified(request, contact_id):
+    """
+    Last-Modified of a contact detail page.
+
+    Only anonymous pages get one: a date cannot express who is looking at
+    the page, so authenticated pages are validated by ETag alone.
+    """
+    if request.user.is_authenticated or _has_pending_messages(request):
+        return None
+
+    row = _contact_validators(request, contact_id)
+    return row[0] if row else None
+
+
+def listing_etag(request, *args, **kwargs):
+    """ETag of a listing page (index or search)."""
+    if _has_pending_messages(request):
+        return None
+
+    query = hashlib.blake2s(
+        request.GET.urlencode().encode(), digest_size=8
+    ).hexdigest()
+    return '-'.join([
+        settings.HTTP_CACHE_VERSION,
+        'l', str(get_generation(LISTING_GENERATION_KEY)),
+        query,
+        _viewer_tag(request),
+        'f' if request.headers.get('X-Fragment') else 'p',
+    ])
+
+
+def views_etag(request, *args, **kwargs):
+    """ETag of a listing ordered by views (popular or recently viewed)."""
+    tag = listing_etag(request)
+    if tag is None:
+        return None
+    tag = f'{tag}-v{get_generation(VIEWS_GENERATION_KEY)}'
+    if request.user.is_authenticated:
+        # The recently viewed list of a user is theirs alone
+        tag += f'-{request.user.pk}'
+    return tag
+
+
+def patch_cache_headers(request, response, vary=()):
+    """
+    Applies the Cache-Control and Vary policy of the contact pages.
+
+    Anonymous pages may be stored by shared caches but must be revalidated;
+    authenticated pages are private to the browser.
+    """
+    patch_vary_headers(response, ('Cookie', *vary))
+
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def conditional_page(etag_func, last_modified_func=None, vary=()):
+    """
+    Decorator adding ETag/Last-Modified validation and the cache policy to
+    a view. Matching requests get a 304 without running the view.
+
+    Args:
+        etag_func (callable): Computes the ETag from the view arguments.
+        last_modified_func (callable): Computes the Last-Modified date.
+        vary (tuple): Request headers, besides Cookie, the page depends on.
+    """
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag_func,
+            last_modified_func=last_modified_func,
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            return patch_cache_headers(request, response, vary)
+        return wrapper
+    return decorator
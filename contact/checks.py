@@ -0,0 +1,19 @@
+"""System checks for settings that only work together."""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from contact.caching import shared_cache
+
+
+@register()
+def snapshot_cache_check(app_configs, **kwargs):
+    """The listing snapshot needs a generation every process sees."""
+    if getattr(settings, 'CONTACT_SNAPSHOT_PATH', None) and not shared_cache():
+        return [Warning(
+            'CONTACT_SNAPSHOT_PATH is set but the default cache is local to '
+            'each process, so the listing snapshot is not used.',
+            hint='Configure a shared cache (DJANGO_CACHE_URL).',
+            id='contact.W001',
+        )]
+    return []
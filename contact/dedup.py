@@ -0,0 +1,369 @@
+"""
+Duplicate contact detection.
+
+Comparing every pair of contacts is O(n²), so the engine first groups
+contacts into *blocks* that share a cheap key (normalized e-mail, phone
+digits or a phonetic name key) and only compares candidates inside the
+same block. Blocks are independent, so they can be compared in parallel
+worker processes. Matching pairs are joined into clusters with a
+union-find structure.
+
+Every blocking key includes the owner, so contacts of different users are
+never compared and a cluster never spans two owners.
+"""
+
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from contact.caching import bump_snapshot_epoch
+from contact.models import Contact, ContactView
+from contact.sharding import all_contacts, contact_database
+
+# Blocks bigger than this are compared with a sorted-neighbourhood window
+# instead of all pairs, which keeps a huge block (e.g. a very common
+# surname) from turning back into an O(n²) scan.
+MAX_BLOCK_SIZE = 500
+NEIGHBOURHOOD_WINDOW = 50
+
+# Minimum ratio for two full names to be considered the same person.
+NAME_SIMILARITY = 0.8
+
+# Number of blocks sent to a worker process in a single task.
+BLOCKS_PER_TASK = 200
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def strip_accents(value):
+    """Removes accents and lowercases a string (``'João'`` -> ``'joao'``)."""
+    normalized = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).casefold()
+
+
+def normalize_email(email):
+    """Returns the e-mail stripped and case-folded."""
+    return (email or '').strip().casefold()
+
+
+def normalize_phone(phone):
+    """
+    Returns only the significant digits of a phone number.
+
+    The Brazilian country code and trunk zeros are dropped so that
+    ``'+55 (011) 1234-5678'`` and ``'11 1234 5678'`` produce the same value.
+    """
+    digits = ''.join(c for c in phone or '' if c.isdigit())
+    if len(digits) >= 12 and digits.startswith('55'):
+        digits = digits[2:]
+    return digits.lstrip('0')
+
+
+def normalize_name(first_name, last_name):
+    """Returns the full name without accents, case or repeated spaces."""
+    return ' '.join(strip_accents(f'{first_name} {last_name}').split())
+
+
+def soundex(word):
+    """Returns the classic four character Soundex code of a word."""
+    letters = [c for c in strip_accents(word) if c.isalpha()]
+    if not letters:
+        return ''
+
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+        if letter not in 'hw':
+            previous = digit
+        if len(code) == 4:
+            break
+    return code.ljust(4, '0')
+
+
+def phonetic_key(first_name, last_name):
+    """Returns a phonetic key for a name, tolerant to small spelling changes."""
+    last_words = (last_name or '').split()
+    last = last_words[-1] if last_words else ''
+    return soundex(first_name) + soundex(last)
+
+
+def make_record(contact):
+    """
+    Converts a contact (or a ``values()`` dict) into the compact tuple that
+    is shipped to worker processes:
+    ``(id, email, phone, name, phonetic, owner_id)``.
+    """
+    if isinstance(contact, dict):
+        get = contact.get
+    else:
+        def get(field):
+            return getattr(contact, field)
+
+    return (
+        get('id'),
+        normalize_email(get('email')),
+        normalize_phone(get('phone')),
+        normalize_name(get('first_name'), get('last_name')),
+        phonetic_key(get('first_name'), get('last_name')),
+        get('owner_id'),
+    )
+
+
+def blocking_keys(record):
+    """Yields every block a record belongs to (within its owner's contacts)."""
+    _, email, phone, name, phonetic, owner_id = record
+    if email:
+        yield (owner_id, 'email', email)
+    if len(phone) >= 8:
+        yield (owner_id, 'phone', phone)
+    if phonetic:
+        yield (owner_id, 'phonetic', phonetic)
+
+
+def is_duplicate(a, b):
+    """
+    Decides whether two records describe the same person.
+
+    - Same e-mail address.
+    - Same phone number and similar names.
+    - Identical names and either the same e-mail user or phone ending.
+    """
+    _, email_a, phone_a, name_a, *_ = a
+    _, email_b, phone_b, name_b, *_ = b
+
+    if email_a and email_a == email_b:
+        return True
+
+    if len(phone_a) >= 8 and phone_a == phone_b:
+        return SequenceMatcher(None, name_a, name_b).ratio() >= NAME_SIMILARITY
+
+    if name_a and name_a == name_b:
+        same_user = email_a and email_a.split('@')[0] == email_b.split('@')[0]
+        same_ending = len(phone_a) >= 4 and phone_a[-4:] == phone_b[-4:]
+        return bool(same_user or same_ending)
+
+    return False
+
+
+def compare_block(records):
+    """Returns the duplicate id pairs found inside a single block."""
+    pairs = []
+    if len(records) <= MAX_BLOCK_SIZE:
+        for i, a in enumerate(records):
+            for b in records[i + 1:]:
+                if is_duplicate(a, b):
+                    pairs.append((a[0], b[0]))
+        return pairs
+
+    ordered = sorted(records, key=lambda record: record[3])
+    for i, a in enumerate(ordered):
+        for b in ordered[i + 1:i + NEIGHBOURHOOD_WINDOW]:
+            if is_duplicate(a, b):
+                pairs.append((a[0], b[0]))
+    return pairs
+
+
+def compare_blocks(blocks):
+    """Worker entry point: compares a batch of blocks."""
+    pairs = []
+    for records in blocks:
+        pairs.extend(compare_block(records))
+    return pairs
+
+
+def build_blocks(records):
+    """Groups records by blocking key, dropping blocks with a single record."""
+    blocks = defaultdict(list)
+    for record in records:
+        for key in blocking_keys(record):
+            blocks[key].append(record)
+    return [block for block in blocks.values() if len(block) > 1]
+
+
+def cluster_pairs(pairs):
+    """Joins duplicate pairs into clusters using union-find."""
+    parent = {}
+
+    def find(item):
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = defaultdict(set)
+    for item in parent:
+        clusters[find(item)].add(item)
+
+    return sorted(
+        (sorted(ids) for ids in clusters.values()),
+        key=lambda ids: ids[0],
+    )
+
+
+def find_duplicate_ids(records, workers=1):
+    """
+    Returns clusters of duplicate contact ids.
+
+    Args:
+        records (iterable): Records created by `make_record`.
+        workers (int): Number of worker processes. ``1`` compares in-process.
+
+    Returns:
+        list[list[int]]: Clusters sorted by their lowest id.
+    """
+    blocks = build_blocks(records)
+
+    if workers <= 1 or len(blocks) < BLOCKS_PER_TASK:
+        return cluster_pairs(compare_blocks(blocks))
+
+    batches = [
+        blocks[i:i + BLOCKS_PER_TASK]
+        for i in range(0, len(blocks), BLOCKS_PER_TASK)
+    ]
+    pairs = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_pairs in executor.map(compare_blocks, batches):
+            pairs.extend(batch_pairs)
+    return cluster_pairs(pairs)
+
+
+def find_duplicates(queryset, workers=1):
+    """
+    Finds duplicate clusters inside a queryset of contacts.
+
+    Only the columns needed for matching are loaded, streamed with
+    ``iterator()`` so the full model instances are never built.
+
+    Returns:
+        list[list[int]]: Clusters of contact ids, lowest id first.
+    """
+    rows = queryset.values(
+        'id', 'first_name', 'last_name', 'phone', 'email', 'owner_id'
+    ).iterator(chunk_size=2000)
+    return find_duplicate_ids((make_record(row) for row in rows), workers)
+
+
+MERGEABLE_FIELDS = (
+    'first_name',
+    'last_name',
+    'phone',
+    'email',
+    'description',
+    'category',
+    'picture',
+)
+
+
+def merge_contacts(winner_id, loser_ids, owner=None):
+    """
+    Merges duplicate contacts into a single one.
+
+    Empty fields of the winner are filled from the losers, their view
+    counts are added to the winner's, every relation pointing to a loser
+    is re-pointed to the winner and the losers are deleted. Everything
+    happens in a single transaction; the per-user view history (kept in
+    ``default``) is merged once it commits. Contacts of different owners
+    are never merged.
+
+    Args:
+        winner_id (int): The contact that is kept.
+        loser_ids (iterable): Contacts merged into the winner.
+        owner (User): When given, every contact must belong to this user
+            (and is looked up on the owner's shard).
+
+    Returns:
+        Contact: The updated winner.
+    """
+    loser_ids = [pk for pk in dict.fromkeys(loser_ids) if pk != winner_id]
+
+    if owner is not None:
+        using = contact_database(owner)
+    else:
+        winner = all_contacts(Contact.objects).filter(pk=winner_id).first()
+        using = winner._state.db if winner is not None else DEFAULT_DB_ALIAS
+
+    with transaction.atomic(using=using):
+        contacts = Contact.objects.using(using).select_for_update().filter(
+            pk__in=[winner_id, *loser_ids], show=True
+        )
+        if owner is not None:
+            contacts = contacts.filter(owner=owner)
+
+        contacts = {contact.pk: contact for contact in contacts}
+        if winner_id not in contacts or len(contacts) != len(loser_ids) + 1:
+            raise Contact.DoesNotExist('Contatos para mesclar não encontrados.')
+
+        if len({contact.owner_id for contact in contacts.values()}) > 1:
+            raise ValueError('Só é possível mesclar contatos do mesmo dono.')
+
+        winner = contacts.pop(winner_id)
+        for loser in sorted(contacts.values(), key=lambda c: c.pk):
+            for field in MERGEABLE_FIELDS:
+                if not getattr(winner, field) and getattr(loser, field):
+                    setattr(winner, field, getattr(loser, field))
+
+        # save() leaves the counters alone: add the losers' views with F()
+        # so a batch of views flushed meanwhile is kept
+        viewed = [contact.last_viewed for contact in (winner, *contacts.values())]
+        Contact.objects.using(using).filter(pk=winner_id).update(
+            view_count=F('view_count') + sum(loser.view_count for loser in contacts.values()),
+            last_viewed=max((value for value in viewed if value), default=None),
+        )
+
+        for relation in Contact._meta.related_objects:
+            if relation.one_to_many or relation.one_to_one:
+                relation.related_model._base_manager.filter(
+                    **{f'{relation.field.name}__in': loser_ids}
+                ).update(**{relation.field.name: winner})
+        # Rows changed by update() keep their updated_date
+        transaction.on_commit(bump_snapshot_epoch, using=using)
+        # Registered before the losers are deleted, so it runs before their
+        # view history is dropped
+        transaction.on_commit(lambda: merge_views(winner_id, loser_ids), using=using)
+
+        winner.save()
+        Contact.objects.using(using).filter(pk__in=loser_ids).delete()
+
+    return winner
+
+
+def merge_views(winner_id, loser_ids):
+    """Adds the per-user view history of merged contacts to the winner's."""
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        losers = ContactView.objects.select_for_update().filter(contact_id__in=loser_ids)
+        totals = {}
+        for user_id, count, last_viewed in losers.values_list('user_id', 'count', 'last_viewed'):
+            previous_count, previous_viewed = totals.get(user_id, (0, last_viewed))
+            totals[user_id] = (previous_count + count, max(previous_viewed, last_viewed))
+
+        for user_id, (count, last_viewed) in totals.items():
+            view, created = ContactView.objects.get_or_create(
+                user_id=user_id, contact_id=winner_id,
+                defaults={'count': count, 'last_viewed': last_viewed},
+            )
+            if not created:
+                ContactView.objects.filter(pk=view.pk).update(
+                    count=F('count') + count,
+                    last_viewed=max(view.last_viewed, last_viewed),
+                )
+        losers.delete()
@@ -0,0 +1,232 @@
+"""
+Live contact list updates, pushed to the browser as server-sent events.
+
+Every committed create, update or delete of a Contact is encoded once and
+published to the `EventBroker` of the process, which hands it to each open
+``events`` stream. Subscribers are grouped by event loop, so an event costs
+one thread-safe call per loop however many tabs are listening, and an idle
+stream is only a parked coroutine and a small queue.
+
+Each stream has a bounded queue: a client that falls behind is not allowed
+to grow it. Its pending events are dropped and it receives a single
+``resync`` event, after which the page reloads its list once.
+
+With ``CONTACT_EVENTS_REDIS_URL`` set (and the ``redis`` package
+installed) events go through a Redis channel, so a change made in one
+worker process reaches the streams of every other one.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import redis
+except ImportError:  # redis is optional, events then stay in the process
+    redis = None
+
+logger = logging.getLogger('contact.events')
+
+# Events kept for a client that is slow to read them
+EVENT_QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Delay before the browser reconnects a dropped stream, in milliseconds
+RECONNECT_DELAY = 5000
+
+REDIS_CHANNEL = 'contact:events'
+
+# Fields sent with created and updated contacts (the listing columns)
+EVENT_FIELDS = ('first_name', 'last_name', 'phone', 'email')
+
+RESYNC = object()
+
+
+class Subscription:
+    """The queue of one open stream."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def offer(self, message):
+        """Queues a message; a full queue is replaced by a resync (runs on the loop)."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class EventBroker:
+    """In-process publish/subscribe of encoded events."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # loop -> set of subscriptions
+        self.loops = {}
+        self.sequence = itertools.count(1)
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self.lock:
+            self.loops.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.loops.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.loops[subscription.loop]
+
+    def dispatch(self, data):
+        """Delivers an encoded event to every stream of this process."""
+        message = f'id: {next(self.sequence)}\nevent: contact\ndata: {data}\n\n'.encode()
+        with self.lock:
+            loops = [(loop, tuple(subscriptions)) for loop, subscriptions in self.loops.items()]
+
+        for loop, subscriptions in loops:
+            try:
+                loop.call_soon_threadsafe(_deliver, subscriptions, message)
+            except RuntimeError:
+                # The loop was closed
+                pass
+
+    @property
+    def subscribers(self):
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.loops.values())
+
+
+def _deliver(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.offer(message)
+
+
+broker = EventBroker()
+
+
+class RedisChannel:
+    """Relays events between processes through Redis pub/sub."""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def publish(self, data):
+        self.client.publish(REDIS_CHANNEL, data)
+
+    def listen(self):
+        """Starts the thread feeding the local broker (once per process)."""
+        with self.lock:
+            if self.listener is not None and self.listener.is_alive():
+                return
+            self.listener = threading.Thread(target=self.run, daemon=True)
+            self.listener.start()
+
+    def run(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    broker.dispatch(message['data'].decode())
+            except redis.RedisError:
+                logger.exception('Lost the Redis event channel, reconnecting')
+                threading.Event().wait(RECONNECT_DELAY / 1000)
+
+
+_channel = None
+_channel_lock = threading.Lock()
+
+
+def channel():
+    """The cross-process channel, or None when events stay in the process."""
+    global _channel
+    url = getattr(settings, 'CONTACT_EVENTS_REDIS_URL', None)
+    if not url or redis is None:
+        return None
+    with _channel_lock:
+        if _channel is None:
+            _channel = RedisChannel(url)
+    return _channel
+
+
+def publish(event):
+    """Sends an event to every stream, through Redis when configured."""
+    data = json.dumps(event, separators=(',', ':'))
+    relay = channel()
+    if relay is None:
+        broker.dispatch(data)
+        return
+    try:
+        relay.publish(data)
+    except redis.RedisError:
+        logger.exception('Cannot publish a contact event to Redis')
+        broker.dispatch(data)
+
+
+def publish_contact_change(contact, action, using):
+    """
+    Publishes a contact change once its transaction commits.
+
+    Hidden contacts are announced as deleted, so they leave the open lists
+    without their data being sent.
+    """
+    if action != 'deleted' and not contact.show:
+        action = 'deleted'
+
+    event = {'action': action, 'id': contact.pk}
+    if action != 'deleted':
+        for field in EVENT_FIELDS:
+            event[field] = getattr(contact, field)
+
+    transaction.on_commit(lambda: publish(event), using=using)
+
+
+def subscribe():
+    """Opens a stream on the running event loop, listening to Redis if configured."""
+    relay = channel()
+    if relay is not None:
+        relay.listen()
+    return broker.subscribe()
+
+
+async def event_stream(subscription):
+    """
+    Yields the server-sent events of one stream.
+
+    Waits on the queue with a timeout, sending a comment line as a
+    heartbeat, so proxies keep the connection open and a closed tab is
+    noticed at the next write.
+
+    Args:
+        subscription (Subscription): From `subscribe`, closed when the
+            client disconnects.
+    """
+    yield f'retry: {RECONNECT_DELAY}\n\n'.encode()
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+                continue
+
+            if message is RESYNC:
+                yield b'event: resync\ndata: {}\n\n'
+            else:
+                yield message
+    finally:
+        broker.unsubscribe(subscription)
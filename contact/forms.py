@@ -1,9 +1,61 @@
 from django import forms
 from . import models
 from django.core.exceptions import ValidationError
-from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth.models import User
-from django.contrib.auth import password_validation
+
+from contact.uploads import (
+    IMAGE_CONTENT_TYPES,
+    SNIFF_LIMIT,
+    NotAnImage,
+    RejectedUpload,
+    check_image,
+    sniff_image,
+)
+
+
+class PictureField(forms.FileField):
+    """
+    File field for contact pictures.
+
+    Unlike `forms.ImageField` it never decodes the image with Pillow: the
+    format and dimensions come from the upload header, read while the file
+    was streamed by `PictureUploadHandler` (or sniffed here when the handler
+    was not installed).
+    """
+
+    default_error_messages = {
+        'invalid_image': 'Envie uma imagem válida.',
+    }
+
+    def to_python(self, data):
+        if isinstance(data, RejectedUpload):
+            raise ValidationError(data.reason, code='invalid_image')
+
+        f = super().to_python(data)
+        if f is None:
+            return None
+
+        info = getattr(f, 'image_info', None)
+        if info is None:
+            f.seek(0)
+            header = f.read(SNIFF_LIMIT)
+            f.seek(0)
+            try:
+                info = sniff_image(header)
+            except NotAnImage:
+                info = None
+            if info is None:
+                raise ValidationError(
+                    self.error_messages['invalid_image'],
+                    code='invalid_image',
+                )
+
+        reason = check_image(info, f.size)
+        if reason:
+            raise ValidationError(reason, code='invalid_image')
+
+        f.image_info = info
+        f.content_type = IMAGE_CONTENT_TYPES[info[0]]
+        return f
 
 
 
@@ -21,16 +73,17 @@ class ContactForm(forms.ModelForm):
         - email (EmailField): Contact email address.
         - description (str): Additional information about the contact.
         - category (ForeignKey): Category associated with the contact.
-        - picture (ImageField): Optional profile picture.
+        - picture (PictureField): Optional profile picture, validated from
+          its header while it is uploaded.
 
     Methods:
         - clean_first_name(): Validates that 'ABC' is not used as a first name.
     """
 
-    picture = forms.ImageField(
+    picture = PictureField(
         widget=forms.FileInput(
             attrs={
-                'accept': 'image/*'
+                'accept': ','.join(IMAGE_CONTENT_TYPES.values())
             }
         ), required=False
     )
@@ -64,175 +117,15 @@ class ContactForm(forms.ModelForm):
         return first_name
 
 
-class RegisterForm(UserCreationForm):
-    """
-    Handles user registration with additional validation.
-
-    This form extends Django's built-in `UserCreationForm` to include email validation.
-
-    Fields:
-        - first_name (str): Required, minimum length of 3 characters.
-        - last_name (str): Required, minimum length of 3 characters.
-        - email (EmailField): Required, must be unique.
-        - username (str): Required.
-        - password1 (str): Required, first password field.
-        - password2 (str): Required, second password field (confirmation).
-
-    Methods:
-        - clean_email(): Ensures email uniqueness in the database.
-    """
-    first_name = forms.CharField(
-        required=True,
-        min_length=3,
-    )
-
-    last_name = forms.CharField(
-        required=True,
-        min_length=3,
-    )
-
-    email = forms.EmailField(
-        required=True
-    )
-    class Meta:
-        model = User
-        fields = (
-            'first_name',
-            'last_name',
-            'email',
-            'username',
-            'password1',
-            'password2',
-        )
-
-    def clean_email(self):
-        """Checks if the email is already registered."""
-        email = self.cleaned_data.get('email')
-
-        if User.objects.filter(email=email).exists():
-            self.add_error('email',
-                ValidationError('Já existe um email cadastrado igual a este!',code='invalid')
-            )
-            
-        return email
-    
-
-class RegisterUpdateForm(forms.ModelForm):
+def __getattr__(name):
     """
-    Handles user profile updates, including password changes.
-
-    This form allows users to update their personal information and set a new password if desired.
-
-    Fields:
-        - first_name (str): Required, minimum length of 2 characters.
-        - last_name (str): Required, minimum length of 2 characters.
-        - email (EmailField): Required, must be unique.
-        - username (str): Required.
-        - password1 (str): Optional, new password field.
-        - password2 (str): Optional, confirmation of new password.
+    Loads the user forms on first use.
 
-    Methods:
-        - clean(): Validates that both password fields match.
-        - save(): Saves user data, updating password if provided.
-        - clean_email(): Ensures email uniqueness upon update.
-        - clean_password1(): Validates new password against Django's password policies.
+    They depend on `django.contrib.auth.forms` and the password validation
+    machinery, which only the user pages need, so they live in
+    `contact.auth_forms` and stay out of the worker start-up.
     """
-    first_name = forms.CharField(
-        min_length=2,
-        max_length=30,
-        required=True,
-        help_text='Required.',
-        error_messages={
-            'min_length': 'Please, add more than 2 letters.'
-        }
-    )
-    last_name = forms.CharField(
-        min_length=2,
-        max_length=30,
-        required=True,
-        help_text='Required.'
-    )
-
-    password1 = forms.CharField(
-        label="Password",
-        strip=False,
-        widget=forms.PasswordInput(attrs={"autocomplete": "new-password"}),
-        help_text=password_validation.password_validators_help_text_html(),
-        required=False,
-    )
-
-    password2 = forms.CharField(
-        label="Password 2",
-        strip=False,
-        widget=forms.PasswordInput(attrs={"autocomplete": "new-password"}),
-        help_text='Use the same password as before.',
-        required=False,
-    )
-
-    class Meta:
-        model = User
-        fields = (
-            'first_name',
-            'last_name',
-            'email',
-            'username',
-        )
-
-        def clean(self):
-            """Ensures that both passwords match if provided."""
-            password1 = self.cleaned_data.get('password1')
-            password2 = self.cleaned_data.get('password2')
-
-            if password1 or password2:
-                if password1 != password2:
-                    self.add_error(
-                        'password2',
-                        ValidationError('Senhas não batem')
-                    )
-
-            return super().clean()
-            
-        def save(self, commit=True):
-            """Saves the user data, updating the password if provided."""
-            cleaned_data = self.cleaned_data
-            user = super().save(commit=False)
-            password = cleaned_data.get('password1')
-
-            if password:
-                user.set_password(password)
-
-            if commit:
-                user.save()
-
-            return user
-
-        def clean_email(self):
-            """Ensures email uniqueness when updating."""
-            email = self.cleaned_data.get('email')
-            current_email = self.instance.email
-
-            if current_email != email:
-                if User.objects.filter(email=email).exists():
-                    self.add_error(
-                        'email',
-                        ValidationError('Já existe este e-mail', code='invalid')
-                    )
-
-            return email
-        
-
-
-        def clean_password1(self):
-            """Validates new password using Django's built-in policies."""
-            password1 = self.cleaned_data.get('password1')
-
-            if password1:
-                try:
-                    password_validation.validate_password(password1)
-                except ValidationError as errors:
-                    self.add_error(
-                        'password1',
-                        ValidationError(errors)
-                    )
-
-            return password1
\ No newline at end of file
+    if name in ('RegisterForm', 'RegisterUpdateForm'):
+        from contact import auth_forms
+        return getattr(auth_forms, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
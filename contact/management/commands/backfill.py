@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Sum
+
+from contact.backfill import find_backfills, run_range, split_ranges
+from contact.models import BackfillCheckpoint
+
+
+class Command(BaseCommand):
+    """
+    Runs the pending backfills declared by `contact.backfill.Backfill`
+    migration operations, in throttled and resumable primary key batches.
+
+    Usage:
+        python manage.py backfill --list
+        python manage.py backfill
+        python manage.py backfill contact_phone_digits --workers 4 --sleep 0.2
+    """
+
+    help = 'Runs pending data backfills in resumable primary key batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help='Backfills to run (default: every unfinished one).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Primary keys updated per transaction.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Seconds to wait between batches.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Ranges processed in parallel.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to backfill.',
+        )
+        parser.add_argument(
+            '--list', action='store_true',
+            help='Only show the progress of every backfill.',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        checkpoints = BackfillCheckpoint.objects.using(using)
+
+        if options['list']:
+            self.list_progress(checkpoints)
+            return
+
+        names = options['names'] or list(
+            checkpoints.filter(completed=False)
+            .order_by('name')
+            .values_list('name', flat=True)
+            .distinct()
+        )
+        if not names:
+            self.stdout.write('No pending backfill.')
+            return
+
+        backfills = find_backfills()
+        for name in names:
+            if name not in backfills:
+                raise CommandError(f'No Backfill operation named {name!r} in the migrations.')
+
+        for name in names:
+            app_label, backfill = backfills[name]
+            model = apps.get_model(app_label, backfill.model_name)
+            self.run(backfill, model, using, options)
+
+    def run(self, backfill, model, using, options):
+        pending = split_ranges(BackfillCheckpoint, backfill.name, options['workers'], using)
+        if not pending:
+            self.stdout.write(f'{backfill.name}: already complete.')
+            return
+
+        self.stdout.write(f'{backfill.name}: {len(pending)} ranges to process.')
+        stop = threading.Event()
+        lock = threading.Lock()
+        verbosity = options['verbosity']
+
+        def progress(checkpoint, rows):
+            if verbosity >= 2:
+                with lock:
+                    self.stdout.write(
+                        f'  [{checkpoint.start}, {checkpoint.end}) '
+                        f'at {checkpoint.position}: {rows} rows'
+                    )
+
+        def work(checkpoint):
+            try:
+                run_range(
+                    backfill, model, checkpoint,
+                    batch_size=options['batch_size'],
+                    sleep=options['sleep'],
+                    using=using,
+                    progress=progress,
+                    stop=stop,
+                )
+            finally:
+                # Each thread has its own connection
+                connections[using].close()
+            return checkpoint
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(work, checkpoint) for checkpoint in pending]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                stop.set()
+                self.stderr.write('Interrupted, finishing the current batches...')
+                raise
+
+        rows = sum(checkpoint.rows for checkpoint in pending)
+        self.stdout.write(self.style.SUCCESS(
+            f'{backfill.name}: done, {rows} rows updated in the processed ranges.'
+        ))
+
+    def list_progress(self, checkpoints):
+        summary = (
+            checkpoints
+            .values('name')
+            .annotate(
+                total=Sum(F('end') - F('start')),
+                done=Sum(F('position') - F('start')),
+                rows=Sum('rows'),
+            )
+            .order_by('name')
+        )
+        for row in summary:
+            percent = 100 * row['done'] / row['total'] if row['total'] else 100
+            self.stdout.write(
+                f"{row['name']:40} {percent:6.1f}%  {row['rows']} rows updated"
+            )
@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from contact.backup import BackupError, backup_postgresql, backup_sqlite
+
+
+class Command(BaseCommand):
+    """
+    Backs up the database while the site keeps running.
+
+    SQLite databases are copied with the online backup API in small steps,
+    checked, and written as parallel-compressed chunks; ``--incremental``
+    only stores the pages changed since a previous backup. PostgreSQL
+    databases are dumped with ``pg_dump`` in directory format.
+
+    Usage:
+        python manage.py backup_db backups/full.gz
+        python manage.py backup_db backups/monday.gz --incremental backups/full.gz
+    """
+
+    help = 'Makes an online (optionally incremental) backup of the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Backup file (a directory for PostgreSQL).')
+        parser.add_argument(
+            '--incremental', metavar='PARENT',
+            help='Only store the pages changed since this backup (SQLite).',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Pages copied per backup step (SQLite).',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.05,
+            help='Seconds between backup steps, left to writers (SQLite).',
+        )
+        parser.add_argument(
+            '--level', type=int, default=6, choices=range(0, 10),
+            help='Compression level.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Chunks (PostgreSQL: tables) compressed in parallel.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to back up.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        output = Path(options['output'])
+        if output.exists():
+            raise CommandError(f'{output} already exists.')
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            if connection.vendor == 'sqlite':
+                self.backup_sqlite(connection, output, options)
+            elif connection.vendor == 'postgresql':
+                if options['incremental']:
+                    raise CommandError(
+                        'Incremental PostgreSQL backups need pg_basebackup --incremental '
+                        '(PostgreSQL 17+) and a WAL archive; use full dumps here.'
+                    )
+                backup_postgresql(
+                    connection.settings_dict, output,
+                    level=options['level'], workers=options['workers'],
+                )
+                self.stdout.write(self.style.SUCCESS(f'Dumped to {output}.'))
+            else:
+                raise CommandError(f'Backups of {connection.vendor} databases are not supported.')
+        except BackupError as error:
+            raise CommandError(str(error))
+
+    def backup_sqlite(self, connection, output, options):
+        database = connection.settings_dict['NAME']
+        if str(database) == ':memory:' or not Path(database).is_file():
+            raise CommandError(f'{database} is not an SQLite database file.')
+
+        verbosity = options['verbosity']
+
+        def progress(status, remaining, total):
+            if verbosity >= 2:
+                self.stdout.write(f'  copied {total - remaining}/{total} pages')
+
+        manifest = backup_sqlite(
+            database, output,
+            parent=options['incremental'],
+            pages=options['pages'],
+            sleep=options['sleep'],
+            level=options['level'],
+            workers=options['workers'],
+            progress=progress,
+        )
+
+        stored = sum(chunk['pages'] for chunk in manifest['chunks'])
+        size = output.stat().st_size
+        self.stdout.write(self.style.SUCCESS(
+            f"{manifest['type'].capitalize()} backup written to {output}: "
+            f"{stored}/{manifest['page_count']} pages, {size / 1024 / 1024:.1f} MiB, "
+            f"sha256 {manifest['sha256'][:16]}."
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contact.snapshot import refresh_snapshot, snapshot_path
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the memory-mapped listing snapshot (see `contact.snapshot`).
+
+    Workers refresh the snapshot on their own after contact changes; run
+    this after a deploy, or from cron with ``--full`` to rewrite it from
+    scratch once in a while.
+
+    Usage:
+        DJANGO_CONTACT_SNAPSHOT=listing.snapshot python manage.py build_snapshot --full
+    """
+
+    help = 'Rebuilds the memory-mapped snapshot of the contact listing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Read every row from the database instead of the changed ones.',
+        )
+
+    def handle(self, *args, **options):
+        path = snapshot_path()
+        if not path:
+            raise CommandError(
+                'CONTACT_SNAPSHOT_PATH is not set (DJANGO_CONTACT_SNAPSHOT), or the '
+                'default cache is not shared (DJANGO_CACHE_URL).'
+            )
+
+        started = time.perf_counter()
+        result = refresh_snapshot(path, full=options['full'])
+        if result is None:
+            raise CommandError('Another process is rebuilding the snapshot.')
+
+        rows, read = result
+        if not options['full'] and result == (0, 0):
+            self.stdout.write('The snapshot is up to date.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {rows} contacts to {path} ({read} read from the database) '
+            f'in {time.perf_counter() - started:.2f}s.'
+        ))
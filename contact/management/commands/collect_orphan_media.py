@@ -0,0 +1,224 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from contact.models import Contact
+from contact.sharding import all_contacts
+from contact.storage import directory_lock
+
+# Directory (inside MEDIA_ROOT) where orphans are moved with --quarantine
+QUARANTINE_DIR = '.quarantine'
+
+# The only directory scanned: where Contact pictures are stored. Anything
+# else in MEDIA_ROOT (quarantine, uploads in progress) is never touched.
+PICTURES_DIR = Contact._meta.get_field('picture').upload_to
+
+# Largest number of names sent in one ``picture__in`` query (SQLite limit)
+QUERY_CHUNK_SIZE = 900
+
+
+class MediaScanner:
+    """
+    Walks a directory tree with ``os.scandir`` across a pool of threads.
+
+    Each worker scans one directory at a time and queues the
+    subdirectories it finds for any idle worker, so deep and wide trees
+    (like the content-addressed ``pictures/ab/cd/`` shards) are spread
+    over every worker. Files are handed to the consumer in batches through
+    a bounded queue, which keeps memory use flat however big the tree is.
+
+    Args:
+        root (Path): Directory the yielded names are relative to.
+        workers (int): Number of scanning threads.
+        batch_size (int): Files per batch.
+        start (str): Directory (relative to root) to scan, root itself
+            by default.
+    """
+
+    def __init__(self, root, workers, batch_size, start=''):
+        self.root = Path(root)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.start = self.root / start
+
+        self.directories = queue.Queue()
+        self.results = queue.Queue(maxsize=workers * 4)
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def batches(self):
+        """Yields lists of ``(name, mtime, size)`` tuples."""
+        self.pending = 1
+        self.directories.put(self.start)
+
+        threads = [
+            threading.Thread(target=self.work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        while finished < self.workers:
+            batch = self.results.get()
+            if batch is None:
+                finished += 1
+            elif batch:
+                yield batch
+
+        for thread in threads:
+            thread.join()
+
+    def work(self):
+        batch = []
+        while True:
+            directory = self.directories.get()
+            if directory is None:
+                break
+
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            with self.lock:
+                                self.pending += 1
+                            self.directories.put(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            name = Path(entry.path).relative_to(self.root).as_posix()
+                            batch.append((name, stat.st_mtime, stat.st_size))
+                            if len(batch) >= self.batch_size:
+                                self.results.put(batch)
+                                batch = []
+            except OSError:
+                # The directory vanished or is unreadable, skip it
+                pass
+
+            with self.lock:
+                self.pending -= 1
+                done = self.pending == 0
+            if done:
+                for _ in range(self.workers):
+                    self.directories.put(None)
+
+        self.results.put(batch)
+        self.results.put(None)
+
+
+def referenced_names(names):
+    """Returns which of the given names are used by a Contact picture."""
+    referenced = set()
+    for i in range(0, len(names), QUERY_CHUNK_SIZE):
+        referenced.update(
+            all_contacts(Contact.objects)
+            .filter(picture__in=names[i:i + QUERY_CHUNK_SIZE])
+            .values_list('picture', flat=True)
+        )
+    return referenced
+
+
+class Command(BaseCommand):
+    """
+    Finds pictures that no Contact references and removes them.
+
+    Usage:
+        python manage.py collect_orphan_media --dry-run
+        python manage.py collect_orphan_media --grace-hours 48 --quarantine
+    """
+
+    help = 'Deletes (or quarantines) media files not referenced by any contact.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be removed.',
+        )
+        parser.add_argument(
+            '--quarantine', action='store_true',
+            help=f'Move orphans to MEDIA_ROOT/{QUARANTINE_DIR} instead of deleting them.',
+        )
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Keep orphans modified more recently than this.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+            help='Number of threads scanning the media directory.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Files checked against the database at a time.',
+        )
+
+    def handle(self, *args, **options):
+        root = Path(settings.MEDIA_ROOT)
+        if not (root / PICTURES_DIR).is_dir():
+            self.stdout.write(f'MEDIA_ROOT/{PICTURES_DIR} does not exist, nothing to do.')
+            return
+
+        deadline = time.time() - options['grace_hours'] * 3600
+        quarantine = root / QUARANTINE_DIR / time.strftime('%Y%m%d-%H%M%S')
+        scanner = MediaScanner(
+            root,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            start=PICTURES_DIR,
+        )
+
+        scanned = orphans = recent = reclaimed = 0
+
+        for batch in scanner.batches():
+            scanned += len(batch)
+            referenced = referenced_names([name for name, _, _ in batch])
+
+            for name, mtime, size in batch:
+                if name in referenced:
+                    continue
+                if mtime > deadline:
+                    recent += 1
+                    continue
+
+                orphans += 1
+                reclaimed += size
+                if options['verbosity'] >= 2:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    self.remove(
+                        root, name, quarantine if options['quarantine'] else None, deadline,
+                    )
+
+        action = 'would be removed' if options['dry_run'] else 'removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{scanned} files scanned, {orphans} orphans {action} '
+            f'({reclaimed / 1024 / 1024:.1f} MiB), '
+            f'{recent} orphans kept for the grace period.'
+        ))
+
+    def remove(self, root, name, quarantine, deadline):
+        """
+        Deletes an orphan, or moves it under the quarantine directory.
+
+        An upload reusing the file since the scan touched it (under the
+        same directory lock, see `contact.storage`), so its date is checked
+        again before the file goes.
+        """
+        source = root / name
+        try:
+            with directory_lock(source.parent):
+                if source.stat().st_mtime > deadline:
+                    return
+                if quarantine is None:
+                    source.unlink()
+                else:
+                    target = quarantine / name
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(source, target)
+        except FileNotFoundError:
+            # Removed concurrently
+            pass
@@ -0,0 +1,62 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from contact.dedup import find_duplicates, merge_contacts
+from contact.models import Contact
+from contact.sharding import all_contacts, owner_contacts
+
+
+class Command(BaseCommand):
+    """
+    Finds duplicate contacts using blocking keys and parallel workers.
+
+    Contacts are only compared with contacts of the same owner, so every
+    cluster (and every merge) stays inside one user's contacts.
+
+    Usage:
+        python manage.py find_duplicates --workers 8
+        python manage.py find_duplicates --owner maria --merge
+    """
+
+    help = 'Lists (and optionally merges) clusters of duplicate contacts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes used to compare blocks.',
+        )
+        parser.add_argument(
+            '--owner',
+            help='Only look at contacts owned by this username.',
+        )
+        parser.add_argument(
+            '--merge', action='store_true',
+            help='Merge every cluster into its oldest contact.',
+        )
+
+    def handle(self, *args, **options):
+        contacts = all_contacts(Contact.objects.filter(show=True))
+
+        owner = None
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['owner']!r} does not exist.")
+            contacts = owner_contacts(owner).filter(show=True)
+
+        clusters = find_duplicates(contacts, workers=options['workers'])
+
+        for cluster in clusters:
+            self.stdout.write(' '.join(str(pk) for pk in cluster))
+
+            if options['merge']:
+                winner, *losers = cluster
+                merge_contacts(winner, losers, owner=owner)
+
+        action = 'merged' if options['merge'] else 'found'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(clusters)} duplicate clusters {action}.'
+        ))
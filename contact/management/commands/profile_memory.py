@@ -0,0 +1,64 @@
+import tracemalloc
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from contact.profiling import (
+    MEMORY_TRACE_FRAMES,
+    allocation_sites,
+    measure_memory,
+    take_snapshot,
+)
+
+
+class Command(BaseCommand):
+    """
+    Runs another management command while tracing its allocations.
+
+    Reports the peak and retained memory of the command and the allocation
+    sites that still hold memory once it returned, which is where a bulk
+    operation leaks (caches, querysets kept alive, module-level lists).
+
+    Usage:
+        python manage.py profile_memory find_duplicates -- --workers 1
+        python manage.py profile_memory --top 30 backfill
+    """
+
+    help = 'Measures the peak and retained memory of a management command.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('command', help='Command to run.')
+        parser.add_argument('args', nargs='*', help='Arguments of the command.')
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help='Allocation sites listed.',
+        )
+        parser.add_argument(
+            '--group-by', choices=('lineno', 'filename', 'traceback'), default='lineno',
+            help='How allocation sites are grouped.',
+        )
+
+    def handle(self, *args, **options):
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+        try:
+            before = take_snapshot()
+            _, peak, retained = measure_memory(call_command, options['command'], *args)
+            after = take_snapshot()
+        finally:
+            tracemalloc.stop()
+
+        mib = 1024 * 1024
+        self.stdout.write('')
+        self.stdout.write(f'Peak:     {peak / mib:.1f} MiB')
+        self.stdout.write(f'Retained: {retained / mib:.1f} MiB')
+        self.stdout.write('Sites still holding memory:')
+
+        growth = [
+            stat for stat in after.compare_to(before, options['group_by'])
+            if stat.size_diff > 0
+        ]
+        for site in allocation_sites(growth, options['top']):
+            self.stdout.write(
+                f"  {site['site']:70} +{site['size_diff'] / 1024:9.1f} KiB "
+                f"({site['count_diff']:+d} blocks)"
+            )
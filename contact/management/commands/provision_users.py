@@ -0,0 +1,323 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from contact.caching import bump_jump_generation, bump_listing_generation
+from contact.models import Category, Contact
+from contact.sharding import assign_ids, contact_database
+
+USER_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'password')
+CONTACT_COLUMNS = ('username', 'first_name', 'last_name', 'phone', 'email')
+
+# Same minimum as the names of RegisterForm
+NAME_MIN_LENGTH = 3
+
+# Largest number of values sent in one ``__in`` query (SQLite limit)
+QUERY_CHUNK_SIZE = 900
+
+
+def init_worker():
+    # Workers started with "spawn" (macOS, Windows) begin without Django
+    django.setup()
+
+
+def hash_password(row, validate_only=False):
+    """
+    Validates and hashes the password of one CSV row, in a worker process.
+
+    A blank password gives an unusable one (the user sets it through a
+    password reset).
+
+    Returns:
+        tuple: ``(hash, None)``, or ``(None, error message)``.
+    """
+    password = row['password']
+    if not password:
+        return make_password(None), None
+
+    user = User(
+        username=row['username'],
+        email=row['email'],
+        first_name=row['first_name'],
+        last_name=row['last_name'],
+    )
+    try:
+        validate_password(password, user)
+    except ValidationError as error:
+        return None, ' '.join(error.messages)
+
+    if validate_only:
+        return '', None
+    return make_password(password), None
+
+
+def existing_values(field, values):
+    """Returns which of the values are already used by a user, in chunks."""
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), QUERY_CHUNK_SIZE):
+        found.update(
+            User.objects
+            .filter(**{f'{field}__in': values[i:i + QUERY_CHUNK_SIZE]})
+            .values_list(field, flat=True)
+        )
+    return found
+
+
+def read_csv(path, columns):
+    """Reads a UTF-8 CSV file, checking that it has the required columns."""
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            reader = csv.DictReader(file)
+            missing = set(columns) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(
+                    f"{path} is missing the columns: {', '.join(sorted(missing))}."
+                )
+            return [
+                (reader.line_num, {key: (value or '').strip() for key, value in row.items() if key})
+                for row in reader
+            ]
+    except OSError as error:
+        raise CommandError(f'Cannot read {path}: {error}')
+
+
+class Command(BaseCommand):
+    """
+    Creates users in bulk from a CSV file.
+
+    Rows are checked like `RegisterForm` (names, e-mail format and
+    uniqueness, password validators) with set-based queries instead of
+    one query per user, passwords are hashed in a process pool across all
+    cores and users are inserted with ``bulk_create``. Rejected rows are
+    reported with their line number and nothing is created for them.
+
+    The users CSV has the columns ``username, email, first_name, last_name,
+    password``; a blank password creates the user with an unusable one.
+    The optional contacts CSV has ``username, first_name, last_name, phone,
+    email`` and may add ``description`` and ``category``.
+
+    Usage:
+        python manage.py provision_users users.csv --dry-run
+        python manage.py provision_users users.csv --contacts contacts.csv
+    """
+
+    help = 'Creates users (and their initial contacts) in bulk from CSV files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', help='CSV file of the users to create.')
+        parser.add_argument(
+            '--contacts',
+            help='CSV file of initial contacts, owned by the user in its username column.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes hashing passwords.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows inserted per query.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only validate the files.',
+        )
+
+    def handle(self, *args, **options):
+        rows = read_csv(options['users'], USER_COLUMNS)
+        rows, rejected = self.validate_users(rows)
+
+        # Passwords: validated and hashed in parallel
+        validate_only = options['dry_run']
+        hashes = []
+        if rows:
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=init_worker
+            ) as executor:
+                hashes = list(executor.map(
+                    partial(hash_password, validate_only=validate_only),
+                    [row for _, row in rows],
+                    chunksize=max(1, min(64, len(rows) // (options['workers'] * 4))),
+                ))
+
+        users = []
+        for (line, row), (password, error) in zip(rows, hashes):
+            if error:
+                rejected.append((line, error))
+                continue
+            users.append(User(
+                username=row['username'],
+                email=row['email'],
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                password=password,
+            ))
+
+        for line, error in sorted(rejected):
+            self.stderr.write(f'{options["users"]}:{line}: {error}')
+
+        contacts = []
+        if options['contacts']:
+            contacts = self.read_contacts(
+                options['contacts'], {user.username for user in users}
+            )
+
+        if validate_only:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(users)} users and {len(contacts)} contacts would be created, '
+                f'{len(rejected)} rows rejected.'
+            ))
+            return
+
+        batch_size = options['batch_size']
+        created = 0
+        try:
+            for i in range(0, len(users), batch_size):
+                with transaction.atomic():
+                    User.objects.bulk_create(users[i:i + batch_size])
+                created += len(users[i:i + batch_size])
+        except IntegrityError as error:
+            raise CommandError(
+                f'{created} users created, then a batch failed '
+                f'(was a user registered meanwhile?): {error}'
+            )
+
+        if contacts:
+            self.create_contacts(contacts, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} users and {len(contacts)} contacts created, '
+            f'{len(rejected)} rows rejected.'
+        ))
+
+    def validate_users(self, rows):
+        """
+        Checks the rows that need no password work.
+
+        Returns:
+            tuple: The valid ``(line, row)`` pairs and ``(line, error)`` pairs.
+        """
+        valid = []
+        rejected = []
+        usernames = set()
+        emails = set()
+
+        for line, row in rows:
+            error = self.row_error(row)
+            if error is None and row['username'] in usernames:
+                error = f"Username {row['username']!r} appears twice in the file."
+            if error is None and row['email'] in emails:
+                error = f"E-mail {row['email']!r} appears twice in the file."
+            if error:
+                rejected.append((line, error))
+                continue
+            usernames.add(row['username'])
+            emails.add(row['email'])
+            valid.append((line, row))
+
+        # One set-based lookup per column instead of a query per user
+        taken_usernames = existing_values('username', usernames)
+        taken_emails = existing_values('email', emails)
+
+        remaining = []
+        for line, row in valid:
+            if row['username'] in taken_usernames:
+                rejected.append((line, f"Username {row['username']!r} already exists."))
+            elif row['email'] in taken_emails:
+                rejected.append((line, 'Já existe um email cadastrado igual a este!'))
+            else:
+                remaining.append((line, row))
+        return remaining, rejected
+
+    def row_error(self, row):
+        if not row['username']:
+            return 'Username is required.'
+        try:
+            User.username_validator(row['username'])
+            validate_email(row['email'])
+        except ValidationError as error:
+            return ' '.join(error.messages)
+        max_length = User._meta.get_field('username').max_length
+        if len(row['username']) > max_length:
+            return f'Username is longer than {max_length} characters.'
+        for field in ('first_name', 'last_name'):
+            if len(row[field]) < NAME_MIN_LENGTH:
+                return f'{field} must have at least {NAME_MIN_LENGTH} characters.'
+        return None
+
+    def read_contacts(self, path, new_usernames):
+        """
+        Builds the contacts of the contacts CSV, without saving them.
+
+        Owners are the users being created or existing ones; rows of
+        unknown or rejected users are reported and skipped.
+        """
+        rows = read_csv(path, CONTACT_COLUMNS)
+        owners = {row['username'] for _, row in rows} - new_usernames
+        existing = existing_values('username', owners)
+
+        contacts = []
+        for line, row in rows:
+            owner = row['username']
+            if owner not in new_usernames and owner not in existing:
+                self.stderr.write(f'{path}:{line}: Unknown user {owner!r}.')
+                continue
+            if not row['first_name']:
+                self.stderr.write(f'{path}:{line}: first_name is required.')
+                continue
+
+            contacts.append((owner, row.get('category', ''), Contact(
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                phone=row['phone'],
+                email=row['email'],
+                description=row.get('description', ''),
+            )))
+        return contacts
+
+    def create_contacts(self, contacts, batch_size):
+        """Links the contacts to their owner and category and inserts them."""
+        usernames = list({owner for owner, _, _ in contacts})
+        owner_ids = {}
+        for i in range(0, len(usernames), QUERY_CHUNK_SIZE):
+            owner_ids.update(
+                User.objects
+                .filter(username__in=usernames[i:i + QUERY_CHUNK_SIZE])
+                .values_list('username', 'id')
+            )
+
+        category_ids = {}
+        for _, name, _ in contacts:
+            if name and name not in category_ids:
+                # Category names are not unique, reuse the first one
+                category = Category.objects.filter(name=name).order_by('id').first() \
+                    or Category.objects.create(name=name)
+                category_ids[name] = category.id
+
+        # Each owner's contacts go to its shard
+        by_database = {}
+        for owner, category, contact in contacts:
+            contact.owner_id = owner_ids[owner]
+            contact.category_id = category_ids.get(category)
+            database = contact_database(contact.owner_id, create=True)
+            by_database.setdefault(database, []).append(contact)
+
+        for database, objects in by_database.items():
+            assign_ids(objects)
+            for i in range(0, len(objects), batch_size):
+                with transaction.atomic(using=database):
+                    Contact.objects.using(database).bulk_create(objects[i:i + batch_size])
+
+        # bulk_create does not send post_save, so invalidate the listings here
+        bump_listing_generation()
+        bump_jump_generation()
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from contact.models import AuditEntry
+
+
+def parse_month(value):
+    """``YYYY-MM`` to the ``YYYYMM`` key of `AuditEntry.month`."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise CommandError(f'{value!r} is not a month (YYYY-MM).')
+    if not 1 <= month <= 12:
+        raise CommandError(f'{value!r} is not a month (YYYY-MM).')
+    return year * 100 + month
+
+
+class Command(BaseCommand):
+    """
+    Deletes the audit history older than a month.
+
+    Rows are found through the ``(month, id)`` index and deleted in small
+    primary key batches, each in its own transaction, so the purge never
+    holds the write lock for long.
+
+    Usage:
+        python manage.py purge_audit --list
+        python manage.py purge_audit 2025-10
+    """
+
+    help = 'Deletes the audit entries of the months before the given one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('before', nargs='?', help='First month kept (YYYY-MM).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Entries deleted per transaction.',
+        )
+        parser.add_argument(
+            '--list', action='store_true',
+            help='Only show the months in the log and their entry counts.',
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            months = AuditEntry.objects.order_by('month').values_list('month').distinct()
+            for (month,) in months:
+                count = AuditEntry.objects.filter(month=month).count()
+                self.stdout.write(f'{month // 100}-{month % 100:02d}  {count}')
+            return
+
+        if not options['before']:
+            raise CommandError('Give the first month to keep (YYYY-MM), or --list.')
+        before = parse_month(options['before'])
+
+        deleted = 0
+        old = AuditEntry.objects.filter(month__lt=before)
+        while ids := list(old.order_by('month', 'id').values_list('id', flat=True)[:options['batch_size']]):
+            with transaction.atomic():
+                deleted += AuditEntry.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} audit entries before {options["before"]}.'
+        ))
@@ -0,0 +1,185 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from contact.caching import bump_listing_generation
+from contact.models import Contact, ContactShard
+from contact.sharding import (
+    SHARD_MAP_CHECK_INTERVAL, contact_database, next_map_version, shard_databases,
+)
+
+# Fields copied with every contact (auto_now would overwrite updated_date)
+COPIED_FIELDS = [
+    field.name for field in Contact._meta.concrete_fields if not field.primary_key
+]
+
+
+class Command(BaseCommand):
+    """
+    Moves the contacts of an owner to another shard while the site runs.
+
+    1. The contacts are copied to the target shard in primary key batches,
+       keeping their ids, then copy passes catch up with the contacts
+       changed meanwhile.
+    2. The shard map is switched: new reads and writes go to the target.
+       The row gets a new map version, which every process checks at
+       least every ``SHARD_MAP_CHECK_INTERVAL`` seconds.
+    3. After ``--settle`` seconds (every process has seen the switch and
+       the requests that started before it finish), a last pass copies
+       the late changes still made on the source, keeping the newest
+       version of each contact.
+    4. The contacts are deleted from the source shard, each batch right
+       after its view counters are copied again.
+
+    Usage:
+        python manage.py rebalance_shard maria shard2
+    """
+
+    help = "Moves an owner's contacts to another shard, online."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner whose contacts are moved.')
+        parser.add_argument('database', help='Target shard (an alias of CONTACT_SHARD_DATABASES).')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Contacts copied or deleted per transaction.',
+        )
+        parser.add_argument(
+            '--passes', type=int, default=5,
+            help='Largest number of catch-up passes before the switch.',
+        )
+        parser.add_argument(
+            '--settle', type=float, default=2.0,
+            help='Seconds to wait after the switch before the last pass.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+
+        target = options['database']
+        if target not in shard_databases():
+            raise CommandError(f'{target!r} is not in CONTACT_SHARD_DATABASES.')
+        source = contact_database(owner)
+        if source == target:
+            self.stdout.write(f'{owner.username} is already on {target}.')
+            return
+
+        if options['settle'] <= SHARD_MAP_CHECK_INTERVAL:
+            raise CommandError(
+                f'--settle must be longer than the {SHARD_MAP_CHECK_INTERVAL}s the '
+                'workers may take to see the new shard map.'
+            )
+        self.batch_size = options['batch_size']
+
+        # 1. Bulk copy, then catch up with the changes made during the copy
+        since = None
+        for _ in range(options['passes'] + 1):
+            started = timezone.now()
+            copied = self.copy(owner, source, target, since)
+            self.stdout.write(f'Copied {copied} contacts to {target}.')
+            since = started
+            if copied < self.batch_size:
+                break
+
+        # 2. Switch
+        switched = timezone.now()
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            ContactShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+                owner=owner, defaults={'database': target, 'version': next_map_version()},
+            )
+        self.stdout.write(f'{owner.username} now reads and writes on {target}.')
+
+        # 3. Late writes on the source, newest version wins
+        time.sleep(options['settle'])
+        copied = self.copy(owner, source, target, since, newer_only=True)
+        removed = self.sync_deletions(owner, source, target, switched)
+        self.stdout.write(f'Last pass: {copied} contacts copied, {removed} removed.')
+
+        # 4. Clean up the source
+        deleted = self.purge(owner, source, target)
+        bump_listing_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved the contacts of {owner.username} from {source} to {target} '
+            f'({deleted} deleted from {source}).'
+        ))
+
+    def copy(self, owner, source, target, since=None, newer_only=False):
+        """Upserts the owner's contacts changed since ``since`` into the target."""
+        rows = Contact.objects.using(source).filter(owner=owner).order_by('pk')
+        if since is not None:
+            rows = rows.filter(updated_date__gte=since)
+
+        copied = 0
+        last_pk = 0
+        while batch := list(rows.filter(pk__gt=last_pk)[:self.batch_size]):
+            last_pk = batch[-1].pk
+
+            with transaction.atomic(using=target):
+                if newer_only:
+                    current = dict(
+                        Contact.objects.using(target)
+                        .filter(pk__in=[contact.pk for contact in batch])
+                        .values_list('pk', 'updated_date')
+                    )
+                    batch = [
+                        contact for contact in batch
+                        if contact.pk not in current or contact.updated_date > current[contact.pk]
+                    ]
+                    if not batch:
+                        continue
+
+                updated = [contact.updated_date for contact in batch]
+                Contact.objects.using(target).bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=COPIED_FIELDS,
+                )
+                # bulk_create stamped updated_date with now, restore it
+                for contact, value in zip(batch, updated):
+                    contact.updated_date = value
+                Contact.objects.using(target).bulk_update(batch, ['updated_date'])
+            copied += len(batch)
+        return copied
+
+    def sync_deletions(self, owner, source, target, switched):
+        """Deletes from the target the contacts deleted on the source."""
+        on_source = set(
+            Contact.objects.using(source).filter(owner=owner).values_list('pk', flat=True)
+        )
+        # Contacts written on the target after the switch are the live ones
+        gone = [
+            pk for pk in Contact.objects.using(target)
+            .filter(owner=owner, updated_date__lt=switched)
+            .values_list('pk', flat=True)
+            if pk not in on_source
+        ]
+        for i in range(0, len(gone), self.batch_size):
+            Contact.objects.using(target).filter(pk__in=gone[i:i + self.batch_size]).delete()
+        return len(gone)
+
+    def purge(self, owner, source, target):
+        """
+        Deletes the owner's contacts from the source, in batches.
+
+        Views are flushed to both copies of a contact while it is moved,
+        and a flush running during a copy may reach only one of them, so
+        the counters of each batch are copied again from the source right
+        before it is deleted. The rows are deleted without signals: the
+        contacts live on in the target: they must not be announced as
+        deleted nor have their pictures released.
+        """
+        deleted = 0
+        rows = Contact.objects.using(source).filter(owner=owner).only(*Contact.COUNTER_FIELDS)
+        while batch := list(rows[:self.batch_size]):
+            Contact.objects.using(target).bulk_update(batch, Contact.COUNTER_FIELDS)
+            with transaction.atomic(using=source):
+                deleted += Contact.objects.using(source) \
+                    .filter(pk__in=[contact.pk for contact in batch])._raw_delete(source)
+        return deleted
@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from contact.backup import BackupError, restore_postgresql, restore_sqlite
+
+
+class Command(BaseCommand):
+    """
+    Restores a backup made by ``backup_db``, or only verifies it.
+
+    An SQLite backup chain (full backup plus incrementals) is rebuilt in a
+    temporary file with parallel writers, verified against its checksum
+    and integrity check, and only then moved over the database. Stop the
+    application servers first: open connections would keep using the old
+    file.
+
+    Usage:
+        python manage.py restore_db backups/monday.gz --check
+        python manage.py restore_db backups/monday.gz --workers 8
+    """
+
+    help = 'Restores (or verifies) a database backup made by backup_db.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', help='Backup file (the last of an incremental chain).')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only verify that the backup restores cleanly.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Chunks (PostgreSQL: tables) restored in parallel.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to restore.',
+        )
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Do not ask for confirmation.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        backup = Path(options['backup'])
+        check = options['check']
+
+        if not check and options['interactive']:
+            answer = input(
+                f"This replaces the {options['database']!r} database with {backup}.\n"
+                "Type 'yes' to continue, or 'no' to cancel: "
+            )
+            if answer != 'yes':
+                self.stdout.write('Restore cancelled.')
+                return
+
+        try:
+            if connection.vendor == 'sqlite':
+                connection.close()
+                restore_sqlite(
+                    backup,
+                    None if check else connection.settings_dict['NAME'],
+                    workers=options['workers'],
+                    progress=lambda path: self.stdout.write(f'  applying {path}'),
+                )
+            elif connection.vendor == 'postgresql':
+                connection.close()
+                restore_postgresql(
+                    connection.settings_dict, backup,
+                    workers=options['workers'], check=check,
+                )
+            else:
+                raise CommandError(f'Restoring {connection.vendor} databases is not supported.')
+        except BackupError as error:
+            raise CommandError(str(error))
+
+        action = 'verified' if check else 'restored'
+        self.stdout.write(self.style.SUCCESS(f'Backup {backup} {action}.'))
@@ -0,0 +1,164 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter (started with -X importtime): loads the WSGI
+# application, then serves one request and reports timings and memory.
+PROBE = r'''
+import io, json, sys, time
+
+def rss():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+module, path, host = sys.argv[1:4]
+start = time.perf_counter()
+application = __import__(module, fromlist=['application']).application
+loaded = time.perf_counter()
+rss_loaded = rss()
+
+environ = {
+    'REQUEST_METHOD': 'GET',
+    'PATH_INFO': path,
+    'QUERY_STRING': '',
+    'SERVER_NAME': host,
+    'SERVER_PORT': '80',
+    'HTTP_HOST': host,
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'http',
+    'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+}
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+answered = time.perf_counter()
+
+print(json.dumps({
+    'load': loaded - start,
+    'first_response': answered - loaded,
+    'status': statuses[0] if statuses else None,
+    'bytes': len(body),
+    'rss_loaded': rss_loaded,
+    'rss_answered': rss(),
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_importtime(lines):
+    """
+    Builds the import tree from ``-X importtime`` output.
+
+    Python prints each module after its dependencies, indented two spaces
+    per level, so children are collected until their parent line shows up.
+
+    Returns:
+        list[dict]: Root nodes with ``name``, ``self``, ``total`` (seconds)
+        and ``children``.
+    """
+    pending = {}
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        own, total, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        node = {
+            'name': name.strip(),
+            'self': int(own) / 1_000_000,
+            'total': int(total) / 1_000_000,
+            'children': pending.pop(depth + 1, []),
+        }
+        pending.setdefault(depth, []).append(node)
+
+    return pending.get(0, [])
+
+
+class Command(BaseCommand):
+    """
+    Reports what a cold worker spends before and while serving its first
+    request: an import-time tree, the load and first response times and
+    the resident memory at each point.
+
+    Usage:
+        python manage.py startup_profile
+        python manage.py startup_profile --path /search/?q=ana --min-ms 5
+    """
+
+    help = 'Profiles worker start-up: import tree, time to first response and RSS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module', default=settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+            help='Module exposing the WSGI application.',
+        )
+        parser.add_argument('--path', default='/', help='Path of the first request.')
+        parser.add_argument('--host', default='localhost', help='Host header of the first request.')
+        parser.add_argument(
+            '--min-ms', type=float, default=2.0,
+            help='Hide imports faster than this (cumulative).',
+        )
+        parser.add_argument(
+            '--depth', type=int, default=6,
+            help='Deepest import level shown.',
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ['DJANGO_SETTINGS_MODULE'])
+
+        process = subprocess.run(
+            [
+                sys.executable, '-X', 'importtime', '-c', PROBE,
+                options['module'], options['path'], options['host'],
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        roots = parse_importtime(process.stderr.splitlines())
+
+        self.stdout.write('Import tree (cumulative / self):')
+        for node in sorted(roots, key=lambda node: node['total'], reverse=True):
+            self.write_node(node, 0, options['min_ms'] / 1000, options['depth'])
+
+        mib = 1024 * 1024
+        self.stdout.write('')
+        self.stdout.write(f"Modules loaded:        {result['modules']}")
+        self.stdout.write(f"Application load:      {result['load'] * 1000:.1f} ms")
+        self.stdout.write(
+            f"First response:        {result['first_response'] * 1000:.1f} ms "
+            f"({result['status']}, {result['bytes']} bytes)"
+        )
+        self.stdout.write(f"RSS after load:        {result['rss_loaded'] / mib:.1f} MiB")
+        self.stdout.write(f"RSS after 1st request: {result['rss_answered'] / mib:.1f} MiB")
+
+    def write_node(self, node, level, threshold, max_depth):
+        if node['total'] < threshold or level > max_depth:
+            return
+
+        self.stdout.write(
+            f"{'  ' * level}{node['name']:<{60 - 2 * level}} "
+            f"{node['total'] * 1000:8.1f} ms {node['self'] * 1000:7.1f} ms"
+        )
+        for child in sorted(node['children'], key=lambda child: child['total'], reverse=True):
+            self.write_node(child, level + 1, threshold, max_depth)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0006_remove_contact_user_contact_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
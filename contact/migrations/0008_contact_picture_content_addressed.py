@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 06:34
+
+import contact.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0007_contact_updated_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='picture',
+            field=models.ImageField(blank=True, db_index=True, storage=contact.storage.picture_storage, upload_to='pictures'),
+        ),
+    ]
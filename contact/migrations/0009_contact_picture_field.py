@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-19 06:37
+
+import contact.models
+import contact.storage
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0008_contact_picture_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='picture',
+            field=contact.models.ContactPictureField(blank=True, db_index=True, storage=contact.storage.picture_storage, upload_to='pictures'),
+        ),
+    ]
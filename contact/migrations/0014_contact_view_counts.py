@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-19 07:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0013_contact_sharding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contact_id', models.BigIntegerField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('last_viewed', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='last_viewed',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='view_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['view_count', 'id'], name='contact_view_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['last_viewed', 'id'], name='contact_last_viewed_idx'),
+        ),
+        migrations.AddField(
+            model_name='contactview',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='contactview',
+            index=models.Index(fields=['user', 'last_viewed'], name='contact_view_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='contactview',
+            constraint=models.UniqueConstraint(fields=('user', 'contact_id'), name='contact_view_user_contact'),
+        ),
+    ]
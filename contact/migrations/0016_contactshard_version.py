@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0015_auditentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactshard',
+            name='version',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+    ]
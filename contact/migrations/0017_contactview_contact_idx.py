@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0016_contactshard_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactview',
+            index=models.Index(fields=['contact_id'], name='contact_view_contact_idx'),
+        ),
+    ]
@@ -1,8 +1,25 @@
+from django.core.validators import FileExtensionValidator
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from contact.storage import picture_storage
+
 # Create your models here.
+class ContactPictureField(models.ImageField):
+    """
+    ImageField validated by extension only.
+
+    The default validator asks Pillow for every extension it supports,
+    which imports and initializes all of its plugins. The content itself is
+    already checked from its header by `contact.forms.PictureField`.
+    """
+
+    default_validators = [
+        FileExtensionValidator(['png', 'jpg', 'jpeg', 'jpe', 'gif', 'webp', 'bmp']),
+    ]
+
+
 class Category(models.Model):
     """
     Represents a category for contacts.
@@ -30,32 +47,249 @@ class Contact(models.Model):
         phone (str): Contact's phone number.
         email (str): Contact's email address.
         created_date (datetime): Timestamp of when the contact was created.
+        updated_date (datetime): Timestamp of the last change to the contact.
         description (str): Additional information about the contact.
         show (bool): Whether the contact is visible or not.
-        picture (ImageField): Contact's profile picture.
+        picture (ImageField): Contact's profile picture, stored once per
+            distinct content (see `contact.storage`).
         category (Category): Category associated with the contact.
         owner (User): The user who owns the contact.
+        view_count (int): Views of the contact page.
+        last_viewed (datetime): When the contact page was last viewed.
     """
+    class Meta:
+        indexes = [
+            # Name prefix search and name ordering, with id as tiebreaker
+            models.Index(fields=['first_name', 'id'], name='contact_first_name_idx'),
+            models.Index(fields=['last_name', 'id'], name='contact_last_name_idx'),
+            # Keyset pagination of the listing sorted by phone or e-mail
+            models.Index(fields=['phone', 'id'], name='contact_phone_idx'),
+            models.Index(fields=['email', 'id'], name='contact_email_idx'),
+            # Popular and recently viewed listings
+            models.Index(fields=['view_count', 'id'], name='contact_view_count_idx'),
+            models.Index(fields=['last_viewed', 'id'], name='contact_last_viewed_idx'),
+        ]
+
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     phone = models.CharField(max_length=50)
     email = models.EmailField(max_length=254)
     created_date = models.DateTimeField(default=timezone.now)
+    updated_date = models.DateTimeField(auto_now=True)
     description = models.TextField(blank=True)
     show = models.BooleanField(default=True)
-    picture = models.ImageField(blank=True, upload_to='pictures/%Y/%m')
+    picture = ContactPictureField(
+        blank=True,
+        upload_to='pictures',
+        storage=picture_storage,
+        db_index=True,
+    )
+    # No database constraints: contacts may live in another database than
+    # categories and users (see contact.sharding)
     category = models.ForeignKey(
                                 Category, 
                                  on_delete=models.SET_NULL, 
                                  blank=True, 
-                                 null= True
+                                 null= True,
+                                 db_constraint=False,
                                 )
     
     owner = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
-        blank=True, null=True)
+        blank=True, null=True,
+        db_constraint=False)
+    # Written in batches by contact.buffers, never through save(), so
+    # counting a view does not change updated_date
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+    last_viewed = models.DateTimeField(null=True, blank=True, editable=False)
 
-    
+    # Columns save() leaves alone on existing rows (see save)
+    COUNTER_FIELDS = ('view_count', 'last_viewed')
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the contact without the view counters of an existing row:
+        the values loaded at the start of a request are stale once a batch
+        of views is flushed, and writing them back would lose those views.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored picture, to release it when it is replaced
+        instance._loaded_picture = instance.__dict__.get('picture')
+        # And what the A–Z jump bar counts, to refresh it only when needed
+        instance._loaded_jump_key = instance.jump_key()
+        return instance
+
+    def jump_key(self):
+        """
+        What the A–Z jump bar counts of this contact: its visibility and
+        the initials of its names, or None when some are not loaded.
+        """
+        try:
+            show, first_name, last_name = (
+                self.__dict__[name] for name in ('show', 'first_name', 'last_name')
+            )
+        except KeyError:
+            return None
+        return show, first_name[:1], last_name[:1]
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Progress of one primary key range of a backfill.
+
+    A backfill starts as a single range; ``manage.py backfill --workers N``
+    splits the remaining part so N workers can run side by side.
+
+    Attributes:
+        name (str): The backfill (see `contact.backfill.Backfill`).
+        start (int): First primary key of the range.
+        end (int): Primary key after the range.
+        position (int): Next primary key to process.
+        rows (int): Rows updated so far.
+        completed (bool): Whether the whole range is done.
+        updated_date (datetime): Last checkpoint.
+    """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'start'], name='backfill_checkpoint_range',
+            ),
+        ]
+
+    name = models.CharField(max_length=100, db_index=True)
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+    position = models.BigIntegerField()
+    rows = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.name} [{self.start}, {self.end})'
+
+
+class ContactShard(models.Model):
+    """
+    Shard map: the database holding the contacts of each owner.
+
+    Owners get a row the first time a contact of theirs is written, and
+    ``manage.py rebalance_shard`` changes it when it moves their contacts.
+
+    Attributes:
+        owner (User): The owner.
+        database (str): Alias from ``CONTACT_SHARD_DATABASES``.
+        version (int): Map version of the last move, higher than every
+            earlier one; processes reload the rows above the version they
+            know (see `contact.sharding.ShardMap`).
+    """
+    owner = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='contact_shard',
+    )
+    database = models.CharField(max_length=100)
+    version = models.PositiveBigIntegerField(default=0, db_index=True)
 
- 
\ No newline at end of file
+    def __str__(self) -> str:
+        return f'{self.owner_id} -> {self.database}'
+
+
+class ContactIdAllocator(models.Model):
+    """
+    Next block of contact ids (hi/lo), so ids stay unique across shards.
+
+    Attributes:
+        next_block (int): First id of the next block handed out.
+    """
+    next_block = models.BigIntegerField()
+
+
+class ContactView(models.Model):
+    """
+    Views of a contact page by one user, for their recently viewed list.
+
+    Rows are upserted in batches by `contact.buffers.ViewCounter`. The
+    contact is referenced by id: it may live in another database (see
+    `contact.sharding`), so its rows are removed by a ``post_delete``
+    receiver, and moved to the kept contact by `contact.dedup.merge_contacts`.
+
+    Attributes:
+        user (User): The viewer.
+        contact_id (int): The contact viewed.
+        count (int): How many times the user viewed it.
+        last_viewed (datetime): The last view (precise to the flush interval).
+    """
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'contact_id'], name='contact_view_user_contact'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_viewed'], name='contact_view_recent_idx'),
+            # Cleanup when a contact is deleted or merged
+            models.Index(fields=['contact_id'], name='contact_view_contact_idx'),
+        ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    contact_id = models.BigIntegerField()
+    count = models.PositiveBigIntegerField(default=0)
+    last_viewed = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.user_id} viewed {self.contact_id} ({self.count})'
+
+
+class AuditEntry(models.Model):
+    """
+    One change made through the contact and profile forms.
+
+    Written in batches by `contact.audit`. ``changes`` is a compact JSON
+    diff, ``{"field": [old, new]}``: ``old`` is null on creation, ``new``
+    on deletion, and secrets (passwords) are recorded as changed without
+    their values. Entries are grouped by ``month`` (``YYYYMM``), the key
+    used to query and purge history one month at a time.
+
+    Attributes:
+        created_date (datetime): When the change was made.
+        month (int): ``created_date`` as ``YYYYMM``.
+        actor (User): Who made the change (null once the user is deleted).
+        action (str): ``create``, ``update`` or ``delete``.
+        target_type (str): ``contact`` or ``user``.
+        target_id (int): Id of the changed object.
+        changes (dict): The field diff.
+    """
+    class Meta:
+        verbose_name_plural = 'Audit entries'
+        indexes = [
+            models.Index(fields=['month', 'id'], name='audit_month_idx'),
+            models.Index(fields=['target_type', 'target_id', 'id'], name='audit_target_idx'),
+        ]
+
+    ACTIONS = [('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')]
+
+    created_date = models.DateTimeField(default=timezone.now)
+    month = models.PositiveIntegerField()
+    actor = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+    )
+    action = models.CharField(max_length=6, choices=ACTIONS)
+    target_type = models.CharField(max_length=20)
+    target_id = models.BigIntegerField()
+    changes = models.JSONField(default=dict)
+
+    def __str__(self) -> str:
+        return f'{self.action} {self.target_type} {self.target_id}'
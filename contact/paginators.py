@@ -0,0 +1,294 @@
+import base64
+import json
+import string
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+from django.utils.functional import cached_property
+
+from contact.caching import JUMP_GENERATION_KEY, get_generation
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+EXACT_COUNT_THRESHOLD = 10_000
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Returns the approximate number of rows of a model's table, or None.
+
+    The estimate comes from the database statistics (PostgreSQL
+    ``reltuples``, MySQL ``TABLE_ROWS``, SQLite ``sqlite_stat1`` after an
+    ``ANALYZE``), falling back on SQLite to the highest primary key, which
+    is read from the index and overestimates only by the deleted rows.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [table],
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table],
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            cursor.execute(
+                f'SELECT MAX({connection.ops.quote_name(pk)}) '
+                f'FROM {connection.ops.quote_name(table)}'
+            )
+        else:
+            return None
+
+        row = cursor.fetchone()
+
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids ``COUNT(*)`` on big unfiltered tables.
+
+    When the queryset has no filters the table statistics are used instead
+    of counting every row. Small tables and filtered querysets (which are
+    bounded by an index) are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(
+                self.object_list.model, using=self.object_list.db
+            )
+            if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+# Columns the listing can be sorted by, each backed by a ``(column, id)``
+# index (``id`` alone is the primary key)
+SORT_FIELDS = ('id', 'first_name', 'last_name', 'phone', 'email')
+
+# Sorts offering the A–Z jump bar
+JUMP_FIELDS = ('first_name', 'last_name')
+JUMP_LETTERS = tuple(string.ascii_uppercase)
+
+
+def parse_sort(value):
+    """
+    Validates a ``?sort=`` value against `SORT_FIELDS`.
+
+    Returns:
+        tuple | None: ``(field, descending)``, or None for unknown columns.
+    """
+    if not value:
+        return None
+    descending = value.startswith('-')
+    field = value[1:] if descending else value
+    if field not in SORT_FIELDS:
+        return None
+    return field, descending
+
+
+def sort_keys(field):
+    """Columns a sort orders by: the column, then id as tiebreaker."""
+    return ('id',) if field == 'id' else (field, 'id')
+
+
+def sort_ordering(field, descending=False):
+    """The ``order_by`` arguments of a sort."""
+    prefix = '-' if descending else ''
+    return [prefix + name for name in sort_keys(field)]
+
+
+def encode_cursor(key):
+    """Turns a sort key tuple into an opaque, URL-safe cursor."""
+    data = json.dumps(list(key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Reads a cursor made by `encode_cursor`.
+
+    Returns:
+        tuple | None: The sort key, or None when the cursor is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(data)
+    except (ValueError, TypeError):
+        return None
+    if (
+        not isinstance(key, list) or len(key) != size
+        or not isinstance(key[-1], int)
+        or not all(isinstance(value, str) for value in key[:-1])
+    ):
+        return None
+    return tuple(key)
+
+
+class KeysetPage:
+    """
+    One page of a `KeysetPaginator`.
+
+    Iterates like a Django ``Page``; instead of page numbers it carries the
+    cursors of its first and last rows.
+    """
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def next_cursor(self):
+        return encode_cursor(self.paginator.key(self.object_list[-1]))
+
+    def previous_cursor(self):
+        return encode_cursor(self.paginator.key(self.object_list[0]))
+
+
+class KeysetPaginator:
+    """
+    Paginates by seeking past the last row shown instead of using OFFSET.
+
+    Rows are ordered by ``(field, id)``, which matches a composite index,
+    and each page starts with an index seek on the key of the row before
+    it, so the thousandth page costs the same as the first one.
+
+    Args:
+        object_list (QuerySet): Rows to paginate (unordered).
+        field (str): One of `SORT_FIELDS`.
+        descending (bool): Sort direction.
+        per_page (int): Rows per page.
+    """
+
+    def __init__(self, object_list, field, descending=False, per_page=10):
+        self.object_list = object_list
+        self.field = field
+        self.keys = sort_keys(field)
+        self.descending = descending
+        self.per_page = per_page
+
+    def key(self, row):
+        return tuple(getattr(row, name) for name in self.keys)
+
+    def ordering(self, reverse=False):
+        return sort_ordering(self.field, self.descending != reverse)
+
+    def seek(self, key, reverse=False):
+        """Condition selecting the rows after ``key`` (before it if reversed)."""
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        if len(self.keys) == 1:
+            return Q(**{f'id__{lookup}': key[0]})
+
+        # "field >= value AND (field > value OR id > last_id)": the leading
+        # range keeps the condition usable as an index seek
+        field, value, last_id = self.keys[0], key[0], key[1]
+        return Q(**{f'{field}__{lookup}e': value}) & (
+            Q(**{f'{field}__{lookup}': value}) | Q(**{f'id__{lookup}': last_id})
+        )
+
+    def page(self, after=None, before=None, has_previous=None):
+        """
+        Returns the page following the ``after`` key, or preceding the
+        ``before`` key (the first page when neither is given).
+        """
+        backwards = after is None and before is not None
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.filter(self.seek(before, reverse=True))
+        elif after is not None:
+            queryset = queryset.filter(self.seek(after))
+
+        rows = list(
+            queryset.order_by(*self.ordering(reverse=backwards))[:self.per_page + 1]
+        )
+        more = len(rows) > self.per_page
+        del rows[self.per_page:]
+
+        if backwards:
+            rows.reverse()
+            return KeysetPage(self, rows, has_next=True, has_previous=more)
+        if has_previous is None:
+            has_previous = after is not None
+        return KeysetPage(self, rows, has_next=more, has_previous=has_previous)
+
+
+def letter_offsets(queryset, field):
+    """
+    Builds the A–Z jump table of a listing sorted by ``field``.
+
+    One grouped query counts the rows by initial. The table is cached until
+    a contact is added, deleted, hidden or shown, or changes the initial of
+    a name (the jump generation of `contact.caching`): other edits leave
+    the counts as they were.
+
+    Returns:
+        dict: ``{letter: (count, offset)}``, where ``offset`` is the number
+        of rows sorted before the letter.
+    """
+    cache_key = f'contact:letter-offsets:{field}:{get_generation(JUMP_GENERATION_KEY)}'
+    table = cache.get(cache_key)
+    if table is not None:
+        return table
+
+    # Sharded listings are counted on every shard
+    totals = {}
+    for shard in getattr(queryset, 'querysets', (queryset,)):
+        initials = (
+            shard
+            .order_by()
+            .annotate(initial=Substr(field, 1, 1))
+            .values_list('initial')
+            .annotate(rows=Count('id'))
+        )
+        for initial, rows in initials:
+            totals[initial or ''] = totals.get(initial or '', 0) + rows
+    counts = sorted(totals.items())
+
+    table = {}
+    for letter in JUMP_LETTERS:
+        # Plain code point comparisons, like the index seek on "field >= letter"
+        upper = chr(ord(letter) + 1)
+        offset = sum(rows for initial, rows in counts if initial < letter)
+        count = sum(rows for initial, rows in counts if letter <= initial < upper)
+        table[letter] = (count, offset)
+
+    cache.set(cache_key, table)
+    return table
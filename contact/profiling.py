@@ -0,0 +1,318 @@
+"""
+Template render profiling.
+
+When ``TEMPLATE_PROFILING`` is on, `TemplateProfilingMiddleware` hooks into
+Django's template engine and measures, for every request, the time spent
+rendering each template and each kind of tag (``URLNode``, ``ForNode``,
+``IncludeNode``...). Times are reported two ways:
+
+- *total*: inclusive time, children included;
+- *self*: time spent in the node itself, children excluded.
+
+The report is logged on the ``contact.profiling`` logger and the totals
+are sent in a ``Server-Timing`` header, visible in the browser dev tools.
+
+Memory profiling
+----------------
+
+When ``MEMORY_PROFILING`` is on, `MemoryProfilingMiddleware` traces
+allocations with ``tracemalloc`` and records, per view:
+
+- *peak*: the most memory the request held above what it started with;
+- *retained*: what was still allocated when the response was returned,
+  the amount a leak adds at every request.
+
+Every ``MEMORY_SNAPSHOT_INTERVAL`` requests a snapshot is compared with the
+previous one and the allocation sites that grew are kept. The staff-only
+``debug/memory/`` endpoint returns these as JSON, with the current top
+allocation sites; ``manage.py profile_memory`` measures a management
+command the same way.
+
+``tracemalloc`` traces the whole process: with several threads serving
+requests at once their allocations mix, so attribute leaks with one thread
+per worker. Tracing also slows every allocation down, so keep it off
+outside of an investigation.
+"""
+
+import linecache
+import logging
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.conf import settings
+from django.template.base import Node, Template
+
+logger = logging.getLogger('contact.profiling')
+
+_state = threading.local()
+_installed = False
+
+
+class RenderProfile:
+    """Render timings collected during one request."""
+
+    def __init__(self):
+        self.templates = defaultdict(lambda: [0, 0.0, 0.0])
+        self.tags = defaultdict(lambda: [0, 0.0, 0.0])
+        # Child time accumulated by each frame currently being rendered
+        self.stack = []
+
+    def enter(self):
+        self.stack.append(0.0)
+
+    def leave(self, table, key, elapsed):
+        children = self.stack.pop()
+        if self.stack:
+            self.stack[-1] += elapsed
+        row = table[key]
+        row[0] += 1
+        row[1] += elapsed
+        row[2] += elapsed - children
+
+    def report(self, limit=10):
+        """Returns the profile as readable lines, slowest first."""
+        lines = []
+        for title, table in (('template', self.templates), ('tag', self.tags)):
+            rows = sorted(table.items(), key=lambda item: item[1][2], reverse=True)
+            for key, (calls, total, own) in rows[:limit]:
+                lines.append(
+                    f'{title:8} {key:45} calls={calls:<5} '
+                    f'total={total * 1000:8.2f}ms self={own * 1000:8.2f}ms'
+                )
+        return lines
+
+
+def current_profile():
+    return getattr(_state, 'profile', None)
+
+
+def _profiled(method, table_name, key_func):
+    def wrapper(self, context):
+        profile = current_profile()
+        if profile is None:
+            return method(self, context)
+
+        profile.enter()
+        start = time.perf_counter()
+        try:
+            return method(self, context)
+        finally:
+            profile.leave(
+                getattr(profile, table_name),
+                key_func(self),
+                time.perf_counter() - start,
+            )
+    return wrapper
+
+
+def install_template_hooks():
+    """Wraps the template engine render methods (only once per process)."""
+    global _installed
+    if _installed:
+        return
+
+    Template._render = _profiled(
+        Template._render,
+        'templates',
+        lambda template: template.origin.template_name or template.name or '<string>',
+    )
+    Node.render_annotated = _profiled(
+        Node.render_annotated,
+        'tags',
+        lambda node: type(node).__name__,
+    )
+    _installed = True
+
+
+class TemplateProfilingMiddleware:
+    """Profiles the templates rendered by each request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_hooks()
+
+    def __call__(self, request):
+        _state.profile = profile = RenderProfile()
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.profile = None
+
+        if not profile.templates:
+            return response
+
+        logger.info(
+            'Template profile for %s\n%s',
+            request.path,
+            '\n'.join(profile.report()),
+        )
+
+        timings = [
+            f'tpl-{index};desc="{name}";dur={total * 1000:.2f}'
+            for index, (name, (_, total, _)) in enumerate(profile.templates.items())
+        ]
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+# Frames kept per traced allocation (more frames, more memory and time)
+MEMORY_TRACE_FRAMES = 10
+
+# Requests between two snapshots compared for leaks
+MEMORY_SNAPSHOT_INTERVAL = 100
+
+# Allocations of the tracer itself and of module imports are noise
+MEMORY_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(MEMORY_SNAPSHOT_FILTERS)
+
+
+def allocation_sites(statistics, limit):
+    """Turns ``tracemalloc`` statistics into JSON-ready rows."""
+    rows = []
+    for stat in statistics[:limit]:
+        frame = stat.traceback[0]
+        row = {
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size': stat.size,
+            'count': stat.count,
+        }
+        if isinstance(stat, tracemalloc.StatisticDiff):
+            row['size_diff'] = stat.size_diff
+            row['count_diff'] = stat.count_diff
+        rows.append(row)
+    return rows
+
+
+class MemoryUsage:
+    """Peak and retained memory of one view or command."""
+
+    def __init__(self):
+        self.calls = 0
+        self.peak = 0
+        self.retained = 0
+        self.last_retained = 0
+
+    def add(self, peak, retained):
+        self.calls += 1
+        self.peak = max(self.peak, peak)
+        self.retained += retained
+        self.last_retained = retained
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'max_peak': self.peak,
+            'retained': self.retained,
+            'last_retained': self.last_retained,
+        }
+
+
+def measure_memory(func, *args, **kwargs):
+    """
+    Calls a function while tracing its allocations.
+
+    Returns:
+        tuple: The result, the peak and the retained memory in bytes
+        (relative to the memory traced when the call started).
+    """
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    result = func(*args, **kwargs)
+    end, peak = tracemalloc.get_traced_memory()
+    return result, peak - start, end - start
+
+
+class MemoryTracker:
+    """The allocation statistics of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(MemoryUsage)
+        self.requests = 0
+        self.snapshot = None
+        self.growth = []
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+
+    def record(self, view, peak, retained):
+        with self.lock:
+            self.views[view].add(peak, retained)
+            self.requests += 1
+            compare = self.requests % MEMORY_SNAPSHOT_INTERVAL == 0
+
+        if compare:
+            self.compare_snapshots()
+
+    def compare_snapshots(self, limit=20):
+        """Keeps the sites that grew since the previous comparison."""
+        snapshot = take_snapshot()
+        with self.lock:
+            previous, self.snapshot = self.snapshot, snapshot
+        if previous is None:
+            return []
+
+        growth = [
+            stat for stat in snapshot.compare_to(previous, 'lineno')
+            if stat.size_diff > 0
+        ]
+        self.growth = allocation_sites(growth, limit)
+        if self.growth:
+            logger.info(
+                'Memory grew since the last snapshot, top site %s (+%d bytes)',
+                self.growth[0]['site'], self.growth[0]['size_diff'],
+            )
+        return self.growth
+
+    def report(self, limit=20):
+        """The statistics as a JSON-ready dict, heaviest views first."""
+        current, peak = tracemalloc.get_traced_memory()
+        with self.lock:
+            views = sorted(
+                self.views.items(), key=lambda item: item[1].retained, reverse=True
+            )
+            views = {name: usage.as_dict() for name, usage in views}
+        return {
+            'traced': current,
+            'traced_peak': peak,
+            'requests': self.requests,
+            'views': views,
+            'top_sites': allocation_sites(take_snapshot().statistics('lineno'), limit),
+            'growth': self.growth,
+        }
+
+
+memory_tracker = MemoryTracker()
+
+
+class MemoryProfilingMiddleware:
+    """Records the peak and retained allocations of each view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        memory_tracker.start()
+
+    def __call__(self, request):
+        response, peak, retained = measure_memory(self.get_response, request)
+
+        match = request.resolver_match
+        # One key for every unresolved path, or each 404 probe would add one
+        view = match.view_name if match else '<unresolved>'
+        memory_tracker.record(view, peak, retained)
+        return response
+
+
+def memory_profiling_enabled():
+    return getattr(settings, 'MEMORY_PROFILING', False) and tracemalloc.is_tracing()
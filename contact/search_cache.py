@@ -0,0 +1,155 @@
+"""
+In-process cache of search results.
+
+A search keeps only the ordered ids of the matching contacts, packed in an
+``array`` of 64-bit ints (8 bytes per contact), keyed by the normalized
+query, the owner the search is scoped to, the sort and the listing
+generation of `contact.caching`. Any contact change bumps the generation,
+so stale results are never read again and simply age out of the LRU.
+
+Paging through a cached result set costs no ``LIKE`` scan and no
+``COUNT(*)``: the paginator slices the id array and each page loads its
+rows with a single ``pk__in`` query.
+
+Only narrow searches are cached: a search matching more than
+``SEARCH_CACHE_MAX_IDS`` contacts reads at most that many ids plus one,
+is remembered as too broad and paged with ``LIMIT``/``OFFSET`` queries
+instead, so a one-letter search never loads every id just to show ten
+rows.
+
+Each worker process has its own cache, bounded by
+``SEARCH_CACHE_MAX_BYTES``.
+"""
+
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from functools import cache
+
+from django.conf import settings
+
+from contact.caching import LISTING_GENERATION_KEY, get_generation
+
+# Approximate cost of an entry besides its id array (key tuple, dict slot)
+ENTRY_OVERHEAD = 256
+
+# Cached in place of the ids of a search with too many results
+TOO_BROAD = array('q')
+
+ASCII_LOWER = str.maketrans(
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'
+)
+
+
+def normalize_query(value):
+    """
+    Normalizes a search term so equivalent searches share an entry.
+
+    Only changes that cannot alter the ``icontains`` results are made:
+    surrounding spaces, Unicode composition (NFC) and ASCII case, which
+    every database compares case-insensitively.
+    """
+    return unicodedata.normalize('NFC', value.strip()).translate(ASCII_LOWER)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU mapping of keys to id arrays, bounded by memory size.
+
+    Args:
+        max_bytes (int): Total size of the cached arrays. Result sets
+            bigger than a quarter of it are not cached.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(ids):
+        return sys.getsizeof(ids) + ENTRY_OVERHEAD
+
+    def get(self, key):
+        with self.lock:
+            ids = self.entries.get(key)
+            if ids is not None:
+                self.entries.move_to_end(key)
+            return ids
+
+    def set(self, key, ids):
+        size = self.entry_size(ids)
+        if size > self.max_bytes // 4:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= self.entry_size(previous)
+            self.entries[key] = ids
+            self.size += size
+
+            # Evict the least recently used entries
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.entry_size(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+@cache
+def result_cache():
+    """The search result cache of this process."""
+    return ResultCache(settings.SEARCH_CACHE_MAX_BYTES)
+
+
+def search_result_ids(queryset, query, sort, owner=None):
+    """
+    Returns the ordered ids matched by a search, from the cache if possible.
+
+    Args:
+        queryset (QuerySet): The filtered and ordered search; only
+            evaluated (for its ids) on a cache miss.
+        query (str): The normalized search term.
+        sort (str): The ordering the queryset uses.
+        owner (User | None): The owner the search is restricted to.
+
+    Returns:
+        array | None: Contact ids, in result order, or None when the
+        search matches more than ``SEARCH_CACHE_MAX_IDS`` contacts; the
+        caller then pages the queryset itself.
+    """
+    key = (
+        query,
+        getattr(owner, 'pk', None),
+        sort,
+        get_generation(LISTING_GENERATION_KEY),
+    )
+    results = result_cache()
+    ids = results.get(key)
+    if ids is None:
+        limit = settings.SEARCH_CACHE_MAX_IDS
+        ids = array('q', queryset.values_list('id', flat=True)[:limit + 1])
+        if len(ids) > limit:
+            ids = TOO_BROAD
+        results.set(key, ids)
+    return None if ids is TOO_BROAD else ids
+
+
+def load_page(page, queryset):
+    """
+    Replaces the ids of a paginated id array page with their contacts.
+
+    The rows are fetched in one ``pk__in`` query and put back in result
+    order; contacts deleted since the search are skipped.
+    """
+    ids = list(page.object_list)
+    rows = queryset.in_bulk(ids)
+    page.object_list = [rows[pk] for pk in ids if pk in rows]
+    return page
@@ -0,0 +1,447 @@
+"""
+Owner-based sharding of contacts.
+
+``CONTACT_SHARD_DATABASES`` lists the databases holding contacts. The
+first one is ``default``, which also keeps every other model (users,
+sessions, categories, the shard map). All the contacts of an owner live in
+one shard, recorded in `ContactShard`; contacts without an owner stay in
+``default``.
+
+- `ContactShardRouter` writes new contacts to their owner's shard, saves
+  and deletes existing ones where they were loaded from, and keeps the
+  other models on ``default``;
+- `owner_contacts` is the queryset of one owner's contacts, on its shard;
+- `all_contacts` fans a queryset out to every shard and merges the ordered
+  results (`ShardedQuerySet`), for the global listing, search and lookups
+  by primary key;
+- contact ids stay unique across shards thanks to a hi/lo allocator, so
+  URLs do not change when ``manage.py rebalance_shard`` moves an owner.
+
+New contacts must be saved with ``save()``, which the router sends to the
+owner's shard: ``Contact.objects.create()`` has no instance to route by and
+would write to ``default``.
+
+With a single database the helpers return plain querysets on ``default``
+and nothing else changes.
+"""
+
+import heapq
+import os
+import threading
+import time
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import F, Max
+
+from contact.models import Contact, ContactIdAllocator, ContactShard
+
+# Ids reserved by a process at a time
+ID_BLOCK_SIZE = 1000
+
+# Models stored in every shard (everything else lives in default only)
+SHARDED_MODELS = ('contact', 'backfillcheckpoint')
+
+# Seconds a process trusts its copy of the shard map before checking the
+# map version; rebalance_shard waits longer than this after a move
+SHARD_MAP_CHECK_INTERVAL = 1.0
+
+# Owners kept in the copy of the shard map of a process
+SHARD_MAP_MAX_OWNERS = 100_000
+
+
+def shard_databases():
+    return settings.CONTACT_SHARD_DATABASES
+
+
+def is_sharded():
+    return len(shard_databases()) > 1
+
+
+def initial_database(owner_id):
+    """The shard of an owner that has no row in the map yet."""
+    databases = shard_databases()
+    return databases[owner_id % len(databases)]
+
+
+class ShardMap:
+    """
+    Copy of the `ContactShard` map kept by each process.
+
+    Every move gives the owner's row a version above all the others. At
+    most every ``SHARD_MAP_CHECK_INTERVAL`` seconds the process reads the
+    highest version (an index lookup on ``default``) and, when it changed,
+    reloads only the rows above the version it knew. A move made by
+    another process, such as ``manage.py rebalance_shard``, is seen within
+    that interval, without relying on a shared cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.databases = {}
+        self.version = None
+        self.checked = float('-inf')
+
+    def check(self):
+        now = time.monotonic()
+        if now - self.checked < SHARD_MAP_CHECK_INTERVAL:
+            return
+
+        shards = ContactShard.objects.using(DEFAULT_DB_ALIAS)
+        version = shards.aggregate(version=Max('version'))['version'] or 0
+        if self.version is not None and version != self.version:
+            moved = shards.filter(version__gt=self.version).values_list('owner_id', 'database')
+            with self.lock:
+                for owner_id, database in moved:
+                    if owner_id in self.databases:
+                        self.databases[owner_id] = database
+        with self.lock:
+            self.version = version
+            self.checked = now
+
+    def get(self, owner_id, create):
+        self.check()
+        with self.lock:
+            database = self.databases.get(owner_id)
+        if database is not None:
+            return database
+
+        shards = ContactShard.objects.using(DEFAULT_DB_ALIAS)
+        if create:
+            entry, _ = shards.get_or_create(
+                owner_id=owner_id, defaults={'database': initial_database(owner_id)},
+            )
+            database = entry.database
+        else:
+            database = shards.filter(owner_id=owner_id).values_list('database', flat=True).first()
+            if database is None:
+                # Nothing written yet: not remembered, the first write records it
+                return initial_database(owner_id)
+
+        with self.lock:
+            if len(self.databases) >= SHARD_MAP_MAX_OWNERS:
+                self.databases.clear()
+            self.databases[owner_id] = database
+        return database
+
+
+_shard_map = ShardMap()
+
+# A forked worker checks the map again instead of trusting its parent's copy
+os.register_at_fork(after_in_child=_shard_map.reset)
+
+
+def contact_database(owner, create=False):
+    """
+    Returns the alias of the database holding an owner's contacts.
+
+    New owners are spread over the shards by id. Reads never write: an
+    owner without a row gets its initial shard, and the row is created
+    by the first write (``create``).
+
+    Args:
+        owner (User | int | None): The owner or its id.
+        create (bool): Record the owner in the map if it is not there yet.
+    """
+    databases = shard_databases()
+    owner_id = getattr(owner, 'pk', owner)
+    if owner_id is None or len(databases) == 1:
+        return databases[0]
+    return _shard_map.get(owner_id, create)
+
+
+def next_map_version():
+    """
+    A shard map version above every recorded one. Two moves at the same
+    time may share it, which is harmless: both are above what the
+    processes knew.
+    """
+    highest = ContactShard.objects.using(DEFAULT_DB_ALIAS) \
+        .aggregate(version=Max('version'))['version']
+    return (highest or 0) + 1
+
+
+def owner_contacts(owner):
+    """The contacts of one owner, queried on its shard."""
+    return Contact.objects.using(contact_database(owner)).filter(owner=owner)
+
+
+def all_contacts(queryset=None):
+    """
+    Runs a contact queryset on every shard.
+
+    Returns:
+        QuerySet | ShardedQuerySet: The queryset itself when there is a
+        single database.
+    """
+    if queryset is None:
+        queryset = Contact.objects.all()
+    if not is_sharded():
+        return queryset
+    return ShardedQuerySet([queryset.using(alias) for alias in shard_databases()])
+
+
+def apply_on_delete(model, pk, using):
+    """
+    Applies the ``on_delete`` of the contact foreign keys to ``model`` on
+    the shards other than ``using``, after a row of it was deleted there.
+
+    The keys have no database constraint and Django only collects the
+    related contacts in the database the row is deleted from, so the
+    contacts of the other shards would keep pointing to the deleted row.
+    ``CASCADE`` deletes them, any other action sets the key to NULL.
+
+    Returns:
+        bool: Whether some contact was changed or deleted.
+    """
+    changed = False
+    for field in Contact._meta.concrete_fields:
+        if not field.is_relation or field.related_model is not model:
+            continue
+        for alias in shard_databases():
+            if alias == using:
+                continue
+            related = Contact.objects.using(alias).filter(**{field.attname: pk})
+            if field.remote_field.on_delete is models.CASCADE:
+                changed |= related.delete()[0] > 0
+            else:
+                changed |= related.update(**{field.attname: None}) > 0
+    return changed
+
+
+class ShardedQuerySet:
+    """
+    The same queryset on every shard, read as one.
+
+    Supports the part of the QuerySet API used by the listings: chaining
+    ``filter``/``exclude``/``order_by``/``values``/``values_list``,
+    slicing, ``count``, ``exists``, ``get``, ``first`` and ``in_bulk``.
+    Ordered results are merged with ``heapq.merge``: a slice ``[a:b]``
+    reads at most ``b`` rows from each shard. Orderings must use a single
+    direction, like the listing sorts (``(column, id)``).
+    """
+
+    def __init__(self, querysets, ordering=(), values=None):
+        self.querysets = querysets
+        self.ordering = tuple(ordering)
+        # (kind, positions of the requested fields, flat) for values querysets
+        self._values = values
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    @property
+    def ordered(self):
+        return bool(self.ordering)
+
+    def _map(self, method, *args, **kwargs):
+        return ShardedQuerySet(
+            [getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets],
+            self.ordering,
+            self._values,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._map('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._map('exclude', *args, **kwargs)
+
+    def order_by(self, *fields):
+        sharded = self._map('order_by', *fields)
+        sharded.ordering = fields
+        return sharded
+
+    def _sort_columns(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def values(self, *fields):
+        columns = self._sort_columns()
+        sharded = self._map('values', *fields, *columns)
+        sharded._values = ('dict', None, False)
+        return sharded
+
+    def values_list(self, *fields, flat=False):
+        # The sort columns come first, to merge on them, and are dropped after
+        columns = self._sort_columns()
+        selected = columns + [name for name in fields if name not in columns]
+        sharded = self._map('values_list', *selected)
+        sharded._values = ('tuple', [selected.index(name) for name in fields], flat)
+        return sharded
+
+    def _merge(self, querysets):
+        if not self.ordering:
+            return chain.from_iterable(querysets)
+
+        columns = self._sort_columns()
+        if self._values is None:
+            key = attrgetter(*columns)
+        elif self._values[0] == 'dict':
+            key = itemgetter(*columns)
+        else:
+            key = itemgetter(*range(len(columns)))
+        reverse = self.ordering[0].startswith('-')
+        return heapq.merge(*querysets, key=key, reverse=reverse)
+
+    def _project(self, rows):
+        if self._values is None or self._values[0] == 'dict':
+            return rows
+        _, positions, flat = self._values
+        if flat:
+            return (row[positions[0]] for row in rows)
+        return (tuple(row[i] for i in positions) for row in rows)
+
+    def __iter__(self):
+        return iter(self._project(self._merge(self.querysets)))
+
+    def iterator(self, chunk_size=None):
+        return iter(self)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            rows = self[item:item + 1]
+            if not rows:
+                raise IndexError('ShardedQuerySet index out of range')
+            return rows[0]
+
+        start = item.start or 0
+        querysets = self.querysets
+        if item.stop is not None:
+            querysets = [queryset[:item.stop] for queryset in querysets]
+        return list(islice(self._project(self._merge(querysets)), start, item.stop))
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def first(self):
+        rows = self[:1]
+        return rows[0] if rows else None
+
+    def get(self, *args, **kwargs):
+        for queryset in self.querysets:
+            try:
+                return queryset.get(*args, **kwargs)
+            except self.model.DoesNotExist:
+                continue
+        raise self.model.DoesNotExist(
+            f'{self.model._meta.object_name} matching query does not exist.'
+        )
+
+    def in_bulk(self, id_list):
+        found = {}
+        for queryset in self.querysets:
+            found.update(queryset.in_bulk(id_list))
+        return found
+
+
+class ContactIdBlock:
+    """
+    Hands out contact ids from blocks reserved in ``default``.
+
+    Each process reserves ``ID_BLOCK_SIZE`` ids at a time with a single
+    ``UPDATE``, so ids are unique across shards without a round trip per
+    contact. Unused ids of a block are skipped when the process exits.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.next = self.limit = 0
+
+    def allocate(self):
+        with self.lock:
+            if self.next >= self.limit:
+                self.next = self.reserve()
+                self.limit = self.next + ID_BLOCK_SIZE
+            value = self.next
+            self.next += 1
+            return value
+
+    def reserve(self):
+        allocators = ContactIdAllocator.objects.using(DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            # The UPDATE takes the write lock before the value is read
+            if allocators.filter(pk=1).update(next_block=F('next_block') + ID_BLOCK_SIZE):
+                return allocators.get(pk=1).next_block - ID_BLOCK_SIZE
+
+            highest = max(
+                Contact.objects.using(alias).aggregate(highest=Max('id'))['highest'] or 0
+                for alias in shard_databases()
+            )
+            allocators.create(pk=1, next_block=highest + 1 + ID_BLOCK_SIZE)
+            return highest + 1
+
+
+_ids = ContactIdBlock()
+
+# A forked worker must not hand out the ids of its parent's block
+os.register_at_fork(after_in_child=_ids.reset)
+
+
+def assign_ids(contacts):
+    """Gives sharded contacts their id before they are inserted."""
+    if not is_sharded():
+        return
+    for contact in contacts:
+        if contact.pk is None:
+            contact.pk = _ids.allocate()
+
+
+class ContactShardRouter:
+    """Routes contacts to their owner's shard and other models to default."""
+
+    def _is_sharded_model(self, model):
+        return model._meta.app_label == 'contact' and model._meta.model_name in SHARDED_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded():
+            return None
+        if model is not Contact:
+            return DEFAULT_DB_ALIAS
+
+        instance = hints.get('instance')
+        if isinstance(instance, Contact) and instance._state.db:
+            return instance._state.db
+        if instance is not None and instance._meta.label_lower == 'auth.user':
+            # user.contact_set
+            return contact_database(instance)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        if model is not Contact:
+            return DEFAULT_DB_ALIAS
+
+        instance = hints.get('instance')
+        if isinstance(instance, Contact):
+            # Assigning the owner already set _state.db of a new contact to
+            # the owner's database, so only loaded contacts keep theirs
+            if instance._state.adding:
+                return contact_database(instance.owner_id, create=True)
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if isinstance(obj1, Contact) or isinstance(obj2, Contact):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shard_databases():
+            return None
+        return app_label == 'contact' and model_name in SHARDED_MODELS
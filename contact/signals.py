@@ -0,0 +1,124 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from contact.caching import (
+    bump_category_generation, bump_jump_generation, bump_listing_generation,
+    bump_snapshot_epoch,
+)
+from contact.events import publish_contact_change
+from contact.models import Category, Contact, ContactView
+from contact.sharding import all_contacts, apply_on_delete, assign_ids, is_sharded
+from contact.snapshot import contact_committed, snapshot_path
+from contact.storage import release_picture
+
+
+@receiver((post_save, post_delete), sender=Contact)
+def contact_changed(sender, **kwargs):
+    """Invalidates the listing pages when a contact changes."""
+    bump_listing_generation()
+
+
+@receiver(post_save, sender=Contact)
+def saved_contact_initials(sender, instance, created, **kwargs):
+    """Invalidates the jump bar counts when a contact's initials changed."""
+    current = instance.jump_key()
+    previous = getattr(instance, '_loaded_jump_key', None)
+    if created or current is None or current != previous:
+        bump_jump_generation()
+    instance._loaded_jump_key = current
+
+
+@receiver(post_delete, sender=Contact)
+def deleted_contact_initials(sender, **kwargs):
+    """A deleted contact leaves the jump bar counts."""
+    bump_jump_generation()
+
+
+@receiver((post_save, post_delete), sender=Contact)
+def refresh_listing_snapshot(sender, using, **kwargs):
+    """Refreshes the listing snapshot once the change is committed."""
+    if snapshot_path():
+        transaction.on_commit(contact_committed, using=using)
+
+
+@receiver(post_save, sender=Contact)
+def announce_saved_contact(sender, instance, created, using, **kwargs):
+    """Pushes a saved contact to the open lists once it is committed."""
+    publish_contact_change(instance, 'created' if created else 'updated', using)
+
+
+@receiver(post_delete, sender=Contact)
+def announce_deleted_contact(sender, instance, using, **kwargs):
+    """Removes a deleted contact from the open lists once it is committed."""
+    publish_contact_change(instance, 'deleted', using)
+
+
+@receiver(post_delete, sender=Contact)
+def forget_deleted_contact_views(sender, instance, using, **kwargs):
+    """Drops the per-user view history of a deleted contact once committed."""
+    contact_id = instance.pk
+
+    def forget():
+        # rebalance_shard deletes the contacts it moved from the old shard
+        if not all_contacts(Contact.objects.filter(pk=contact_id)).exists():
+            ContactView.objects.filter(contact_id=contact_id).delete()
+
+    transaction.on_commit(forget, using=using)
+
+
+@receiver(pre_save, sender=Contact)
+def assign_contact_id(sender, instance, **kwargs):
+    """Takes the id of a new contact from the allocator when sharded."""
+    assign_ids([instance])
+
+
+@receiver((post_save, post_delete), sender=Category)
+def category_changed(sender, **kwargs):
+    """Invalidates the pages that show a category name."""
+    bump_category_generation()
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=User)
+def delete_on_every_shard(sender, instance, using, **kwargs):
+    """
+    Applies the deletion of an owner or a category to the contacts of the
+    other shards once it is committed (see `contact.sharding.apply_on_delete`).
+    """
+    if not is_sharded():
+        return
+    pk = instance.pk
+
+    def apply():
+        # Changed with update(): the snapshot cannot see it incrementally
+        if apply_on_delete(sender, pk, using):
+            bump_snapshot_epoch()
+
+    transaction.on_commit(apply, using=using)
+
+
+def _picture_name(instance):
+    """Stored picture name of a contact, without loading a deferred field."""
+    value = instance.__dict__.get('picture')
+    return getattr(value, 'name', value)
+
+
+@receiver(post_save, sender=Contact)
+def release_replaced_picture(sender, instance, using, **kwargs):
+    """Releases the previous picture when a contact gets a new one."""
+    if 'picture' not in instance.__dict__:
+        return
+
+    previous = getattr(instance, '_loaded_picture', None)
+    current = _picture_name(instance)
+    if previous and previous != current:
+        release_picture(previous, using)
+    instance._loaded_picture = current
+
+
+@receiver(post_delete, sender=Contact)
+def release_deleted_picture(sender, instance, using, **kwargs):
+    """Releases the picture of a deleted contact."""
+    release_picture(_picture_name(instance), using)
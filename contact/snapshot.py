@@ -0,0 +1,384 @@
+"""
+Memory-mapped snapshot of the public contact listing.
+
+The default listing (visible contacts, newest first) shows the same five
+columns to everyone. With ``CONTACT_SNAPSHOT_PATH`` set, those rows are
+kept in a compact file that every worker maps with ``mmap``: a page is
+found by offset arithmetic and served with no database query, the pages
+of the file are shared by all the workers through the OS page cache, and
+only the rows of the page being shown become Python objects.
+
+File layout (little-endian):
+
+- header: magic, listing generation, epoch, row count, watermark, blob
+  size;
+- blob: each row's columns in UTF-8, separated by ``\\x1f``, padded to
+  8 bytes;
+- ``count`` contact ids (int64), in display order;
+- ``count + 1`` row offsets into the blob (uint64).
+
+A snapshot is served only while its generation equals the listing
+generation of `contact.caching`, so it is never staler than the cached
+pages. Every worker maps the same file, so that generation must be the
+same for all of them: the snapshot is only used with a shared cache
+(`contact.caching.shared_cache`), and left unused otherwise.
+
+Any change (committed contact save or delete, bulk imports) bumps the
+generation; the stale snapshot is then refreshed in a background thread:
+rows updated since the previous refresh are read from the database,
+unchanged rows are copied from the old mapping, and the new file replaces
+the old one atomically. Changes made with ``QuerySet.update()`` (backfills,
+merges) do not move ``updated_date``; they bump the snapshot epoch
+instead, and a snapshot of an older epoch is rebuilt in full, as with
+``manage.py build_snapshot``.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connections
+
+from contact.caching import (
+    LISTING_GENERATION_KEY, SNAPSHOT_EPOCH_KEY, bump_listing_generation, get_generation,
+    shared_cache,
+)
+from contact.models import Contact
+from contact.sharding import all_contacts
+
+MAGIC = b'CSNAP002'
+
+# magic, generation, epoch, count, watermark (unix microseconds), blob size
+HEADER = struct.Struct('<8sQQQqQ')
+
+COLUMNS = ('first_name', 'last_name', 'phone', 'email')
+
+SEPARATOR = '\x1f'
+
+# Changes are re-read this far before the last refresh, so rows written by
+# transactions that committed late are not missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Seconds a refresh waits for more changes, so a burst costs one rewrite
+REFRESH_DELAY = 0.5
+
+# Largest number of values sent in one ``__in`` query (SQLite limit)
+QUERY_CHUNK_SIZE = 900
+
+SnapshotRow = namedtuple('SnapshotRow', ('id',) + COLUMNS)
+
+
+def snapshot_path():
+    """The snapshot file, or None when the snapshot is off or cannot be shared."""
+    if not shared_cache():
+        return None
+    return getattr(settings, 'CONTACT_SNAPSHOT_PATH', None)
+
+
+def padding(size):
+    """Bytes after the blob, so the ids and offsets are 8-byte aligned."""
+    return -size % 8
+
+
+def encode_row(values):
+    return SEPARATOR.join(
+        (value or '').replace(SEPARATOR, ' ') for value in values
+    ).encode()
+
+
+class Snapshot:
+    """
+    A mapped snapshot file, read as a sequence of rows.
+
+    Supports ``len`` and slicing, which is what `Paginator` needs.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.stat = os.fstat(file.fileno())
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.generation, self.epoch, self.count, watermark, blob_size = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a contact snapshot.')
+        self.watermark = datetime.fromtimestamp(watermark / 1_000_000, timezone.utc)
+
+        view = memoryview(self.map)
+        ids_start = HEADER.size + blob_size + padding(blob_size)
+        offsets_start = ids_start + 8 * self.count
+        self.blob = view[HEADER.size:ids_start]
+        self.ids = view[ids_start:offsets_start].cast('q')
+        self.offsets = view[offsets_start:offsets_start + 8 * (self.count + 1)].cast('Q')
+
+    def same_file(self, stat):
+        return (stat.st_ino, stat.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def __len__(self):
+        return self.count
+
+    def row_bytes(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]]
+
+    def row(self, index):
+        return SnapshotRow(self.ids[index], *bytes(self.row_bytes(index)).decode().split(SEPARATOR))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.row(index) for index in range(*item.indices(self.count))]
+        if item < 0:
+            item += self.count
+        if not 0 <= item < self.count:
+            raise IndexError('snapshot index out of range')
+        return self.row(item)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def open_snapshot(path):
+    """
+    The snapshot at ``path``, mapped once per process and remapped after
+    it is replaced. Returns None when there is no usable file.
+    """
+    global _current
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    with _current_lock:
+        if _current is None or not _current.same_file(stat):
+            try:
+                _current = Snapshot(path)
+            except (OSError, ValueError, struct.error):
+                _current = None
+        return _current
+
+
+def listing_snapshot():
+    """
+    The snapshot of the default listing, when enabled and up to date.
+
+    A stale or missing snapshot schedules a refresh and returns None; the
+    caller then reads the listing from the database.
+    """
+    path = snapshot_path()
+    if not path:
+        return None
+
+    snapshot = open_snapshot(path)
+    if snapshot is not None and snapshot.generation == get_generation(LISTING_GENERATION_KEY):
+        return snapshot
+    schedule_refresh()
+    return None
+
+
+def visible_contacts():
+    return all_contacts(Contact.objects.filter(show=True))
+
+
+def fetch_rows(ids):
+    """Encoded rows of the given visible contacts, by id."""
+    rows = {}
+    ids = list(ids)
+    for i in range(0, len(ids), QUERY_CHUNK_SIZE):
+        for contact_id, *values in visible_contacts() \
+                .filter(pk__in=ids[i:i + QUERY_CHUNK_SIZE]) \
+                .values_list('id', *COLUMNS):
+            rows[contact_id] = encode_row(values)
+    return rows
+
+
+def write_snapshot(path, generation, epoch, watermark, rows):
+    """
+    Writes a snapshot file from ``(id, encoded row)`` pairs in display
+    order and puts it in place atomically.
+
+    Returns:
+        int: The number of rows written.
+    """
+    ids = array('q')
+    offsets = array('Q', [0])
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        # The blob is streamed first; ids and offsets follow it
+        file.seek(HEADER.size)
+        for contact_id, data in rows:
+            file.write(data)
+            ids.append(contact_id)
+            offsets.append(offsets[-1] + len(data))
+        file.write(b'\0' * padding(offsets[-1]))
+        file.write(ids.tobytes())
+        file.write(offsets.tobytes())
+
+        file.seek(0)
+        file.write(HEADER.pack(
+            MAGIC, generation, epoch, len(ids),
+            int(watermark.timestamp() * 1_000_000), offsets[-1],
+        ))
+
+    os.replace(temporary, path)
+    return len(ids)
+
+
+def build_snapshot(path, full=False):
+    """
+    Writes an up-to-date snapshot to ``path``.
+
+    Only the rows changed since the previous snapshot are read from the
+    database (plus the ids of the visible contacts, for order and
+    deletions), unless ``full`` is set, there is no previous snapshot or
+    it belongs to an older epoch. The generation is read before the
+    queries: a change made meanwhile bumps it again and leaves the new
+    snapshot stale, never wrong.
+
+    Returns:
+        tuple: The number of rows written and of rows read from the database.
+    """
+    generation = get_generation(LISTING_GENERATION_KEY)
+    epoch = get_generation(SNAPSHOT_EPOCH_KEY)
+    started = datetime.now(timezone.utc)
+    previous = None if full else open_snapshot(path)
+
+    if previous is None or previous.epoch != epoch:
+        rows = visible_contacts().order_by('-id').values_list('id', *COLUMNS).iterator()
+        count = write_snapshot(path, generation, epoch, started, (
+            (contact_id, encode_row(values)) for contact_id, *values in rows
+        ))
+        return count, count
+
+    ids = array('q', visible_contacts().order_by('-id').values_list('id', flat=True).iterator())
+    positions = array('q', old_positions(previous, ids))
+    fresh = {
+        contact_id: encode_row(values)
+        for contact_id, *values in visible_contacts()
+        .filter(updated_date__gte=previous.watermark - WATERMARK_OVERLAP)
+        .values_list('id', *COLUMNS)
+    }
+    # Rows neither changed nor in the old file (moved between shards with
+    # their old updated_date, for instance)
+    fresh.update(fetch_rows(
+        contact_id for contact_id, position in zip(ids, positions)
+        if position < 0 and contact_id not in fresh
+    ))
+
+    def rows():
+        for contact_id, position in zip(ids, positions):
+            if contact_id in fresh:
+                yield contact_id, fresh[contact_id]
+            elif position >= 0:
+                yield contact_id, previous.row_bytes(position)
+            # else: hidden or deleted between the two queries
+
+    return write_snapshot(path, generation, epoch, started, rows()), len(fresh)
+
+
+def old_positions(previous, ids):
+    """
+    Yields the index of each id in the previous snapshot, or -1.
+
+    Both are sorted by descending id, so this is a single merge pass.
+    """
+    old_ids = previous.ids
+    index = 0
+    for contact_id in ids:
+        while index < len(old_ids) and old_ids[index] > contact_id:
+            index += 1
+        if index < len(old_ids) and old_ids[index] == contact_id:
+            yield index
+        else:
+            yield -1
+
+
+def refresh_snapshot(path, full=False):
+    """
+    Rebuilds the snapshot unless another process is doing it.
+
+    A snapshot found up to date once the lock is held (another process
+    just refreshed it) is left as it is, unless ``full`` is set.
+
+    Returns:
+        tuple | None: The counts of `build_snapshot`, ``(0, 0)`` when the
+        snapshot was up to date, or None when another process holds the
+        lock.
+    """
+    with open(f'{path}.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        current = None if full else open_snapshot(path)
+        if current is not None and current.generation == get_generation(LISTING_GENERATION_KEY):
+            return 0, 0
+        return build_snapshot(path, full)
+
+
+class SnapshotRefresher:
+    """
+    Refreshes the snapshot in a background thread, one at a time.
+
+    A refresh that finds another process rebuilding the file is tried
+    again after ``REFRESH_DELAY``: the other build may have started before
+    the change that scheduled this one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pending = False
+
+    def schedule(self):
+        with self.lock:
+            self.pending = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        try:
+            while True:
+                time.sleep(REFRESH_DELAY)
+                with self.lock:
+                    if not self.pending:
+                        self.thread = None
+                        return
+                    self.pending = False
+                path = snapshot_path()
+                if path and refresh_snapshot(path) is None:
+                    with self.lock:
+                        self.pending = True
+        except Exception:
+            with self.lock:
+                self.thread = None
+            raise
+        finally:
+            # This thread's connections are not closed by any request
+            connections.close_all()
+
+
+_refresher = SnapshotRefresher()
+
+# A forked worker has no refresh thread, even if its parent had one
+os.register_at_fork(after_in_child=lambda: _refresher.__init__())
+
+
+def schedule_refresh():
+    if snapshot_path():
+        _refresher.schedule()
+
+
+def contact_committed():
+    """Refreshes the snapshot after a committed contact change."""
+    # The generation was bumped before the commit: a refresh running in
+    # between would carry it without the change, so bump it again
+    bump_listing_generation()
+    schedule_refresh()
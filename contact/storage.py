@@ -0,0 +1,150 @@
+"""
+Content-addressed storage for contact pictures.
+
+Every picture is stored once, under the SHA-256 of its content:
+``pictures/ab/cd/abcd….jpg``. Uploading the same avatar for a thousand
+contacts stores a single file, and since the URL changes whenever the
+content does, the files can be served with immutable cache headers.
+
+A file is shared by every Contact row whose ``picture`` holds its name, so
+the rows are its reference count: `release_picture` deletes the file only
+when no row points to it anymore.
+
+An upload may reuse a stored file before the row pointing to it is
+committed. Reusing a file touches it, both under a lock on its directory,
+and a release leaves alone files used within ``RELEASE_GRACE`` seconds
+(``collect_orphan_media`` removes them later), so a release running in
+that window cannot delete the file under the new contact.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import time
+from contextlib import contextmanager
+from functools import cache
+
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.[a-z0-9]+)?$')
+
+# Seconds during which a stored or reused picture is never deleted
+RELEASE_GRACE = 60 * 60
+
+
+def is_hashed_name(name):
+    """Tells whether a stored name is content-addressed (and never changes)."""
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def file_sha256(content):
+    """Hashes a file in chunks, without loading it in memory."""
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def directory_lock(path):
+    """Exclusive lock on a directory, held by one process of the host at a time."""
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(descriptor)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names files after the hash of their content.
+
+    The directory of the generated name (the field's ``upload_to``) is kept
+    as a prefix and the first four hex digits shard the files into 65,536
+    directories. Uploads streamed by `PictureUploadHandler` already carry
+    their ``sha256``; other files are hashed here.
+    """
+
+    def hashed_name(self, name, content):
+        digest = getattr(content, 'sha256', None) or file_sha256(content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(
+            part for part in (directory, digest[:2], digest[2:4], digest + extension)
+            if part
+        )
+
+    def reuse(self, name):
+        """Marks a stored file as just used; returns False when there is none."""
+        path = self.path(name)
+        try:
+            with directory_lock(os.path.dirname(path)):
+                os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete_unused(self, name, is_used):
+        """
+        Deletes a file unless ``is_used()`` or it was stored or reused less
+        than ``RELEASE_GRACE`` seconds ago.
+
+        Returns:
+            bool: Whether the file was deleted.
+        """
+        path = self.path(name)
+        try:
+            with directory_lock(os.path.dirname(path)):
+                if time.time() - os.stat(path).st_mtime < RELEASE_GRACE or is_used():
+                    return False
+                os.unlink(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        target = self.hashed_name(name, content)
+        if self.reuse(target):
+            # Same content already stored
+            return target
+
+        # Write under a unique name, then atomically move it into place, so
+        # two concurrent uploads of the same content cannot collide.
+        partial = super()._save(
+            self.get_available_name(target + '.partial'), content
+        )
+        os.replace(self.path(partial), self.path(target))
+        return target
+
+
+@cache
+def picture_storage():
+    """Storage used by `Contact.picture`."""
+    return ContentAddressedStorage()
+
+
+def release_picture(name, using=DEFAULT_DB_ALIAS):
+    """
+    Deletes a picture once no Contact (in any shard) references it anymore.
+
+    Runs after the current transaction on ``using`` commits, so a rolled
+    back change never loses a file. Pictures used in the last
+    ``RELEASE_GRACE`` seconds are kept (see `ContentAddressedStorage.delete_unused`).
+    """
+    if not name:
+        return
+
+    def release():
+        from contact.models import Contact
+        from contact.sharding import all_contacts
+
+        picture_storage().delete_unused(
+            name, all_contacts(Contact.objects.filter(picture=name)).exists,
+        )
+
+    transaction.on_commit(release, using=using)
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+
+from contact.models import Contact
+
+
+def make_user(username):
+    return User.objects.create_user(username=username, password='senha-de-teste')
+
+
+def make_contact(owner=None, **fields):
+    """Saves a contact, with default values for the fields not given."""
+    values = {
+        'first_name': 'Maria',
+        'last_name': 'Silva',
+        'phone': '11 99999-0000',
+        'email': 'maria@example.com',
+    }
+    values.update(fields)
+    contact = Contact(owner=owner, **values)
+    contact.save()
+    return contact
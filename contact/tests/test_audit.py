@@ -0,0 +1,153 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+
+from contact.audit import AuditWriter, audit, audit_deletion, audit_form, form_changes
+from contact.forms import ContactForm, RegisterUpdateForm
+from contact.models import AuditEntry, Category
+from contact.tests import make_contact, make_user
+
+
+class FormChangesTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.owner = make_user('maria')
+        self.contact = make_contact(self.owner, description='Amiga')
+
+    def contact_form(self, **changes):
+        data = {
+            'first_name': self.contact.first_name,
+            'last_name': self.contact.last_name,
+            'phone': self.contact.phone,
+            'email': self.contact.email,
+            'description': self.contact.description,
+        }
+        data.update(changes)
+        form = ContactForm(data, instance=self.contact)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        return form
+
+    def test_only_changed_fields_are_recorded(self):
+        category = Category.objects.create(name='Trabalho')
+        form = self.contact_form(phone='21 3333-4444', category=category.pk)
+
+        self.assertEqual(form_changes(form), {
+            'phone': ['11 99999-0000', '21 3333-4444'],
+            'category': [None, category.pk],
+        })
+
+    def test_unchanged_form_is_not_recorded(self):
+        writer = AuditWriter(interval=3600, max_pending=10**6)
+        with mock.patch('contact.audit.audit_writer', writer):
+            audit_form(self.owner, 'update', self.contact_form())
+        self.assertEqual(writer.entries, [])
+
+    def test_passwords_are_recorded_without_their_value(self):
+        form = RegisterUpdateForm({
+            'first_name': 'Maria', 'last_name': 'Silva', 'email': 'maria@example.com',
+            'username': 'maria', 'password1': 'Nova-senha-123', 'password2': 'Nova-senha-123',
+        }, instance=self.owner)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        changes = form_changes(form)
+        self.assertIsNone(changes['password'])
+        self.assertNotIn('Nova-senha-123', str(changes))
+
+
+class AuditWriterTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        # Flushed by the tests, never by its thread
+        self.writer = AuditWriter(interval=3600, max_pending=10**6)
+        patcher = mock.patch('contact.audit.audit_writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.owner = make_user('maria')
+
+    def test_queued_entries_are_written_in_a_batch(self):
+        contact = make_contact(self.owner)
+        audit(self.owner, 'update', contact, {
+            'phone': ['1', '2'], 'birthday': [datetime.date(1990, 5, 17), None],
+        })
+        audit_deletion(self.owner, contact)
+        self.assertFalse(AuditEntry.objects.exists())
+
+        self.writer.flush()
+
+        update, deletion = AuditEntry.objects.order_by('id')
+        self.assertEqual(update.actor, self.owner)
+        self.assertEqual(update.target_id, contact.pk)
+        self.assertEqual(update.changes['birthday'], ['1990-05-17', None])
+        self.assertEqual(deletion.action, 'delete')
+        self.assertEqual(deletion.changes['first_name'], ['Maria', None])
+
+    def test_failed_entries_go_back_to_the_queue(self):
+        audit(self.owner, 'create', make_contact(self.owner), {'first_name': [None, 'Maria']})
+        entries = list(self.writer.entries)
+
+        with mock.patch.object(AuditWriter, 'write_one', return_value=False), \
+                mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs('contact.audit', 'WARNING'):
+                self.writer.flush()
+
+        self.assertEqual(self.writer.entries, entries)
+        self.assertEqual(self.writer.pending, 1)
+        self.writer.flush()
+        self.assertEqual(AuditEntry.objects.count(), 1)
+        self.assertEqual(self.writer.pending, 0)
+
+
+class DeletedActorTests(TransactionTestCase):
+    """The foreign key is only checked when a real transaction commits."""
+
+    databases = '__all__'
+
+    def test_entry_of_a_deleted_actor_is_kept(self):
+        writer = AuditWriter(interval=3600, max_pending=10**6)
+        actor = make_user('joao')
+        with mock.patch('contact.audit.audit_writer', writer):
+            audit(actor, 'create', make_contact(actor), {'first_name': [None, 'João']})
+        actor.delete()
+
+        with self.assertLogs('contact.audit', 'WARNING'):
+            writer.flush()
+
+        entry = AuditEntry.objects.get()
+        self.assertIsNone(entry.actor_id)
+        self.assertEqual(entry.changes, {'first_name': [None, 'João']})
+
+
+class PurgeAuditTests(TestCase):
+
+    def setUp(self):
+        for month in (202501, 202502, 202502, 202503):
+            AuditEntry.objects.create(
+                month=month, action='update', target_type='contact', target_id=1,
+            )
+
+    def test_months_before_the_given_one_are_deleted(self):
+        out = StringIO()
+        call_command('purge_audit', '2025-03', batch_size=1, stdout=out)
+
+        self.assertEqual(list(AuditEntry.objects.values_list('month', flat=True)), [202503])
+        self.assertIn('Deleted 3 audit entries', out.getvalue())
+
+    def test_list(self):
+        out = StringIO()
+        call_command('purge_audit', list=True, stdout=out)
+
+        self.assertEqual(out.getvalue().split('\n')[:3], ['2025-01  1', '2025-02  2', '2025-03  1'])
+        self.assertEqual(AuditEntry.objects.count(), 4)
+
+    def test_invalid_month_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('purge_audit', '2025-13')
+        self.assertEqual(AuditEntry.objects.count(), 4)
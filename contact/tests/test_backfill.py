@@ -0,0 +1,93 @@
+import threading
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+from contact.backfill import Backfill, run_range
+from contact.models import BackfillCheckpoint, Contact
+from contact.tests import make_contact
+
+
+class BackfillTestMixin:
+    databases = '__all__'
+
+    def setUp(self):
+        # Contacts without an owner stay in default
+        self.contacts = [make_contact(first_name=f'Contato {i}') for i in range(5)]
+        # Not idempotent: a batch run twice would count twice
+        self.backfill = Backfill(
+            'contact_views_plus_one', 'contact',
+            updates={'view_count': F('view_count') + 1}, inline_rows=0,
+        )
+        self.state = ProjectState.from_apps(apps)
+        # The operation only reads the connection of its schema editor
+        self.editor = SimpleNamespace(connection=connection)
+
+    def migrate(self, backwards=False):
+        if backwards:
+            self.backfill.database_backwards('contact', self.editor, self.state, self.state)
+        else:
+            self.backfill.database_forwards('contact', self.editor, self.state, self.state)
+
+    def view_counts(self):
+        return list(Contact.objects.order_by('pk').values_list('view_count', flat=True))
+
+    def checkpoint(self):
+        return BackfillCheckpoint.objects.get(name=self.backfill.name)
+
+
+class BackfillTests(BackfillTestMixin, TestCase):
+
+    def test_small_table_is_filled_during_the_migration(self):
+        self.backfill.inline_rows = 10_000
+        self.migrate()
+
+        self.assertEqual(self.view_counts(), [1] * 5)
+        self.assertTrue(self.checkpoint().completed)
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        self.migrate()
+        self.assertEqual(self.view_counts(), [0] * 5)
+
+        stop = threading.Event()
+        run_range(
+            self.backfill, Contact, self.checkpoint(), batch_size=1,
+            progress=lambda checkpoint, rows: checkpoint.rows >= 2 and stop.set(), stop=stop,
+        )
+        self.assertEqual(self.view_counts(), [1, 1, 0, 0, 0])
+
+        run_range(self.backfill, Contact, self.checkpoint(), batch_size=1)
+        self.assertEqual(self.view_counts(), [1] * 5)
+        self.assertEqual(self.checkpoint().rows, 5)
+
+    def test_reverse_drops_the_progress(self):
+        self.migrate()
+        self.migrate(backwards=True)
+
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+        # Applied again, the whole table is pending once more
+        self.migrate()
+        self.assertEqual(self.checkpoint().position, self.contacts[0].pk)
+
+
+class BackfillCommandTests(BackfillTestMixin, TransactionTestCase):
+    """The command runs its ranges in threads, with their own connections."""
+
+    @mock.patch('contact.management.commands.backfill.find_backfills')
+    def test_second_run_is_a_no_op(self, find_backfills):
+        find_backfills.return_value = {self.backfill.name: ('contact', self.backfill)}
+        self.migrate()
+
+        call_command('backfill', sleep=0, batch_size=2, stdout=StringIO())
+        out = StringIO()
+        call_command('backfill', self.backfill.name, sleep=0, stdout=out)
+
+        self.assertIn('already complete', out.getvalue())
+        self.assertEqual(self.view_counts(), [1] * 5)
@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from contact.backup import BackupError, backup_chain, backup_sqlite, restore_sqlite
+
+
+class SqliteBackupTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.database = self.directory / 'db.sqlite3'
+        self.execute(
+            'CREATE TABLE contact (id INTEGER PRIMARY KEY, name TEXT)',
+            'INSERT INTO contact (name) SELECT printf("contato %d", value) FROM '
+            '(WITH RECURSIVE n(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM n '
+            'WHERE value < 5000) SELECT value FROM n)',
+        )
+
+    def execute(self, *statements, database=None):
+        connection = sqlite3.connect(database or self.database)
+        with connection:
+            for statement in statements:
+                connection.execute(statement)
+        connection.close()
+
+    def rows(self, database):
+        connection = sqlite3.connect(database)
+        rows = connection.execute('SELECT id, name FROM contact ORDER BY id').fetchall()
+        connection.close()
+        return rows
+
+    def backup(self, name, parent=None):
+        return backup_sqlite(self.database, self.directory / name, parent=parent, sleep=0)
+
+    def test_full_backup_is_a_plain_gzip_of_the_database(self):
+        manifest = self.backup('full.gz')
+
+        data = gzip.decompress((self.directory / 'full.gz').read_bytes())
+        self.assertEqual(manifest['type'], 'full')
+        self.assertEqual(len(data), manifest['page_count'] * manifest['page_size'])
+        self.assertEqual(hashlib.sha256(data).hexdigest(), manifest['sha256'])
+
+    def test_incremental_chain_restores_the_latest_state(self):
+        self.backup('full.gz')
+        self.execute('UPDATE contact SET name = "alterado" WHERE id = 10')
+        incremental = self.backup('inc1.gz', parent=self.directory / 'full.gz')
+        self.execute('DELETE FROM contact WHERE id > 4000')
+        self.backup('inc2.gz', parent=self.directory / 'inc1.gz')
+
+        # Only the changed pages are stored
+        self.assertEqual(incremental['type'], 'incremental')
+        self.assertEqual(sum(chunk['pages'] for chunk in incremental['chunks']), 1)
+        self.assertEqual(
+            [path.name for path, _ in backup_chain(self.directory / 'inc2.gz')],
+            ['full.gz', 'inc1.gz', 'inc2.gz'],
+        )
+
+        target = self.directory / 'restored.sqlite3'
+        target.write_bytes(b'old database')
+        restore_sqlite(self.directory / 'inc2.gz', target, workers=2)
+        self.assertEqual(self.rows(target), self.rows(self.database))
+        self.assertFalse(Path(f'{target}.restoring').exists())
+
+    def test_corrupted_backup_is_not_restored(self):
+        self.backup('full.gz')
+        backup = self.directory / 'full.gz'
+        data = bytearray(gzip.decompress(backup.read_bytes()))
+        data[-100] ^= 0xFF
+        backup.write_bytes(gzip.compress(bytes(data)))
+
+        target = self.directory / 'restored.sqlite3'
+        target.write_bytes(b'old database')
+        with self.assertRaises(BackupError):
+            restore_sqlite(backup, target)
+        self.assertEqual(target.read_bytes(), b'old database')
+
+    def test_chain_with_a_replaced_parent_is_refused(self):
+        self.backup('full.gz')
+        self.execute('UPDATE contact SET name = "alterado" WHERE id = 10')
+        self.backup('inc1.gz', parent=self.directory / 'full.gz')
+        # A newer full backup written over the parent
+        self.backup('full.gz')
+
+        with self.assertRaises(BackupError):
+            backup_chain(self.directory / 'inc1.gz')
@@ -0,0 +1,98 @@
+from django.test import SimpleTestCase, TestCase
+
+from contact.buffers import BackgroundFlusher, ViewCounter
+from contact.caching import VIEWS_GENERATION_KEY, get_generation
+from contact.models import Contact, ContactView
+from contact.sharding import all_contacts
+from contact.tests import make_contact, make_user
+
+
+class BackgroundFlusherTests(SimpleTestCase):
+
+    def test_buffer_without_write_cannot_be_created(self):
+        class Incomplete(BackgroundFlusher):
+            def reset(self):
+                self.items = []
+
+            def take(self):
+                return self.items
+
+        with self.assertRaisesMessage(TypeError, 'write'):
+            Incomplete(interval=3600, max_pending=10)
+
+
+class ViewCounterTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        # Flushed by the tests, never by its thread
+        self.counter = ViewCounter(interval=3600, max_pending=10**6)
+        self.maria, self.joao = make_user('maria'), make_user('joao')
+        self.first = make_contact(self.maria)
+        self.second = make_contact(self.joao)
+
+    def reload(self, contact):
+        return all_contacts(Contact.objects).get(pk=contact.pk)
+
+    def test_flush_adds_the_counts(self):
+        for _ in range(3):
+            self.counter.record(self.first.pk, self.joao.pk)
+        self.counter.record(self.first.pk)
+        self.counter.record(self.second.pk, self.joao.pk)
+        generation = get_generation(VIEWS_GENERATION_KEY)
+
+        with self.assertNumQueries(0):
+            # Recording never touches the database
+            self.counter.record(self.second.pk)
+        self.counter.flush()
+
+        self.assertEqual(self.reload(self.first).view_count, 4)
+        self.assertEqual(self.reload(self.second).view_count, 2)
+        self.assertIsNotNone(self.reload(self.first).last_viewed)
+        self.assertEqual(
+            dict(ContactView.objects.filter(user=self.joao).values_list('contact_id', 'count')),
+            {self.first.pk: 3, self.second.pk: 1},
+        )
+        self.assertNotEqual(get_generation(VIEWS_GENERATION_KEY), generation)
+
+        # A second batch adds to the first
+        self.counter.record(self.first.pk, self.joao.pk)
+        self.counter.flush()
+        self.assertEqual(self.reload(self.first).view_count, 5)
+        self.assertEqual(ContactView.objects.get(contact_id=self.first.pk).count, 4)
+
+    def test_empty_buffer_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.counter.flush()
+
+    def test_views_of_deleted_contacts_are_dropped(self):
+        self.counter.record(self.first.pk, self.joao.pk)
+        self.first.delete()
+        self.counter.flush()
+
+        self.assertFalse(ContactView.objects.exists())
+
+    def test_saving_a_loaded_contact_keeps_the_flushed_views(self):
+        loaded = self.reload(self.first)
+        self.counter.record(self.first.pk)
+        self.counter.record(self.first.pk)
+        self.counter.flush()
+
+        loaded.description = 'Editado depois'
+        loaded.save()
+
+        contact = self.reload(self.first)
+        self.assertEqual(contact.view_count, 2)
+        self.assertEqual(contact.description, 'Editado depois')
+
+    def test_deleting_a_contact_forgets_its_views(self):
+        self.counter.record(self.first.pk, self.joao.pk)
+        self.counter.record(self.second.pk, self.joao.pk)
+        self.counter.flush()
+
+        with self.captureOnCommitCallbacks(using=self.first._state.db, execute=True):
+            self.first.delete()
+
+        self.assertEqual(
+            list(ContactView.objects.values_list('contact_id', flat=True)), [self.second.pk]
+        )
@@ -0,0 +1,122 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from contact.caching import LISTING_GENERATION_KEY, bump_generation, get_generation
+from contact.tests import make_contact, make_user
+
+
+class ConditionalListingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        make_contact(make_user('maria'))
+        self.url = reverse('contact:index')
+
+    def test_matching_etag_gets_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_listing_gets_200(self):
+        etag = self.client.get(self.url)['ETag']
+        bump_generation(LISTING_GENERATION_KEY)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fragment_has_its_own_etag(self):
+        page = self.client.get(self.url)
+        fragment = self.client.get(self.url, HTTP_X_FRAGMENT='1')
+
+        self.assertEqual(fragment.status_code, 200)
+        self.assertNotEqual(fragment['ETag'], page['ETag'])
+        self.assertIn('X-Fragment', page['Vary'])
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=page['ETag'],
+                            HTTP_X_FRAGMENT='1').status_code,
+            200,
+        )
+
+    def test_fragment_has_only_the_table(self):
+        for extra in ({'HTTP_X_FRAGMENT': '1'}, {'data': {'fragment': '1'}}):
+            with self.subTest(extra=extra):
+                response = self.client.get(self.url, **extra)
+
+                self.assertTemplateUsed(response, 'contact/partials/contact_list.html')
+                self.assertTemplateNotUsed(response, 'contact/main.html')
+                self.assertNotContains(response, '<html')
+                self.assertContains(response, 'Maria')
+                self.assertIn('X-Fragment', response['Vary'])
+
+    def test_fragment_query_flag_has_its_own_etag(self):
+        page = self.client.get(self.url)
+        fragment = self.client.get(self.url, {'fragment': '1'})
+
+        self.assertNotEqual(fragment['ETag'], page['ETag'])
+        self.assertEqual(
+            self.client.get(self.url, {'fragment': '1'},
+                            HTTP_IF_NONE_MATCH=fragment['ETag']).status_code,
+            304,
+        )
+
+    def test_search_fragment(self):
+        url = reverse('contact:search')
+        page = self.client.get(url, {'q': 'maria'})
+        fragment = self.client.get(url, {'q': 'maria'}, HTTP_X_FRAGMENT='1')
+
+        self.assertTemplateUsed(fragment, 'contact/partials/contact_list.html')
+        self.assertIn('X-Fragment', fragment['Vary'])
+        self.assertNotEqual(fragment['ETag'], page['ETag'])
+
+    def test_lost_counter_does_not_reuse_old_tags(self):
+        etag = self.client.get(self.url)['ETag']
+        # An evicted counter (or a restarted worker) starts over at a
+        # random value, not at one an earlier page was tagged with
+        cache.delete(LISTING_GENERATION_KEY)
+        bump_generation(LISTING_GENERATION_KEY)
+
+        self.assertGreater(get_generation(LISTING_GENERATION_KEY), 1)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+
+@mock.patch('contact.views.contact_views.record_contact_view')
+class ConditionalDetailTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.contact = make_contact(make_user('maria'))
+        self.url = reverse('contact:contact', args=[self.contact.pk])
+
+    def test_revalidation_gets_304_and_counts_a_view(self, record):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(record.call_count, 2)
+
+    def test_edited_contact_gets_200(self, record):
+        etag = self.client.get(self.url)['ETag']
+        self.contact.description = 'Novo telefone'
+        self.contact.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_hidden_contact_is_not_found(self, record):
+        self.contact.show = False
+        self.contact.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        record.assert_not_called()
@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from contact.dedup import find_duplicates, merge_contacts
+from contact.models import Contact, ContactView
+from contact.sharding import all_contacts, owner_contacts
+from contact.tests import make_contact, make_user
+
+
+class FindDuplicatesTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.owner = make_user('maria')
+
+    def test_same_email_or_phone_is_a_cluster(self):
+        first = make_contact(self.owner, email='Maria@Example.com')
+        second = make_contact(self.owner, email='maria@example.com', phone='+55 11 99999-0000')
+        make_contact(self.owner, first_name='João', last_name='Souza',
+                     phone='21 3333-4444', email='joao@example.com')
+
+        self.assertEqual(
+            find_duplicates(owner_contacts(self.owner)), [[first.pk, second.pk]]
+        )
+
+    def test_contacts_of_other_owners_are_not_duplicates(self):
+        make_contact(self.owner)
+        make_contact(make_user('ana'))
+
+        self.assertEqual(find_duplicates(all_contacts(Contact.objects.all())), [])
+
+
+class MergeContactsTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.owner = make_user('maria')
+
+    def test_merge_fills_fields_adds_views_and_deletes_losers(self):
+        winner = make_contact(self.owner, description='')
+        loser = make_contact(self.owner, description='Colega de trabalho')
+        Contact.objects.using(winner._state.db).filter(pk=winner.pk).update(view_count=3)
+        Contact.objects.using(loser._state.db).filter(pk=loser.pk).update(view_count=4)
+        ContactView.objects.create(
+            user=self.owner, contact_id=loser.pk, count=2, last_viewed=timezone.now(),
+        )
+
+        # The per-user history is merged once the owner's shard commits
+        with self.captureOnCommitCallbacks(using=winner._state.db, execute=True):
+            merge_contacts(winner.pk, [loser.pk], owner=self.owner)
+
+        merged = owner_contacts(self.owner).get()
+        self.assertEqual(merged.pk, winner.pk)
+        self.assertEqual(merged.description, 'Colega de trabalho')
+        self.assertEqual(merged.view_count, 7)
+        self.assertEqual(
+            list(ContactView.objects.values_list('contact_id', 'count')), [(winner.pk, 2)]
+        )
+
+    def test_merge_of_another_owner_is_refused(self):
+        winner = make_contact(self.owner)
+        other = make_contact(make_user('ana'))
+
+        with self.assertRaises(Contact.DoesNotExist):
+            merge_contacts(winner.pk, [other.pk], owner=self.owner)
+        # Not found either when the owners live on different shards
+        with self.assertRaises((ValueError, Contact.DoesNotExist)):
+            merge_contacts(winner.pk, [other.pk])
+        self.assertEqual(all_contacts(Contact.objects.all()).count(), 2)
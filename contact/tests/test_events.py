@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from contact.events import (
+    EVENT_QUEUE_SIZE, RESYNC, EventBroker, broker, event_stream, subscribe,
+)
+from contact.sharding import contact_database
+from contact.tests import make_contact, make_user
+
+
+class EventBrokerTests(SimpleTestCase):
+
+    async def test_event_from_another_thread_reaches_every_stream(self):
+        events = EventBroker()
+        first, second = events.subscribe(), events.subscribe()
+        self.assertEqual(events.subscribers, 2)
+
+        thread = threading.Thread(target=events.dispatch, args=('{"id":1}',))
+        thread.start()
+        thread.join()
+
+        for subscription in (first, second):
+            message = await asyncio.wait_for(subscription.queue.get(), 1)
+            self.assertEqual(message, b'id: 1\nevent: contact\ndata: {"id":1}\n\n')
+
+        events.unsubscribe(first)
+        events.unsubscribe(second)
+        self.assertEqual(events.subscribers, 0)
+        self.assertEqual(events.loops, {})
+
+    async def test_slow_stream_gets_a_single_resync(self):
+        events = EventBroker()
+        subscription = events.subscribe()
+
+        for i in range(EVENT_QUEUE_SIZE + 5):
+            events.dispatch(json.dumps({'id': i}))
+        await asyncio.sleep(0)
+
+        self.assertEqual(subscription.queue.qsize(), 5)
+        self.assertIs(subscription.queue.get_nowait(), RESYNC)
+
+
+class ContactEventTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.owner = make_user('maria')
+        # Recorded in the shard map, to know where the contacts are written
+        self.database = contact_database(self.owner, create=True)
+
+    def published(self, change):
+        """The events published by ``change`` once its transaction commits."""
+        with mock.patch.object(broker, 'dispatch') as dispatch, \
+                self.captureOnCommitCallbacks(using=self.database, execute=True):
+            change()
+        return [json.loads(call.args[0]) for call in dispatch.call_args_list]
+
+    def test_saved_contact_is_announced_with_the_listing_columns(self):
+        [event] = self.published(
+            lambda: make_contact(self.owner, first_name='Ana', description='Particular'),
+        )
+
+        self.assertEqual(event, {
+            'action': 'created', 'id': event['id'], 'first_name': 'Ana',
+            'last_name': 'Silva', 'phone': '11 99999-0000', 'email': 'maria@example.com',
+        })
+
+    def test_hidden_and_deleted_contacts_are_announced_as_deleted(self):
+        contact = make_contact(self.owner)
+        pk = contact.pk
+
+        def hide():
+            contact.show = False
+            contact.save()
+
+        # Leaves the open lists without its data being sent
+        self.assertEqual(self.published(hide), [{'action': 'deleted', 'id': pk}])
+        self.assertEqual(self.published(contact.delete), [{'action': 'deleted', 'id': pk}])
+
+
+class EventStreamTests(SimpleTestCase):
+
+    async def test_stream_sends_the_published_events(self):
+        subscription = subscribe()
+        stream = event_stream(subscription)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        broker.dispatch('{"id":1}')
+        message = await asyncio.wait_for(anext(stream), 1)
+
+        self.assertTrue(message.endswith(b'event: contact\ndata: {"id":1}\n\n'))
+        await stream.aclose()
+        self.assertNotIn(subscription, broker.loops.get(subscription.loop, ()))
+
+    async def test_view_opens_an_event_stream_under_asgi(self):
+        response = await self.async_client.get(reverse('contact:events'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        await stream.aclose()
+
+    def test_view_answers_204_under_wsgi(self):
+        self.assertEqual(self.client.get(reverse('contact:events')).status_code, 204)
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from contact.tests import make_contact, make_user
+
+USED = 'pictures/aa/bb/' + 'aabb' + '0' * 60 + '.png'
+ORPHAN = 'pictures/cc/dd/' + 'ccdd' + '0' * 60 + '.png'
+RECENT = 'pictures/ee/ff/' + 'eeff' + '0' * 60 + '.png'
+# Outside pictures/: never scanned
+OTHERS = ['.uploads/upload-1.part', '.quarantine/20250101-000000/velho.png', 'leia-me.txt']
+
+
+class CollectOrphanMediaTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = Path(media.name)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        two_days_ago = time.time() - 48 * 3600
+        for name in (USED, ORPHAN, *OTHERS):
+            self.write(name, two_days_ago)
+        self.write(RECENT, time.time())
+        make_contact(make_user('maria'), picture=USED)
+
+    def write(self, name, mtime):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'\x89PNG' + b'\0' * 100)
+        os.utime(path, (mtime, mtime))
+
+    def files(self):
+        return sorted(
+            path.relative_to(self.root).as_posix()
+            for path in self.root.rglob('*') if path.is_file()
+        )
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_orphan_media', *args, workers=2, batch_size=1, stdout=out)
+        return out.getvalue()
+
+    def test_only_old_orphan_pictures_are_deleted(self):
+        output = self.collect()
+
+        self.assertEqual(self.files(), sorted([USED, RECENT, *OTHERS]))
+        self.assertIn('3 files scanned, 1 orphans removed', output)
+        self.assertIn('1 orphans kept for the grace period', output)
+
+    def test_grace_period(self):
+        self.collect('--grace-hours', '0')
+
+        self.assertEqual(self.files(), sorted([USED, *OTHERS]))
+
+    def test_dry_run_removes_nothing(self):
+        self.assertIn('1 orphans would be removed', self.collect('--dry-run'))
+        self.assertEqual(self.files(), sorted([USED, ORPHAN, RECENT, *OTHERS]))
+
+    def test_quarantine_moves_orphans(self):
+        self.collect('--quarantine')
+
+        moved = [
+            name for name in self.files()
+            if name.startswith('.quarantine/') and name.endswith(ORPHAN)
+        ]
+        self.assertEqual(len(moved), 1)
+        self.assertFalse((self.root / ORPHAN).exists())
+        self.assertTrue((self.root / RECENT).exists())
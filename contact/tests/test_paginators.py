@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from contact.models import Contact
+from contact.paginators import (
+    EXACT_COUNT_THRESHOLD, EstimatedCountPaginator, KeysetPaginator, decode_cursor,
+    encode_cursor, letter_offsets, parse_sort,
+)
+from contact.sharding import all_contacts
+from contact.tests import make_contact, make_user
+
+NAMES = ['Ana', 'Bruno', 'Bia', 'Carla', 'Caio', 'Davi', 'Eva', 'Enzo', 'Fábio', 'Gil']
+
+
+class KeysetPaginatorTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        owners = [make_user('maria'), make_user('joao')]
+        # Repeated names, so the id tiebreaker matters
+        for i in range(25):
+            make_contact(owners[i % 2], first_name=NAMES[i % len(NAMES)])
+        self.contacts = all_contacts(Contact.objects.all())
+
+    def expected(self, field, descending):
+        rows = sorted(
+            (getattr(contact, field), contact.pk) for contact in self.contacts
+        )
+        return [pk for _, pk in (reversed(rows) if descending else rows)]
+
+    def walk(self, paginator):
+        """Ids of every page, following the next cursors."""
+        ids = []
+        page = paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            ids.append([contact.pk for contact in page])
+            if not page.has_next():
+                return ids
+            page = paginator.page(after=decode_cursor(page.next_cursor(), len(paginator.keys)))
+            self.assertTrue(page.has_previous())
+
+    def test_pages_follow_the_sort_order(self):
+        for field, descending in [('first_name', False), ('first_name', True), ('id', True)]:
+            with self.subTest(field=field, descending=descending):
+                paginator = KeysetPaginator(self.contacts, field, descending, per_page=10)
+                pages = self.walk(paginator)
+
+                self.assertEqual([len(ids) for ids in pages], [10, 10, 5])
+                self.assertEqual(sum(pages, []), self.expected(field, descending))
+
+    def test_previous_page_is_the_page_before(self):
+        paginator = KeysetPaginator(self.contacts, 'first_name', per_page=10)
+        first = paginator.page()
+        second = paginator.page(after=paginator.key(first.object_list[-1]))
+
+        previous = paginator.page(before=paginator.key(second.object_list[0]))
+        self.assertEqual(list(previous), list(first))
+        self.assertFalse(previous.has_previous())
+        self.assertTrue(previous.has_next())
+
+    def test_cursors(self):
+        key = ('Maria', 42)
+        self.assertEqual(decode_cursor(encode_cursor(key), 2), key)
+        self.assertIsNone(decode_cursor(encode_cursor(key), 1))
+        self.assertIsNone(decode_cursor('não é um cursor', 2))
+        self.assertIsNone(decode_cursor(encode_cursor(('Maria', 'x')), 2))
+
+    def test_parse_sort(self):
+        self.assertEqual(parse_sort('-last_name'), ('last_name', True))
+        self.assertEqual(parse_sort('email'), ('email', False))
+        self.assertIsNone(parse_sort('password'))
+        self.assertIsNone(parse_sort(''))
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def test_big_unfiltered_table_is_estimated(self):
+        make_contact(id=1)
+        make_contact(id=EXACT_COUNT_THRESHOLD * 2)
+        paginator = EstimatedCountPaginator(Contact.objects.order_by('-id'), 10)
+
+        # The highest id stands for the row count, without a COUNT(*)
+        self.assertEqual(paginator.count, EXACT_COUNT_THRESHOLD * 2)
+        self.assertEqual(paginator.num_pages, EXACT_COUNT_THRESHOLD // 5)
+
+    def test_filtered_or_small_tables_are_counted(self):
+        make_contact(id=1)
+        make_contact(id=EXACT_COUNT_THRESHOLD * 2, show=False)
+
+        self.assertEqual(
+            EstimatedCountPaginator(Contact.objects.filter(show=True).order_by('-id'), 10).count, 1
+        )
+        Contact.objects.filter(show=False).delete()
+        self.assertEqual(EstimatedCountPaginator(Contact.objects.order_by('-id'), 10).count, 1)
+
+
+class LetterOffsetsTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        owner = make_user('maria')
+        self.contacts = [make_contact(owner, first_name=name) for name in NAMES]
+        self.queryset = all_contacts(Contact.objects.filter(show=True))
+
+    def test_counts_and_offsets(self):
+        table = letter_offsets(self.queryset, 'first_name')
+
+        self.assertEqual(table['A'], (1, 0))
+        self.assertEqual(table['B'], (2, 1))
+        self.assertEqual(table['C'], (2, 3))
+        self.assertEqual(table['Z'], (0, len(NAMES)))
+
+    def test_only_initial_changes_recount(self):
+        letter_offsets(self.queryset, 'first_name')
+
+        contact = self.contacts[0]
+        contact.phone = '21 3333-4444'
+        contact.save()
+        with self.assertNumQueries(0, using='default'):
+            self.assertEqual(letter_offsets(self.queryset, 'first_name')['A'], (1, 0))
+
+        contact.first_name = 'Zélia'
+        contact.save()
+        table = letter_offsets(self.queryset, 'first_name')
+        self.assertEqual(table['A'], (0, 0))
+        self.assertEqual(table['Z'], (1, len(NAMES) - 1))
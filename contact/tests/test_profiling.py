@@ -0,0 +1,162 @@
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve, reverse, set_script_prefix
+
+from contact.profiling import RenderProfile, TemplateProfilingMiddleware
+from contact.tests import make_contact, make_user
+from project.middleware import AdmissionControl
+
+
+class TemplateProfilingTests(SimpleTestCase):
+
+    def profile(self, view):
+        middleware = TemplateProfilingMiddleware(view)
+        return middleware(RequestFactory().get('/'))
+
+    def test_render_times_are_logged_and_sent_as_server_timing(self):
+        template = Template('{% for item in items %}{% if item %}{{ item }}{% endif %}{% endfor %}')
+
+        def view(request):
+            return HttpResponse(template.render(Context({'items': range(50)})))
+
+        with self.assertLogs('contact.profiling', 'INFO') as logs:
+            response = self.profile(view)
+
+        self.assertRegex(response['Server-Timing'], r'^tpl-0;desc="<string>";dur=[0-9.]+$')
+        report = logs.output[0]
+        self.assertIn('ForNode', report)
+        self.assertRegex(report, r'IfNode +calls=50 ')
+
+    def test_response_without_templates_is_left_alone(self):
+        response = self.profile(lambda request: HttpResponse('ok'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_self_time_excludes_children(self):
+        profile = RenderProfile()
+        profile.enter()
+        profile.enter()
+        profile.leave(profile.tags, 'IfNode', 0.25)
+        profile.leave(profile.tags, 'ForNode', 1.0)
+
+        self.assertEqual(profile.tags['ForNode'], [1, 1.0, 0.75])
+        self.assertEqual(profile.tags['IfNode'], [1, 0.25, 0.25])
+
+
+class DetailUrlTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.contact = make_contact(make_user('maria'))
+
+    def test_listing_links_match_the_detail_url(self):
+        response = self.client.get(reverse('contact:index'))
+
+        self.assertContains(response, f'href="/contact/{self.contact.pk}/detail/"')
+        self.assertEqual(
+            reverse('contact:contact', args=[self.contact.pk]),
+            f'/contact/{self.contact.pk}/detail/',
+        )
+
+    def test_links_follow_the_script_prefix(self):
+        # What the WSGI handler does for an app mounted under /agenda
+        set_script_prefix('/agenda/')
+        self.addCleanup(set_script_prefix, '/')
+        response = self.client.get('/')
+
+        self.assertContains(response, f'href="/agenda/contact/{self.contact.pk}/detail/"')
+
+    @mock.patch('contact.views.contact_views.record_contact_view')
+    def test_existing_detail_urls_still_resolve(self, record_contact_view):
+        match = resolve(f'/contact/{self.contact.pk}/detail/')
+
+        self.assertEqual(match.view_name, 'contact:contact')
+        self.assertEqual(match.kwargs, {'contact_id': self.contact.pk})
+        self.assertEqual(
+            self.client.get(f'/contact/{self.contact.pk}/detail/').status_code, 200,
+        )
+
+
+class StaffViewTestCase(TestCase):
+    databases = '__all__'
+
+    def login(self, is_staff):
+        user = make_user('maria')
+        User.objects.filter(pk=user.pk).update(is_staff=is_staff)
+        self.client.force_login(user)
+
+
+class MemoryProfileViewTests(StaffViewTestCase):
+
+    def setUp(self):
+        self.url = reverse('contact:memory_profile')
+
+    def test_anonymous_and_non_staff_users_are_sent_to_the_login(self):
+        login = reverse('contact:login')
+        self.assertRedirects(
+            self.client.get(self.url), f'{login}?next={self.url}', fetch_redirect_response=False,
+        )
+
+        self.login(is_staff=False)
+        self.assertRedirects(
+            self.client.get(self.url), f'{login}?next={self.url}', fetch_redirect_response=False,
+        )
+
+    def test_not_found_while_profiling_is_off(self):
+        self.login(is_staff=True)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(MEMORY_PROFILING=True)
+    def test_staff_gets_the_report(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+        self.login(is_staff=True)
+
+        response = self.client.get(self.url, {'diff': 1, 'limit': 5})
+
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        report = response.json()
+        self.assertGreater(report['traced'], 0)
+        self.assertLessEqual(len(report['top_sites']), 5)
+
+
+class AdmissionStatusViewTests(StaffViewTestCase):
+
+    def setUp(self):
+        self.url = reverse('contact:admission_status')
+        self.control = AdmissionControl(
+            {'search': {'limit': 2, 'queue': 1, 'retry_after': 3}}, {},
+        )
+        patcher = mock.patch(
+            'contact.views.contact_profiling.admission_control', return_value=self.control,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_staff_gets_the_queue_metrics(self):
+        self.control.queues['search'].acquire()
+        self.login(is_staff=True)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(response.json(), self.control.metrics())
+        self.assertEqual(response.json()['search']['active'], 1)
+
+    def test_non_staff_users_are_refused(self):
+        login = reverse('contact:login')
+        self.assertRedirects(
+            self.client.get(self.url), f'{login}?next={self.url}', fetch_redirect_response=False,
+        )
+
+        self.login(is_staff=False)
+        self.assertRedirects(
+            self.client.get(self.url), f'{login}?next={self.url}', fetch_redirect_response=False,
+        )
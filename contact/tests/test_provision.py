@@ -0,0 +1,95 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from contact.models import Contact
+from contact.sharding import _shard_map, all_contacts, contact_database
+from contact.tests import make_user
+
+USERS = """username,email,first_name,last_name,password
+ana,ana@example.com,Ana,Souza,Senha-forte-123
+bruno,bruno@example.com,Bruno,Lima,
+ana,ana2@example.com,Ana,Costa,Senha-forte-123
+carla,ana@example.com,Carla,Dias,Senha-forte-123
+maria,maria2@example.com,Maria,Silva,Senha-forte-123
+davi,maria@example.com,Davi,Rocha,Senha-forte-123
+elis,elis@example.com,Elis,Reis,123
+"""
+
+CONTACTS = """username,first_name,last_name,phone,email,category
+ana,Pedro,Alves,11 1111-1111,pedro@example.com,Trabalho
+bruno,Rita,Melo,11 2222-2222,rita@example.com,
+maria,Paulo,Nunes,11 3333-3333,paulo@example.com,Trabalho
+elis,Caio,Prado,11 4444-4444,caio@example.com,
+"""
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionUsersTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        _shard_map.reset()
+        self.addCleanup(_shard_map.reset)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.users = Path(directory.name) / 'users.csv'
+        self.users.write_text(USERS)
+        self.contacts = Path(directory.name) / 'contacts.csv'
+        self.contacts.write_text(CONTACTS)
+
+        self.maria = make_user('maria')
+        User.objects.filter(pk=self.maria.pk).update(email='maria@example.com')
+
+    def provision(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'provision_users', str(self.users), '--contacts', str(self.contacts), *args,
+            workers=1, stdout=out, stderr=err,
+        )
+        return out.getvalue(), err.getvalue().splitlines()
+
+    def test_rejected_rows_are_reported_with_their_line(self):
+        out, errors = self.provision()
+
+        self.assertEqual([error.split(': ', 1)[0] for error in errors], [
+            f'{self.users}:{line}' for line in (4, 5, 6, 7, 8)
+        ] + [f'{self.contacts}:5'])
+        self.assertIn('appears twice', errors[0])
+        self.assertIn('appears twice', errors[1])
+        self.assertIn('already exists', errors[2])
+        self.assertIn('Já existe um email cadastrado', errors[3])
+        self.assertIn('too short', errors[4])
+        self.assertIn("Unknown user 'elis'", errors[5])
+        self.assertIn('2 users and 3 contacts created, 5 rows rejected.', out)
+
+    def test_users_are_created(self):
+        self.provision()
+
+        ana = User.objects.get(username='ana')
+        self.assertEqual(ana.email, 'ana@example.com')
+        self.assertTrue(ana.check_password('Senha-forte-123'))
+        self.assertFalse(User.objects.get(username='bruno').has_usable_password())
+        self.assertFalse(User.objects.filter(username__in=['carla', 'davi', 'elis']).exists())
+
+    def test_contacts_land_on_the_owner_shard(self):
+        self.provision()
+
+        for username, first_name in (('ana', 'Pedro'), ('bruno', 'Rita'), ('maria', 'Paulo')):
+            with self.subTest(username=username):
+                owner = User.objects.get(username=username)
+                contact = Contact.objects.using(contact_database(owner)).get(owner=owner)
+                self.assertEqual(contact.first_name, first_name)
+        self.assertEqual(all_contacts(Contact.objects.all()).count(), 3)
+
+    def test_dry_run_creates_nothing(self):
+        out, errors = self.provision('--dry-run')
+
+        self.assertIn('2 users and 3 contacts would be created, 5 rows rejected.', out)
+        self.assertEqual(len(errors), 6)
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['maria'])
+        self.assertFalse(all_contacts(Contact.objects.all()).exists())
@@ -0,0 +1,85 @@
+from array import array
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from contact.caching import bump_listing_generation
+from contact.models import Contact
+from contact.search_cache import ResultCache, normalize_query, result_cache, search_result_ids
+from contact.sharding import all_contacts
+from contact.tests import make_contact, make_user
+
+
+class NormalizeQueryTests(SimpleTestCase):
+
+    def test_spaces_and_ascii_case(self):
+        self.assertEqual(normalize_query('  Maria SILVA \n'), 'maria silva')
+
+    def test_composed_and_decomposed_accents_match(self):
+        self.assertEqual(normalize_query('Jose\u0301'), normalize_query('Jos\u00e9'))
+        self.assertEqual(normalize_query('Jose\u0301'), 'jos\u00e9')
+
+    def test_non_ascii_case_is_kept(self):
+        # Databases do not all fold it: merging them could change the results
+        self.assertEqual(normalize_query('JOSÉ'), 'josÉ')
+
+
+class ResultCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        size = ResultCache.entry_size(array('q', range(10)))
+        # Room for four entries, the largest one allowed
+        results = ResultCache(max_bytes=size * 4)
+        for key in 'abcd':
+            results.set(key, array('q', range(10)))
+        results.get('a')
+
+        results.set('e', array('q', range(10)))
+
+        self.assertIsNotNone(results.get('a'))
+        self.assertIsNone(results.get('b'))
+        self.assertEqual(results.size, size * 4)
+
+    def test_big_result_sets_are_not_cached(self):
+        results = ResultCache(max_bytes=1024)
+        results.set('a', array('q', range(1000)))
+
+        self.assertIsNone(results.get('a'))
+        self.assertEqual(results.size, 0)
+
+
+class SearchResultIdsTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        result_cache().clear()
+        self.addCleanup(result_cache().clear)
+        owner = make_user('maria')
+        self.ids = [make_contact(owner, first_name=f'Ana {i}').pk for i in range(3)]
+        make_contact(owner, first_name='Bruno')
+
+    def search(self, query='ana'):
+        queryset = all_contacts(Contact.objects.filter(first_name__icontains=query))
+        return search_result_ids(queryset.order_by('-id'), query, '-id')
+
+    def test_hit_reads_no_rows(self):
+        ids = self.search()
+
+        with self.assertNumQueries(0, using='default'):
+            self.assertEqual(list(self.search()), list(ids))
+        self.assertEqual(list(ids), sorted(self.ids, reverse=True))
+
+    def test_listing_generation_bump_misses(self):
+        self.search()
+        make_contact(make_user('joao'), first_name='Ana Nova')
+
+        self.assertEqual(len(self.search()), 4)
+
+        bump_listing_generation()
+        with self.assertNumQueries(1, using='default'):
+            self.search()
+
+    @override_settings(SEARCH_CACHE_MAX_IDS=2)
+    def test_too_broad_search_is_not_paged_from_the_cache(self):
+        self.assertIsNone(self.search())
+        self.assertIsNone(self.search())
+        self.assertEqual(len(self.search('bruno')), 1)
@@ -0,0 +1,156 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase
+
+from contact.management.commands.rebalance_shard import Command
+from contact.models import Category, Contact, ContactShard
+from contact.sharding import (
+    _shard_map, all_contacts, contact_database, initial_database, is_sharded,
+    next_map_version, owner_contacts, shard_databases,
+)
+from contact.tests import make_contact, make_user
+
+
+@skipUnless(is_sharded(), 'Needs DJANGO_CONTACT_SHARDS=2 or more.')
+class ShardRoutingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        _shard_map.reset()
+        self.addCleanup(_shard_map.reset)
+        # Two owners starting on different shards
+        self.maria, self.joao = make_user('maria'), make_user('joao')
+        self.assertNotEqual(initial_database(self.maria.pk), initial_database(self.joao.pk))
+
+    def test_contacts_are_written_to_the_owner_shard(self):
+        contact = make_contact(self.maria)
+
+        database = initial_database(self.maria.pk)
+        self.assertEqual(contact._state.db, database)
+        self.assertTrue(Contact.objects.using(database).filter(pk=contact.pk).exists())
+        self.assertEqual(
+            ContactShard.objects.get(owner=self.maria).database, database
+        )
+
+    def test_reads_do_not_write_the_map(self):
+        self.assertEqual(contact_database(self.maria), initial_database(self.maria.pk))
+        self.assertFalse(owner_contacts(self.maria).exists())
+        self.assertFalse(ContactShard.objects.exists())
+
+    def test_all_contacts_merges_every_shard(self):
+        ids = [make_contact(owner).pk for owner in (self.maria, self.joao) * 3]
+
+        self.assertEqual(len(set(ids)), len(ids))
+        contacts = all_contacts(Contact.objects.all())
+        self.assertEqual(contacts.count(), 6)
+        self.assertEqual(list(contacts.order_by('-id').values_list('id', flat=True)[:4]),
+                         sorted(ids, reverse=True)[:4])
+        self.assertEqual(contacts.get(pk=ids[1]).owner_id, self.joao.pk)
+
+    def test_move_made_by_another_process_is_seen(self):
+        make_contact(self.maria)
+        source = contact_database(self.maria)
+        target = next(alias for alias in shard_databases() if alias != source)
+
+        ContactShard.objects.filter(owner=self.maria).update(
+            database=target, version=next_map_version(),
+        )
+        # Trusted until the check interval is over
+        self.assertEqual(contact_database(self.maria), source)
+        _shard_map.checked = float('-inf')
+        self.assertEqual(contact_database(self.maria), target)
+
+
+@skipUnless(is_sharded(), 'Needs DJANGO_CONTACT_SHARDS=2 or more.')
+class DeletionOnEveryShardTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        _shard_map.reset()
+        self.addCleanup(_shard_map.reset)
+        self.category = Category.objects.create(name='Trabalho')
+        # One contact on each shard
+        self.contacts = [
+            make_contact(owner, category=self.category)
+            for owner in (make_user('maria'), make_user('joao'))
+        ]
+        self.assertEqual(
+            {contact._state.db for contact in self.contacts}, set(shard_databases()),
+        )
+
+    def reload(self):
+        return [all_contacts(Contact.objects).get(pk=contact.pk) for contact in self.contacts]
+
+    def test_deleted_owner_is_cleared_on_its_shard(self):
+        owner = self.contacts[1].owner
+        with self.captureOnCommitCallbacks(using=DEFAULT_DB_ALIAS, execute=True):
+            owner.delete()
+
+        first, second = self.reload()
+        self.assertIsNotNone(first.owner_id)
+        self.assertIsNone(second.owner_id)
+
+    def test_deleted_category_is_cleared_on_every_shard(self):
+        with self.captureOnCommitCallbacks(using=DEFAULT_DB_ALIAS, execute=True):
+            self.category.delete()
+
+        self.assertEqual([contact.category_id for contact in self.reload()], [None, None])
+
+
+@skipUnless(is_sharded(), 'Needs DJANGO_CONTACT_SHARDS=2 or more.')
+class RebalanceShardTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        _shard_map.reset()
+        self.addCleanup(_shard_map.reset)
+        self.owner = make_user('maria')
+        self.contacts = [
+            make_contact(self.owner, first_name=f'Contato {i}') for i in range(12)
+        ]
+        self.source = contact_database(self.owner)
+        self.target = next(alias for alias in shard_databases() if alias != self.source)
+
+    def test_owner_is_moved_with_its_ids(self):
+        call_command(
+            'rebalance_shard', 'maria', self.target,
+            batch_size=5, settle=1.1, stdout=StringIO(),
+        )
+
+        _shard_map.checked = float('-inf')
+        self.assertEqual(contact_database(self.owner), self.target)
+        self.assertFalse(Contact.objects.using(self.source).filter(owner=self.owner).exists())
+        moved = Contact.objects.using(self.target).filter(owner=self.owner).in_bulk()
+        self.assertEqual(set(moved), {contact.pk for contact in self.contacts})
+        self.assertEqual(
+            moved[self.contacts[0].pk].updated_date, self.contacts[0].updated_date
+        )
+
+    def test_purge_sends_no_signals_and_copies_the_counters(self):
+        command = Command()
+        command.batch_size = 5
+        command.copy(self.owner, self.source, self.target)
+        # A flush that reached the source only
+        Contact.objects.using(self.source).filter(pk=self.contacts[0].pk).update(view_count=3)
+
+        with mock.patch('contact.signals.publish_contact_change') as publish, \
+                mock.patch('contact.signals.release_picture') as release:
+            self.assertEqual(command.purge(self.owner, self.source, self.target), 12)
+
+        publish.assert_not_called()
+        release.assert_not_called()
+        self.assertFalse(Contact.objects.using(self.source).exists())
+        self.assertEqual(
+            Contact.objects.using(self.target).get(pk=self.contacts[0].pk).view_count, 3
+        )
+
+    def test_settle_shorter_than_the_map_check_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('rebalance_shard', 'maria', self.target, settle=0.5)
+        self.assertEqual(
+            Contact.objects.using(self.source).filter(owner=self.owner).count(), 12
+        )
@@ -0,0 +1,109 @@
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.test import TestCase, override_settings
+
+from contact import snapshot
+from contact.caching import bump_snapshot_epoch
+from contact.models import Contact
+from contact.sharding import all_contacts
+from contact.tests import make_contact, make_user
+
+
+class SnapshotTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = str(Path(directory.name) / 'listing.snap')
+        # Forget the file mapped by an earlier test
+        self.addCleanup(setattr, snapshot, '_current', None)
+        cache.clear()
+
+        owners = [make_user('maria'), make_user('joao')]
+        self.contacts = [
+            make_contact(owners[i % 2], first_name=f'Contato {i:02d}', show=i != 7)
+            for i in range(25)
+        ]
+
+    def shared_cache(self):
+        """Settings of a cache every worker shares, with the snapshot on."""
+        return override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': str(Path(self.directory) / 'cache'),
+            }},
+            CONTACT_SNAPSHOT_PATH=self.path,
+        )
+
+    def visible_ids(self):
+        return list(
+            all_contacts(Contact.objects.filter(show=True))
+            .order_by('-id').values_list('id', flat=True)
+        )
+
+    def test_pages_match_the_database(self):
+        written, read = snapshot.build_snapshot(self.path)
+        rows = snapshot.open_snapshot(self.path)
+
+        self.assertEqual((written, read), (24, 24))
+        self.assertEqual(len(rows), 24)
+        self.assertEqual([row.id for row in rows[:]], self.visible_ids())
+
+        page = Paginator(rows, 10).get_page(3)
+        self.assertEqual(len(page.object_list), 4)
+        last = page.object_list[-1]
+        self.assertEqual(
+            (last.id, last.first_name, last.email),
+            (self.contacts[0].pk, 'Contato 00', 'maria@example.com'),
+        )
+
+    @mock.patch('contact.snapshot.WATERMARK_OVERLAP', timedelta(0))
+    def test_refresh_reads_only_changed_rows(self):
+        snapshot.build_snapshot(self.path)
+        contact = self.contacts[3]
+        contact.first_name = 'Renomeado'
+        contact.save()
+        self.contacts[4].delete()
+
+        written, read = snapshot.build_snapshot(self.path)
+        rows = snapshot.open_snapshot(self.path)
+
+        self.assertEqual((written, read), (23, 1))
+        self.assertEqual([row.id for row in rows[:]], self.visible_ids())
+        self.assertIn('Renomeado', [row.first_name for row in rows[:]])
+
+    @mock.patch('contact.snapshot.WATERMARK_OVERLAP', timedelta(0))
+    def test_queryset_updates_rebuild_in_full(self):
+        snapshot.build_snapshot(self.path)
+        contact = self.contacts[3]
+        # update() keeps updated_date: the incremental refresh cannot see it
+        Contact.objects.using(contact._state.db).filter(pk=contact.pk).update(phone='0800')
+        bump_snapshot_epoch()
+
+        written, read = snapshot.build_snapshot(self.path)
+        self.assertEqual((written, read), (24, 24))
+        self.assertIn('0800', [row.phone for row in snapshot.open_snapshot(self.path)[:]])
+
+    def test_disabled_without_a_shared_cache(self):
+        with override_settings(CONTACT_SNAPSHOT_PATH=self.path):
+            self.assertIsNone(snapshot.snapshot_path())
+            self.assertIsNone(snapshot.listing_snapshot())
+        self.assertFalse(Path(self.path).exists())
+
+    @mock.patch('contact.snapshot.schedule_refresh')
+    def test_only_an_up_to_date_snapshot_is_served(self, schedule_refresh):
+        with self.shared_cache():
+            self.assertEqual(snapshot.refresh_snapshot(self.path), (24, 24))
+            self.assertEqual(snapshot.refresh_snapshot(self.path), (0, 0))
+            self.assertEqual(len(snapshot.listing_snapshot()), 24)
+
+            make_contact(first_name='Novo')
+            self.assertIsNone(snapshot.listing_snapshot())
+            schedule_refresh.assert_called_once_with()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from contact.storage import directory_lock, is_hashed_name, picture_storage
+from contact.tests import make_contact, make_user
+
+PICTURE = b'\x89PNG\r\n\x1a\n' + b'\0' * 100
+
+
+class ContentAddressedStorageTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = make_user('maria')
+
+    def make_contact(self, filename='foto.png'):
+        return make_contact(self.owner, picture=ContentFile(PICTURE, name=filename))
+
+    def delete(self, contact):
+        """Deletes a contact and runs the picture release it schedules."""
+        with self.captureOnCommitCallbacks(using=contact._state.db, execute=True):
+            contact.delete()
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.make_contact('a.png'), self.make_contact('b.PNG')
+
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertTrue(first.picture.name.startswith('pictures/'))
+        self.assertTrue(is_hashed_name(first.picture.name))
+        directory = os.path.dirname(picture_storage().path(first.picture.name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first.picture.name)])
+
+    @mock.patch('contact.storage.RELEASE_GRACE', 0)
+    def test_file_goes_with_the_last_contact_using_it(self):
+        first, second = self.make_contact(), self.make_contact()
+        name = first.picture.name
+
+        self.delete(first)
+        self.assertTrue(picture_storage().exists(name))
+
+        self.delete(second)
+        self.assertFalse(picture_storage().exists(name))
+
+    def test_recently_used_file_is_kept(self):
+        contact = self.make_contact()
+        name = contact.picture.name
+
+        self.delete(contact)
+        self.assertTrue(picture_storage().exists(name))
+
+    @mock.patch('contact.storage.RELEASE_GRACE', 60)
+    def test_release_waiting_for_the_lock_sees_the_reuse(self):
+        name = self.make_contact().picture.name
+        path = picture_storage().path(name)
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        results = []
+
+        with directory_lock(os.path.dirname(path)):
+            # An upload reusing the file holds the lock
+            release = threading.Thread(
+                target=lambda: results.append(picture_storage().delete_unused(name, lambda: False)),
+            )
+            release.start()
+            release.join(0.2)
+            self.assertTrue(release.is_alive())
+            os.utime(path)
+
+        release.join(5)
+        self.assertEqual(results, [False])
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,147 @@
+import struct
+import tempfile
+import zlib
+
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from contact.models import Contact
+from contact.sharding import all_contacts
+from contact.tests import make_user
+from contact.uploads import (
+    NotAnImage, PictureUploadHandler, RejectedUpload, check_image, sniff_image,
+)
+
+
+def png_header(width, height):
+    """The signature and IHDR chunk of a PNG of the given size."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+        + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr))
+    )
+
+
+def jpeg_header(width, height):
+    """SOI, an APP0 segment and a baseline SOF0 frame header."""
+    app0 = b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    sof0 = struct.pack('>BHHB', 8, height, width, 1) + b'\x01\x11\x00'
+    return (
+        b'\xff\xd8'
+        + b'\xff\xe0' + struct.pack('>H', len(app0) + 2) + app0
+        + b'\xff\xc0' + struct.pack('>H', len(sof0) + 2) + sof0
+    )
+
+
+class SniffImageTests(SimpleTestCase):
+
+    def test_formats_and_dimensions(self):
+        self.assertEqual(sniff_image(png_header(640, 480)), ('PNG', 640, 480))
+        self.assertEqual(sniff_image(jpeg_header(800, 600)), ('JPEG', 800, 600))
+        self.assertEqual(
+            sniff_image(b'GIF89a' + struct.pack('<HH', 32, 16) + b'\0' * 8),
+            ('GIF', 32, 16),
+        )
+
+    def test_short_header_needs_more_data(self):
+        self.assertIsNone(sniff_image(png_header(640, 480)[:10]))
+        self.assertIsNone(sniff_image(jpeg_header(800, 600)[:20]))
+
+    def test_other_content_is_not_an_image(self):
+        with self.assertRaises(NotAnImage):
+            sniff_image(b'<?php echo "oi"; ?>')
+
+    @override_settings(CONTACT_PICTURE_MAX_SIZE=1000, CONTACT_PICTURE_MAX_PIXELS=10_000)
+    def test_limits(self):
+        self.assertIsNone(check_image(('PNG', 100, 100), 1000))
+        self.assertEqual(check_image(('PNG', 100, 100), 1001), 'Imagem muito grande.')
+        self.assertEqual(
+            check_image(('PNG', 100, 101), 1000), 'Imagem com dimensões muito grandes.'
+        )
+        self.assertEqual(check_image(('PNG', 0, 100), 1000), 'Imagem inválida.')
+
+
+class PictureUploadHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=media.name,
+            CONTACT_PICTURE_MAX_SIZE=64 * 1024,
+            CONTACT_PICTURE_MAX_PIXELS=1_000_000,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, chunks, content_length=None):
+        """Streams ``chunks`` through the handler like the request parser."""
+        handler = PictureUploadHandler(RequestFactory().post('/'))
+        handler.handle_raw_input(None, {}, content_length or 0, 'boundary')
+        # The handler takes the whole file
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file('picture', 'foto.png', 'image/png', content_length, None)
+        start = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, start)
+            start += len(chunk)
+        return handler.file_complete(start)
+
+    def test_valid_picture_is_hashed_while_streamed(self):
+        data = png_header(320, 240) + b'\0' * 5000
+        uploaded = self.upload([data[:10], data[10:]])
+        self.addCleanup(uploaded.close)
+
+        self.assertEqual(uploaded.image_info, ('PNG', 320, 240))
+        self.assertEqual(uploaded.content_type, 'image/png')
+        self.assertEqual(uploaded.size, len(data))
+        self.assertEqual(uploaded.read(), data)
+        self.assertEqual(len(uploaded.sha256), 64)
+
+    def test_not_an_image_is_rejected(self):
+        uploaded = self.upload([b'MZ' + b'\0' * 100])
+
+        self.assertIsInstance(uploaded, RejectedUpload)
+        self.assertEqual(uploaded.reason, 'Envie uma imagem válida.')
+
+    def test_decompression_bomb_is_rejected_from_its_header(self):
+        uploaded = self.upload([png_header(50_000, 50_000), b'\0' * 100])
+
+        self.assertIsInstance(uploaded, RejectedUpload)
+        self.assertEqual(uploaded.reason, 'Imagem com dimensões muito grandes.')
+
+    def test_oversized_upload_stops_being_stored(self):
+        chunk = png_header(100, 100) + b'\0' * (32 * 1024)
+        uploaded = self.upload([chunk, b'\0' * (32 * 1024), b'\0' * (32 * 1024)])
+
+        self.assertIsInstance(uploaded, RejectedUpload)
+        self.assertEqual(uploaded.reason, 'Imagem muito grande.')
+
+    def test_declared_size_is_checked_before_reading(self):
+        uploaded = self.upload([png_header(100, 100)], content_length=10**9)
+
+        self.assertIsInstance(uploaded, RejectedUpload)
+        self.assertEqual(uploaded.reason, 'Imagem muito grande.')
+
+
+class ContactFormUploadTests(TestCase):
+    databases = '__all__'
+
+    def test_rejected_picture_is_a_field_error(self):
+        self.client.force_login(make_user('maria'))
+        picture = SimpleUploadedFile('foto.png', b'#!/bin/sh\nrm -rf /\n' * 10, 'image/png')
+
+        response = self.client.post(reverse('contact:create'), {
+            'first_name': 'Maria',
+            'last_name': 'Silva',
+            'phone': '11 99999-0000',
+            'email': 'maria@example.com',
+            'picture': picture,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Envie uma imagem válida.')
+        self.assertFalse(all_contacts(Contact.objects.all()).exists())
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from contact.audit import AuditWriter
+from contact.models import AuditEntry
+from contact.tests import make_user
+
+
+class UserUpdateTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = make_user('maria')
+        self.client.force_login(self.user)
+        # Flushed by the tests, never by its thread
+        self.writer = AuditWriter(interval=3600, max_pending=10**6)
+        patcher = mock.patch('contact.audit.audit_writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def update(self, **changes):
+        data = {
+            'first_name': 'Maria', 'last_name': 'Silva',
+            'email': 'maria@example.com', 'username': 'maria',
+        }
+        data.update(changes)
+        return self.client.post(reverse('contact:user_update'), data)
+
+    def test_password_is_changed(self):
+        response = self.update(password1='Nova-senha-123', password2='Nova-senha-123')
+
+        self.assertRedirects(response, reverse('contact:user_update'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Nova-senha-123'))
+        self.assertEqual(self.user.first_name, 'Maria')
+        # The session survives its own password change
+        self.assertEqual(self.client.get(reverse('contact:user_update')).status_code, 200)
+
+    def test_password_is_kept_when_left_blank(self):
+        self.update()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('senha-de-teste'))
+
+    def test_mismatched_or_weak_passwords_are_refused(self):
+        for password1, password2 in (('Nova-senha-123', 'Outra-senha-123'), ('123', '123')):
+            with self.subTest(password1=password1):
+                response = self.update(password1=password1, password2=password2)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['form'].errors)
+                self.user.refresh_from_db()
+                self.assertTrue(self.user.check_password('senha-de-teste'))
+
+    def test_audit_records_the_real_changes(self):
+        self.update(last_name='Souza', password1='Nova-senha-123', password2='Nova-senha-123')
+        self.update(last_name='Souza')
+        self.update(password1='Nova-senha-123', password2='Outra-senha-123')
+        self.writer.flush()
+
+        entry = AuditEntry.objects.get()
+        self.assertEqual(entry.target_id, self.user.pk)
+        self.assertEqual(entry.changes, {
+            'first_name': ['', 'Maria'], 'last_name': ['', 'Souza'],
+            'email': ['', 'maria@example.com'], 'password': None,
+        })
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Nova-senha-123'))
@@ -0,0 +1,309 @@
+"""
+Streaming, memory-bounded handling of contact picture uploads.
+
+`PictureUploadHandler` receives the ``picture`` field chunk by chunk:
+
+- the upload size is enforced while streaming, so an oversized file is
+  never stored in full;
+- the image format and dimensions are read from the first kilobytes
+  (`sniff_image`), without decoding the image, and decompression bombs
+  are rejected as soon as their header is seen;
+- accepted data is hashed and written to a temporary file inside
+  ``MEDIA_ROOT``, so saving it into the content-addressed storage needs
+  neither a second read nor a copy.
+
+Rejected uploads become a `RejectedUpload`, which `ContactForm` turns into
+a regular field error.
+"""
+
+import hashlib
+import struct
+import tempfile
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Fields handled by PictureUploadHandler
+PICTURE_FIELDS = ('picture',)
+
+# How much of the upload may be read while looking for the image header
+SNIFF_LIMIT = 64 * 1024
+
+# Formats recognized by sniff_image and their content types
+IMAGE_CONTENT_TYPES = {
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+    'BMP': 'image/bmp',
+}
+
+# JPEG start-of-frame markers (all except DHT, JPG and DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class NotAnImage(ValueError):
+    """The data does not start with a supported image signature."""
+
+
+def max_picture_size():
+    """Largest accepted upload in bytes."""
+    return settings.CONTACT_PICTURE_MAX_SIZE
+
+
+def max_picture_pixels():
+    """Largest accepted width * height."""
+    return settings.CONTACT_PICTURE_MAX_PIXELS
+
+
+def _sniff_jpeg(data):
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            raise NotAnImage('Corrupted JPEG marker.')
+
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length
+            i += 2
+            continue
+
+        (length,) = struct.unpack_from('>H', data, i + 2)
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack_from('>HH', data, i + 5)
+            return 'JPEG', width, height
+        i += 2 + length
+    return None
+
+
+def _sniff_webp(data):
+    if len(data) < 30:
+        return None
+
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack_from('<HH', data, 26)
+        return 'WEBP', width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        (bits,) = struct.unpack_from('<I', data, 21)
+        return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return 'WEBP', width, height
+    raise NotAnImage('Unknown WEBP chunk.')
+
+
+def sniff_image(data):
+    """
+    Reads the format and dimensions of an image from its first bytes.
+
+    Args:
+        data (bytes): The beginning of the file.
+
+    Returns:
+        tuple | None: ``(format, width, height)``, or ``None`` when more
+        data is needed to decide.
+
+    Raises:
+        NotAnImage: The data is not a supported image.
+    """
+    data = bytes(data)
+    if len(data) < 12:
+        return None
+
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        if len(data) < 24:
+            return None
+        width, height = struct.unpack_from('>II', data, 16)
+        return 'PNG', width, height
+
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack_from('<HH', data, 6)
+        return 'GIF', width, height
+
+    if data.startswith(b'\xff\xd8'):
+        return _sniff_jpeg(data)
+
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _sniff_webp(data)
+
+    if data.startswith(b'BM'):
+        if len(data) < 26:
+            return None
+        width, height = struct.unpack_from('<ii', data, 18)
+        return 'BMP', abs(width), abs(height)
+
+    raise NotAnImage('Unsupported image format.')
+
+
+def check_image(info, size):
+    """
+    Validates the sniffed image against the configured limits.
+
+    Returns:
+        str | None: The reason the image is rejected, if any.
+    """
+    if size > max_picture_size():
+        return 'Imagem muito grande.'
+
+    _, width, height = info
+    if not width or not height:
+        return 'Imagem inválida.'
+    if width * height > max_picture_pixels():
+        return 'Imagem com dimensões muito grandes.'
+    return None
+
+
+def upload_temp_dir():
+    """Temporary directory on the same filesystem as MEDIA_ROOT."""
+    directory = Path(settings.MEDIA_ROOT) / '.uploads'
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+class PictureUploadedFile(TemporaryUploadedFile):
+    """
+    A streamed picture, stored in a temporary file next to its final
+    location and carrying the metadata read from its header and the
+    SHA-256 of its content.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=upload_temp_dir())
+        UploadedFile.__init__(
+            self, file, name, content_type, size, charset, content_type_extra
+        )
+        self.image_info = None
+        self.sha256 = None
+
+
+class RejectedUpload(UploadedFile):
+    """Placeholder for a picture refused while it was being streamed."""
+
+    def __init__(self, name, reason):
+        super().__init__(None, name, None, 0, None)
+        self.reason = reason
+
+    def read(self, *args, **kwargs):
+        return b''
+
+    def close(self):
+        pass
+
+
+class PictureUploadHandler(FileUploadHandler):
+    """
+    Upload handler for contact pictures. It must be installed before the
+    request body is read, see `picture_upload`.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.activated = field_name in PICTURE_FIELDS
+        if not self.activated:
+            return
+
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self.header = bytearray()
+        self.info = None
+        self.reason = None
+
+        if self.content_length and self.content_length > max_picture_size():
+            self.reason = 'Imagem muito grande.'
+        else:
+            self.file = PictureUploadedFile(
+                self.file_name,
+                self.content_type,
+                0,
+                self.charset,
+                self.content_type_extra,
+            )
+
+        # This handler takes care of the whole file
+        raise StopFutureHandlers()
+
+    def reject(self, reason):
+        """Stops storing the upload and discards what was written so far."""
+        self.reason = reason
+        self.file.close()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        if self.reason:
+            # Keep reading the request body, but store nothing
+            return None
+
+        self.size += len(raw_data)
+        if self.size > max_picture_size():
+            self.reject('Imagem muito grande.')
+            return None
+
+        if self.info is None:
+            self.header += raw_data
+            try:
+                self.info = sniff_image(self.header)
+            except NotAnImage:
+                self.reject('Envie uma imagem válida.')
+                return None
+
+            if self.info is not None:
+                self.header = None
+                reason = check_image(self.info, self.size)
+                if reason:
+                    self.reject(reason)
+                    return None
+            elif len(self.header) >= SNIFF_LIMIT:
+                self.reject('Envie uma imagem válida.')
+                return None
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+
+        if not self.reason and self.info is None:
+            self.reject('Envie uma imagem válida.')
+
+        if self.reason:
+            return RejectedUpload(self.file_name, self.reason)
+
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.image_info = self.info
+        self.file.sha256 = self.hasher.hexdigest()
+        self.file.content_type = IMAGE_CONTENT_TYPES[self.info[0]]
+        return self.file
+
+
+def picture_upload(view):
+    """
+    Decorator installing `PictureUploadHandler` on a view.
+
+    Upload handlers can only be changed before ``request.POST`` is read and
+    CsrfViewMiddleware reads it first, so the view is exempted from the
+    middleware and protected here, after the handler is installed.
+    """
+    protected_view = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, PictureUploadHandler(request))
+        return protected_view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
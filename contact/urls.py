@@ -7,12 +7,17 @@ urlpatterns = [
     #Main Urls
     path('search/', views.search, name="search"),
     path('', views.index, name='index'),
+    path('popular/', views.popular, name='popular'),
+    path('recent/', views.recent, name='recent'),
 
     #Urls related to contact manipulation
     path('contact/<int:contact_id>/detail/', views.contact, name='contact'),
     path('contact/<int:contact_id>/update/', views.update, name='update'),
     path('contact/create/', views.create, name='create'),
     path('contact/<int:contact_id>/delete/', views.delete, name='delete'),
+    path('contact/duplicates/', views.duplicates, name='duplicates'),
+    path('contact/duplicates/merge/', views.merge, name='merge'),
+    path('contact/events/', views.events, name='events'),
 
     #Urls related to User actions
     path('user/create/', views.register, name='register'),
@@ -20,4 +25,8 @@ urlpatterns = [
     path('user/logout/', views.logout_view, name='logout'),
     path('user/update/', views.user_update, name='user_update'),
 
+    #Urls related to diagnostics
+    path('debug/memory/', views.memory_profile, name='memory_profile'),
+    path('debug/admission/', views.admission_status, name='admission_status'),
+
 ]
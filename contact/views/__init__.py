@@ -1,3 +1,6 @@
-from .contact_views import *
-from .contact_forms import *
-from .user_forms import *
\ No newline at end of file
+from .contact_views import contact, index, popular, recent, search
+from .contact_forms import create, delete, update
+from .contact_dedup import duplicates, merge
+from .contact_events import events
+from .contact_profiling import admission_status, memory_profile
+from .user_forms import login_view, logout_view, register, user_update
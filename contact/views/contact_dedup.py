@@ -0,0 +1,71 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
+
+from contact.dedup import find_duplicates, merge_contacts
+from contact.models import Contact
+from contact.sharding import owner_contacts
+
+
+@login_required(login_url='contact:login') #Restricts access to authenticated users. Redirects to the login page if not logged in.
+def duplicates(request):
+    """
+    Lists clusters of duplicate contacts owned by the authenticated user.
+
+    Args:
+        request (HttpRequest): The request object containing user data.
+
+    Returns:
+        HttpResponse: Renders the duplicates review page.
+    """
+
+    # Only the user's own contacts can be reviewed and merged
+    contacts = owner_contacts(request.user).filter(show=True)
+    clusters = find_duplicates(contacts)
+
+    # Load every contact that appears in a cluster with a single query
+    by_id = contacts.in_bulk([pk for cluster in clusters for pk in cluster])
+
+    context = {
+        'clusters': [
+            [by_id[pk] for pk in cluster if pk in by_id]
+            for cluster in clusters
+        ],
+        'site_title': 'Duplicados - ',
+    }
+
+    return render(
+        request,
+        'contact/duplicates.html',
+        context,
+    )
+
+
+@require_POST
+@login_required(login_url='contact:login') #Restricts access to authenticated users. Redirects to the login page if not logged in.
+def merge(request):
+    """
+    Merges a cluster of duplicate contacts into the selected winner.
+
+    Args:
+        request (HttpRequest): POST with ``contact_ids`` and ``winner``.
+
+    Returns:
+        HttpResponseRedirect: Redirects back to the duplicates page.
+    """
+    try:
+        contact_ids = [int(pk) for pk in request.POST.getlist('contact_ids')]
+        winner_id = int(request.POST.get('winner', ''))
+    except ValueError:
+        messages.error(request, 'Seleção inválida')
+        return redirect('contact:duplicates')
+
+    try:
+        merge_contacts(winner_id, contact_ids, owner=request.user)
+    except Contact.DoesNotExist:
+        messages.error(request, 'Contatos para mesclar não encontrados')
+    else:
+        messages.success(request, 'Contatos mesclados')
+
+    return redirect('contact:duplicates')
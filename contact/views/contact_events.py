@@ -0,0 +1,34 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from contact.events import event_stream, subscribe
+
+
+async def events(request):
+    """
+    Streams the changes of the visible contacts as server-sent events.
+
+    Each event carries the action (``created``, ``updated`` or
+    ``deleted``), the contact id and, unless deleted, the listing columns.
+    The stream needs an ASGI server (``uvicorn project.asgi:application``):
+    under WSGI it would hold a worker for every open tab, so it answers
+    204, which tells EventSource not to reconnect.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        StreamingHttpResponse: A ``text/event-stream`` that lasts until the
+        client disconnects.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        event_stream(subscribe()),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,11 +2,14 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from contact.audit import audit_deletion, audit_form
 from contact.forms import ContactForm
-from contact.models import Contact
+from contact.sharding import owner_contacts
+from contact.uploads import picture_upload
 
 # View for creating a contact:
 @login_required(login_url='contact:login') #Restricts access to authenticated users. Redirects to the login page if not logged in.
+@picture_upload #Streams the picture through PictureUploadHandler.
 def create(request):
     """
     Handle the creation of a new contact.
@@ -45,6 +48,7 @@ def create(request):
             contact = form.save(commit=False) #create a contact without saving it immediately.
             contact.owner = request.user #Assign an authenticated user as the owner.
             contact.save() #Save the contact in the database.
+            audit_form(request.user, 'create', form) #Queue the audit entry (written in a batch).
 
             #Redirect the contact to the update contact page after successfull creation.
             return redirect(
@@ -76,6 +80,7 @@ def create(request):
 
 #View for edit/update a already created contact
 @login_required(login_url='contact:login') #Restricts access to authenticated users. Redirects to the login page if not logged in.
+@picture_upload #Streams the picture through PictureUploadHandler.
 def update(request, contact_id):
     """
     Handle data manipulation of an already existing contact.
@@ -95,12 +100,11 @@ def update(request, contact_id):
 
     """
 
-    #Retrieve the contact object, ensuring it belongs to the authenticated user
+    #Retrieve the contact object from the user's shard, ensuring it belongs to them
     contact = get_object_or_404(
-        Contact, 
+        owner_contacts(request.user), 
         pk=contact_id, 
         show=True, 
-        owner=request.user
     )
 
     # Define the URL for form submission
@@ -116,6 +120,7 @@ def update(request, contact_id):
 
         if form.is_valid(): # Validate form before saving
             contact = form.save() # Save the updated contact data
+            audit_form(request.user, 'update', form) # Queue the field diff (written in a batch)
             return redirect(
                 'contact:update', 
                 contact_id=contact.pk
@@ -159,12 +164,11 @@ def delete(request, contact_id):
         HttpResponse: Renders the contact page if confirmation is not provided.
     """
 
-    #Retrieve the contact object, ensuring it belongs to the authenticated user
+    #Retrieve the contact object from the user's shard, ensuring it belongs to them
     contact = get_object_or_404(
-        Contact, 
+        owner_contacts(request.user), 
         pk=contact_id, 
         show=True, 
-        owner=request.user
     )
 
     # Get confirmation from POST data, defaulting to 'no'
@@ -172,6 +176,7 @@ def delete(request, contact_id):
 
 
     if confirmation == 'yes':  # Delete contact if confirmation is 'yes'
+        audit_deletion(request.user, contact) # Keep the last values in the audit log
         contact.delete()
         return redirect('contact:index') # Redirect to contact list after deletion
 
@@ -0,0 +1,52 @@
+from django.contrib.auth.decorators import user_passes_test
+from django.http import Http404, JsonResponse
+
+from contact.profiling import memory_profiling_enabled, memory_tracker
+from project.middleware import admission_control
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='contact:login')
+def memory_profile(request):
+    """
+    Returns the allocation statistics of this worker as JSON (staff only).
+
+    Args:
+        request (HttpRequest): ``?diff=1`` compares a new snapshot with the
+            previous one now, to check a suspect view right after calling
+            it; ``?limit=N`` sets how many allocation sites are listed.
+
+    Returns:
+        JsonResponse: Per-view peak and retained memory, top allocation
+        sites and the sites that grew between the last two snapshots.
+    """
+    if not memory_profiling_enabled():
+        raise Http404('Memory profiling is off (DJANGO_MEMORY_PROFILING=1).')
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 200))
+    except ValueError:
+        limit = 20
+
+    if request.GET.get('diff'):
+        memory_tracker.compare_snapshots(limit)
+
+    response = JsonResponse(memory_tracker.report(limit))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='contact:login')
+def admission_status(request):
+    """
+    Returns the admission control queues of this worker as JSON (staff only).
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: Per class, the limit, the requests running and
+        queued now, and the admitted and shed totals.
+    """
+    response = JsonResponse(admission_control().metrics())
+    response['Cache-Control'] = 'no-store'
+    return response
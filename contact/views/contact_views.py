@@ -1,10 +1,164 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from contact.models import Contact
+from contact.models import Contact, ContactView
 from django.db.models import Q
 from django.core.paginator import Paginator
+from django.urls import get_script_prefix, reverse
+from functools import lru_cache, wraps
+
+from contact.paginators import (
+    JUMP_FIELDS,
+    JUMP_LETTERS,
+    KeysetPaginator,
+    decode_cursor,
+    letter_offsets,
+    parse_sort,
+    sort_ordering,
+)
+from contact.sharding import all_contacts
+from contact.search_cache import load_page, normalize_query, search_result_ids
+from contact.snapshot import listing_snapshot
+from contact.buffers import record_contact_view
+from contact.caching import (
+    conditional_page,
+    contact_etag,
+    contact_last_modified,
+    listing_etag,
+    views_etag,
+)
 
 # Create your views here.
 
+def listing_template(request):
+    """
+    Chooses between the full listing page and the fragment with only the
+    table and the pagination block, used when paging without a reload.
+
+    Args:
+        request (HttpRequest): Asks for the fragment with the ``X-Fragment``
+            header or the ``fragment`` query flag.
+
+    Returns:
+        str: The template name to render.
+    """
+    if request.headers.get('X-Fragment') or request.GET.get('fragment'):
+        return 'contact/partials/contact_list.html'
+    return 'contact/main.html'
+
+
+@lru_cache
+def _detail_url_parts(script_prefix):
+    """
+    Splits the contact detail URL around the contact id.
+
+    Reversing ``contact:contact`` once per row costs a resolver lookup for
+    every contact in the listing; the prefix and suffix are computed once
+    and the template only concatenates the id.
+    """
+    url = reverse('contact:contact', args=(0,))
+    prefix, suffix = url.rsplit('/0/', 1)
+    return prefix + '/', '/' + suffix
+
+
+def detail_url_context():
+    """Context with the precomputed contact detail URL parts."""
+    prefix, suffix = _detail_url_parts(get_script_prefix())
+    return {
+        'detail_url_prefix': prefix,
+        'detail_url_suffix': suffix,
+    }
+
+
+# Listing columns: (field, header label)
+COLUMNS = (
+    ('id', 'ID'),
+    ('first_name', 'First Name'),
+    ('last_name', 'last Name'),
+    ('phone', 'Phone'),
+    ('email', 'E-Mail'),
+)
+
+# Query parameters that point to a position in the listing
+POSITION_PARAMS = ('page', 'after', 'before', 'from', 'fragment')
+
+
+def listing_url(request, **params):
+    """
+    Builds a listing query string from the current one.
+
+    The position in the list (page number, cursors, jump letter) is
+    dropped, so the link starts from the top unless ``params`` sets it.
+    """
+    query = request.GET.copy()
+    for name in POSITION_PARAMS:
+        query.pop(name, None)
+    for name, value in params.items():
+        query[name] = value
+    return '?' + query.urlencode()
+
+
+def column_headers(request, field, descending):
+    """
+    Header cells of the listing table.
+
+    Each sortable header links to its column in ascending order, or in the
+    opposite order when the list is already sorted by it.
+    """
+    headers = []
+    for name, label in COLUMNS:
+        order = ''
+        if name == field:
+            order = 'desc' if descending else 'asc'
+        url = listing_url(request, sort=f'-{name}' if order == 'asc' else name)
+        headers.append({'label': label, 'url': url, 'order': order})
+    return headers
+
+
+def jump_letters(request, contacts, field):
+    """Links of the A–Z jump bar, with the number of contacts per letter."""
+    table = letter_offsets(contacts, field)
+    return [
+        {
+            'letter': letter,
+            'count': table[letter][0],
+            'url': listing_url(request, sort=field, **{'from': letter}),
+        }
+        for letter in JUMP_LETTERS
+    ]
+
+
+def sorted_page(request, contacts, field, descending):
+    """
+    Keyset-paginated page of the listing sorted by ``field``.
+
+    The position comes from an ``after``/``before`` cursor, or from a jump
+    bar letter, which is a seek on ``field >= letter``.
+    """
+    paginator = KeysetPaginator(contacts, field, descending, per_page=10)
+    size = len(paginator.keys)
+    after = decode_cursor(request.GET.get('after', ''), size)
+    before = decode_cursor(request.GET.get('before', ''), size)
+
+    letter = request.GET.get('from', '')
+    if after is None and before is None and letter in JUMP_LETTERS \
+            and field in JUMP_FIELDS and not descending:
+        # No contact has id 0, so this starts at the first name >= letter
+        _, offset = letter_offsets(contacts, field)[letter]
+        page_obj = paginator.page(after=(letter, 0), has_previous=offset > 0)
+    else:
+        page_obj = paginator.page(after=after, before=before)
+
+    if page_obj.has_next():
+        page_obj.next_url = listing_url(
+            request, sort=request.GET['sort'], after=page_obj.next_cursor()
+        )
+    if page_obj.has_previous():
+        page_obj.previous_url = listing_url(
+            request, sort=request.GET['sort'], before=page_obj.previous_cursor()
+        )
+    return page_obj
+
+
+@conditional_page(listing_etag, vary=('X-Fragment',))
 def index(request):
     """
     Displays a paginated list of contacts.
@@ -16,31 +170,68 @@ def index(request):
         HttpResponse: Renders the main contacts page with paginated contact list.
     """
  
-    # Get all visible contacts sorted by ID in descending order
-    contacts = Contact.objects \
-        .filter(show=True)\
-        .order_by('-id')
-    
-    # Paginate contacts (10 per page)
-    paginator = Paginator(contacts, 10)
-
-    # Get the current page number from request
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-        
-    # Prepare context for rendering   
-    context = {
+    # Get all visible contacts (from every shard)
+    contacts = all_contacts(Contact.objects.filter(show=True))
+
+    # Sorting by a column pages with cursors over its (column, id) index
+    sort = parse_sort(request.GET.get('sort'))
+    context = {}
+    if sort:
+        field, descending = sort
+        page_obj = sorted_page(request, contacts, field, descending)
+        context['cursor_pagination'] = True
+        if field in JUMP_FIELDS:
+            context['jump_letters'] = jump_letters(request, contacts, field)
+    else:
+        # Default order: newest first, paginated by number (10 per page),
+        # read from the memory-mapped snapshot when it is up to date
+        field, descending = 'id', True
+        snapshot = listing_snapshot()
+        paginator = Paginator(
+            snapshot if snapshot is not None else contacts.order_by('-id'), 10
+        )
+
+        # Get the current page number from request
+        page_number = request.GET.get("page")
+        page_obj = paginator.get_page(page_number)
+
+        # New contacts pushed by contact.events appear on top of this page
+        context['live_prepend'] = page_obj.number == 1
+
+    # Prepare context for rendering
+    context.update({
         "page_obj": page_obj,
-        'site_title': "Contatos - "
-    }
+        'page_url': listing_url(request, page=''),
+        'columns': column_headers(request, field, descending),
+        'site_title': "Contatos - ",
+        **detail_url_context(),
+    })
 
-    # Render the main contacts page with pagination
+    # Render the main contacts page (or only its list) with pagination
     return render(
         request,
-        'contact/main.html',
+        listing_template(request),
         context,
     )
 
+def counts_views(view):
+    """
+    Counts the views of a contact page, revalidations (304) included.
+
+    The count is buffered in memory and written in batches by
+    `contact.buffers`, so viewing a contact stays a read.
+    """
+    @wraps(view)
+    def wrapper(request, contact_id, *args, **kwargs):
+        response = view(request, contact_id, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record_contact_view(contact_id, request.user)
+        return response
+    return wrapper
+
+
+@counts_views
+@conditional_page(contact_etag, contact_last_modified)
 def contact(request, contact_id):
     """
     Displays a single contact's details.
@@ -54,7 +245,7 @@ def contact(request, contact_id):
     """
     # Retrieve the contact object or return a 404 error if not found
     single_contact = get_object_or_404(
-    Contact, pk=contact_id, show=True
+    all_contacts(Contact.objects), pk=contact_id, show=True
     )
 
     # Construct site title with contact's name
@@ -73,6 +264,7 @@ def contact(request, contact_id):
         context,
     )
 
+@conditional_page(listing_etag, vary=('X-Fragment',))
 def search(request):
     """
     Searches for contacts based on user input.
@@ -92,34 +284,117 @@ def search(request):
     if search_value == "":
         return redirect("contact:index")
 
+    # Equivalent searches ("Ana ", "ana") share their cached results
+    query = normalize_query(search_value)
+
+    # Any listed column can order the results (newest first by default)
+    field, descending = parse_sort(request.GET.get('sort')) or ('id', True)
+    ordering = sort_ordering(field, descending)
+
     # Filter contacts based on search query (partial match)
-    contacts = Contact.objects \
-        .filter(show=True)\
+    visible = all_contacts(Contact.objects.filter(show=True))
+    contacts = visible \
         .filter(
-            Q(first_name__icontains=search_value) |
-            Q(last_name__icontains=search_value) |
-            Q(phone__icontains=search_value) |
-            Q(email__icontains=search_value)
+            Q(first_name__icontains=query) |
+            Q(last_name__icontains=query) |
+            Q(phone__icontains=query) |
+            Q(email__icontains=query)
 
             ) \
-        .order_by('-id')
+        .order_by(*ordering)
 
-    # Paginate results (10 per page)
-    paginator = Paginator(contacts, 10)
+    # Paginate the matching ids (10 per page), then load only that page
+    ids = search_result_ids(contacts, query, ','.join(ordering))
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-        
+    if ids is None:
+        # Too many matches to cache: the database pages them
+        page_obj = Paginator(contacts, 10).get_page(page_number)
+    else:
+        page_obj = load_page(Paginator(ids, 10).get_page(page_number), visible)
+
     # Prepare context with search results
     context = {
         "page_obj": page_obj,
+        'page_url': listing_url(request, page=''),
+        'columns': column_headers(request, field, descending),
         'site_title': "Contatos - ",
-        'search_value': search_value
+        'search_value': search_value,
+        **detail_url_context(),
     }
 
-    # Render search results page
+    # Render search results page (or only its list)
     return render(
         request,
-        'contact/main.html',
+        listing_template(request),
         context,
     )
 
+
+def ranked_columns():
+    """Header cells of the listings ordered by views (not sortable)."""
+    return [{'label': label, 'url': None, 'order': ''} for _, label in COLUMNS]
+
+
+@conditional_page(views_etag, vary=('X-Fragment',))
+def popular(request):
+    """
+    Displays the most viewed contacts.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: Renders the contacts ordered by view count, paginated.
+    """
+    # Ordered by the (view_count, id) index on every shard
+    contacts = all_contacts(Contact.objects.filter(show=True, view_count__gt=0)) \
+        .order_by('-view_count', '-id')
+    page_obj = Paginator(contacts, 10).get_page(request.GET.get("page"))
+
+    context = {
+        "page_obj": page_obj,
+        'page_url': listing_url(request, page=''),
+        'columns': ranked_columns(),
+        'caption': 'Mais vistos',
+        'site_title': "Mais vistos - ",
+        **detail_url_context(),
+    }
+    return render(request, listing_template(request), context)
+
+
+@conditional_page(views_etag, vary=('X-Fragment',))
+def recent(request):
+    """
+    Displays the recently viewed contacts.
+
+    Args:
+        request (HttpRequest): ``?mine=1`` limits the list to the contacts
+            the logged-in user viewed.
+
+    Returns:
+        HttpResponse: Renders the contacts ordered by last view, paginated.
+    """
+    visible = all_contacts(Contact.objects.filter(show=True))
+
+    if request.user.is_authenticated and request.GET.get('mine'):
+        # The user's history lives in default, the contacts in their shards
+        ids = ContactView.objects \
+            .filter(user=request.user) \
+            .order_by('-last_viewed', '-contact_id') \
+            .values_list('contact_id', flat=True)
+        page_obj = load_page(Paginator(ids, 10).get_page(request.GET.get("page")), visible)
+        caption = 'Vistos por mim'
+    else:
+        contacts = visible.filter(last_viewed__isnull=False).order_by('-last_viewed', '-id')
+        page_obj = Paginator(contacts, 10).get_page(request.GET.get("page"))
+        caption = 'Vistos recentemente'
+
+    context = {
+        "page_obj": page_obj,
+        'page_url': listing_url(request, page=''),
+        'columns': ranked_columns(),
+        'caption': caption,
+        'site_title': f"{caption} - ",
+        **detail_url_context(),
+    }
+    return render(request, listing_template(request), context)
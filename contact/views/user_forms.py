@@ -1,9 +1,13 @@
 from django.shortcuts import render, redirect
-from contact.forms import RegisterForm, RegisterUpdateForm
-from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import auth, messages
 from django.contrib.auth.decorators import login_required
 
+from contact.audit import audit_form
+
+# The user forms are imported inside the views: they pull in
+# django.contrib.auth.forms, which is only needed by these pages, so
+# workers do not pay for it at start-up.
+
 def register(request):
     """
     Handles the user registration process.
@@ -19,6 +23,8 @@ def register(request):
         HttpResponse: Renders the registration form if there are validation errors.
     """
 
+    from contact.auth_forms import RegisterForm
+
     # Initialize an empty registration form
     form = RegisterForm()
 
@@ -56,6 +62,8 @@ def login_view(request):
         HttpResponse: Renders the login page with validation errors if authentication fails.
     """
 
+    from django.contrib.auth.forms import AuthenticationForm
+
     # Initialize the authentication form
     form = AuthenticationForm(request)
     
@@ -94,6 +102,8 @@ def user_update(request):
         HttpResponse: Renders the registration update form if submission fails.
     """
 
+    from contact.auth_forms import RegisterUpdateForm
+
     # Initialize form with current user data
     form = RegisterUpdateForm(instance=request.user)
 
@@ -117,7 +127,9 @@ def user_update(request):
             }
         )
     
-    form.save()   # Save updated user information
+    user = form.save()   # Save updated user information
+    auth.update_session_auth_hash(request, user)   # Stay logged in after a password change
+    audit_form(request.user, 'update', form)   # Queue the field diff (never the password itself)
     return redirect('contact:user_update')  # Redirect to the user update page
 
 @login_required(login_url='contact:login')
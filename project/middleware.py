@@ -0,0 +1,426 @@
+"""
+Project-wide middleware: response compression and admission control.
+
+`CompressionMiddleware` negotiates brotli, zstd or gzip with the client
+(in that order of preference, among the codings it accepts) and compresses:
+
+- regular responses in one pass, when they are at least
+  ``COMPRESSION_MIN_SIZE`` bytes;
+- streaming responses chunk by chunk, flushing the compressor after each
+  chunk, so nothing is buffered and the client sees every chunk as soon as
+  the view produces it (sync and async iterators alike).
+
+Only textual types are compressed (pictures, archives and responses that
+already have a ``Content-Encoding`` are left alone), as are server-sent
+event streams, which proxies would otherwise hold back. Levels can be set
+per content type in ``COMPRESSION_LEVELS``.
+
+BREACH: a compressed page that reflects user input and holds a secret
+leaks the secret through its length. Django masks the CSRF token with a
+new random value every time it is rendered, so the token itself does not
+compress against an attacker's guess. HTML pages that used a CSRF token
+also get a comment of random length (up to ``BREACH_PADDING`` bytes): it
+does not hide anything, but it adds noise to the length, so measuring a
+one-byte difference takes many more requests. Other secrets shown next to
+reflected input are not protected by either measure. Compressed responses
+have their ETag made weak, as the bytes sent are no longer the bytes
+tagged.
+
+Static files and uploads do not go through here: `project.static` serves
+precompressed variants of them.
+
+`AdmissionControlMiddleware` caps the concurrency of expensive views
+(searches, picture uploads, password hashing) per worker and sheds the
+excess with a 503, so those paths cannot take every thread while cheap
+reads wait behind them.
+"""
+
+import logging
+import secrets
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from project.static import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional as well
+    zstandard = None
+
+logger = logging.getLogger('project.middleware')
+
+COMPRESSIBLE_TYPES = {
+    'application/javascript',
+    'application/json',
+    'application/ld+json',
+    'application/manifest+json',
+    'application/xml',
+    'image/svg+xml',
+}
+
+# Streams that must reach the client event by event, untouched
+UNCOMPRESSED_TYPES = {'text/event-stream'}
+
+# Levels by content type and coding; COMPRESSION_LEVELS overrides them.
+# Pages are compressed on every request, so the levels favour speed.
+DEFAULT_LEVELS = {
+    '*': {'br': 4, 'zstd': 3, 'gzip': 6},
+    'application/json': {'br': 5, 'zstd': 6, 'gzip': 6},
+}
+
+# Largest random padding added to HTML pages carrying a CSRF token
+BREACH_PADDING = 64
+
+
+def media_type(response):
+    return response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+
+
+def is_compressible(content_type):
+    if content_type in UNCOMPRESSED_TYPES:
+        return False
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
+
+
+def compression_level(content_type, coding):
+    levels = {**DEFAULT_LEVELS, **getattr(settings, 'COMPRESSION_LEVELS', {})}
+    for key in (content_type, content_type.split('/', 1)[0] + '/*', '*'):
+        if coding in levels.get(key, {}):
+            return levels[key][coding]
+    return DEFAULT_LEVELS['*'][coding]
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31: gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_compressors():
+    """Codings this process can produce, most efficient first."""
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', BrotliCompressor))
+    if zstandard is not None:
+        compressors.append(('zstd', ZstdCompressor))
+    compressors.append(('gzip', GzipCompressor))
+    return compressors
+
+
+COMPRESSORS = available_compressors()
+
+
+def negotiate(accept_encoding):
+    """Returns ``(coding, compressor class)`` for a request, or None."""
+    accepted = accepted_encodings(accept_encoding)
+    for coding, compressor in COMPRESSORS:
+        if coding in accepted:
+            return coding, compressor
+    return None
+
+
+def compress_chunks(compressor, chunks):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        flushed = compressor.flush()
+        if data or flushed:
+            yield data + flushed
+    yield compressor.finish()
+
+
+async def compress_chunks_async(compressor, chunks):
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        flushed = compressor.flush()
+        if data or flushed:
+            yield data + flushed
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compresses textual responses with the best coding the client accepts."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        content_type = media_type(response)
+        if not is_compressible(content_type) or response.has_header('Content-Encoding'):
+            return response
+        if response.status_code in (204, 206, 304) or request.method == 'HEAD':
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+
+        # The response depends on Accept-Encoding even when not compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        negotiated = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if negotiated is None:
+            return response
+        coding, compressor_class = negotiated
+        compressor = compressor_class(compression_level(content_type, coding))
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_chunks_async(
+                    compressor, response.streaming_content
+                )
+            else:
+                response.streaming_content = compress_chunks(
+                    compressor, response.streaming_content
+                )
+            del response['Content-Length']
+        else:
+            content = response.content
+            if content_type == 'text/html' and self.used_csrf_token(request):
+                content += self.breach_padding()
+            compressed = compressor.compress(content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    @staticmethod
+    def used_csrf_token(request):
+        """
+        Whether the page rendered a CSRF token (or rotated it).
+
+        ``get_token`` sets ``CSRF_COOKIE_NEEDS_UPDATE``, and
+        `CsrfViewMiddleware` resets it to False before this outer
+        middleware sees the response, so only the presence of the key tells.
+        """
+        return 'CSRF_COOKIE_NEEDS_UPDATE' in request.META
+
+    @staticmethod
+    def breach_padding():
+        """An HTML comment of random length, hiding the size of the secret."""
+        size = secrets.randbelow(BREACH_PADDING + 1)
+        return f'<!-- {secrets.token_hex(BREACH_PADDING)[:size]} -->'.encode()
+
+
+class AdmissionQueue:
+    """
+    Concurrency limit of one class of requests, with a short bounded queue.
+
+    Up to ``limit`` requests of the class run at once and up to ``queue``
+    more wait, each at most ``timeout`` seconds; the rest are refused
+    right away instead of piling up behind the ones already waiting.
+    """
+
+    def __init__(self, name, limit, queue, timeout, retry_after):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        # Counters since the start of the process
+        self.admitted = 0
+        self.shed = 0
+        self.max_waiting = 0
+        self.wait_time = 0.0
+
+    def acquire(self, wait=True):
+        """Returns the seconds spent queued, or None when the request is shed."""
+        with self.condition:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return 0.0
+            if not wait or self.waiting >= self.queue:
+                self.shed += 1
+                return None
+
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            started = time.monotonic()
+            deadline = started + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return None
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            waited = time.monotonic() - started
+            self.active += 1
+            self.admitted += 1
+            self.wait_time += waited
+            return waited
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def metrics(self):
+        with self.condition:
+            return {
+                'limit': self.limit,
+                'queue': self.queue,
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'average_wait': self.wait_time / self.admitted if self.admitted else 0.0,
+            }
+
+
+class AdmissionControl:
+    """The admission queues of this process and the views they cover."""
+
+    def __init__(self, classes, views):
+        self.queues = {
+            name: AdmissionQueue(
+                name,
+                config['limit'],
+                config.get('queue', 0),
+                config.get('timeout', 1.0),
+                config.get('retry_after', 1),
+            )
+            for name, config in classes.items()
+        }
+        self.views = views
+
+    def classify(self, request, view_name):
+        name = self.views.get(f'{request.method} {view_name}') or self.views.get(view_name)
+        return self.queues.get(name)
+
+    def metrics(self):
+        return {name: queue.metrics() for name, queue in self.queues.items()}
+
+
+_admission = None
+
+
+def admission_control():
+    """The admission queues built from the settings, once per process."""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionControl(
+            getattr(settings, 'ADMISSION_CLASSES', {}),
+            getattr(settings, 'ADMISSION_VIEWS', {}),
+        )
+    return _admission
+
+
+class AdmissionControlMiddleware:
+    """
+    Limits how many expensive requests of each class run at once.
+
+    Views are mapped to classes in ``ADMISSION_VIEWS`` (by URL name,
+    optionally prefixed by the method: ``'POST contact:create'``) and the
+    classes are sized in ``ADMISSION_CLASSES``. Requests of a full class
+    wait in its short queue, or get a 503 with ``Retry-After`` once the
+    queue is full or their wait times out. Unmapped views are never held
+    back, so cheap reads keep the threads the expensive classes cannot
+    take.
+
+    Limits apply per worker process. Under ASGI, synchronous middleware
+    shares one thread, so requests are never queued there: a full class
+    sheds at once.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.control = admission_control()
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            queue = getattr(request, '_admission_queue', None)
+            if queue is not None:
+                queue.release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        queue = self.control.classify(request, request.resolver_match.view_name)
+        if queue is None:
+            return None
+
+        waited = queue.acquire(wait=not isinstance(request, ASGIRequest))
+        if waited is None:
+            logger.warning(
+                'Shed %s %s (%s: %d running, %d queued)',
+                request.method, request.path, queue.name, queue.active, queue.waiting,
+            )
+            response = HttpResponse(
+                'Servidor ocupado, tente novamente em instantes.',
+                status=503,
+                content_type='text/plain; charset=utf-8',
+            )
+            response['Retry-After'] = str(queue.retry_after)
+            return response
+
+        request._admission_queue = queue
+        request.admission_wait = waited
+        return None
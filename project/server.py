@@ -0,0 +1,522 @@
+"""
+Pre-fork production server.
+
+    python -m project.server --bind 0.0.0.0:8000
+
+The master process imports ``project.wsgi.application`` (Django, the
+URLconf, every view and template loader) once, freezes the objects it
+created out of the garbage collector and then forks the workers, so the
+loaded code is shared copy-on-write instead of being built again in each
+worker. Workers accept connections from the shared listening socket and
+serve them with a pool of threads.
+
+Sizing:
+
+- ``--workers`` defaults to the usable CPUs, capped so that ``--max-rss``
+  per worker fits in the available memory. The listing generations, the
+  search cache and the snapshot are coordinated through the ``default``
+  cache, so with a process-local one (``LocMemCache``, the default unless
+  ``DJANGO_CACHE_URL`` is set) a single worker is started and asking for
+  more is an error;
+- ``--threads auto`` (the default) measures the request mix in each
+  worker: with requests spending a share ``c`` of their time on the CPU,
+  about ``1 / c`` threads keep a core busy while the others wait on the
+  database or the disk. The limit is recomputed every
+  ``SIZING_INTERVAL`` requests, between 1 and ``--max-threads``.
+
+Recycling: a worker stops accepting after ``--max-requests`` requests
+(with a random jitter, so workers do not restart together) or once its
+resident memory passes ``--max-rss`` megabytes, finishes the requests in
+flight and exits; the master starts a fresh one.
+
+Signals to the master:
+
+- ``TERM``/``INT``: graceful shutdown, requests in flight finish
+  (``--graceful-timeout``);
+- ``HUP``: zero-downtime reload. A new master is started on the same
+  socket with the new code; once its workers run it stops the old master,
+  whose workers finish their requests. ``--pid`` keeps the pid file
+  pointing to the current master.
+"""
+
+import argparse
+import atexit
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+logger = logging.getLogger('project.server')
+
+# Requests between two thread pool sizings of a worker
+SIZING_INTERVAL = 200
+
+# Weight of the last sizing interval in the measured CPU share
+SIZING_SMOOTHING = 0.3
+
+# Environment of a master started by a reload
+INHERITED_FD_VARIABLE = 'PROJECT_SERVER_FD'
+
+
+def usable_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+def available_memory():
+    """MemAvailable in bytes, or None when /proc/meminfo cannot be read."""
+    try:
+        with open('/proc/meminfo') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_memory():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak instead of current RSS (kilobytes on Linux, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def default_workers(max_rss):
+    """One worker per usable CPU, as many as fit in memory with ``max_rss``."""
+    workers = usable_cpus()
+    memory = available_memory()
+    if max_rss and memory:
+        workers = min(workers, max(1, memory // max_rss))
+    return workers
+
+
+def bind_socket(address, backlog):
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, int(port)))
+    listener.listen(backlog)
+    return listener
+
+
+class ConcurrencyLimit:
+    """A semaphore whose size can change while it is used."""
+
+    def __init__(self, limit):
+        self.condition = threading.Condition()
+        self.limit = limit
+        self.active = 0
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def resize(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+
+class RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        # Access logs belong to the proxy in front of the server
+        pass
+
+
+class WorkerServer(WSGIServer):
+    """
+    The HTTP server of one worker, on the socket of the master.
+
+    Connections are accepted only while a thread is free, so a busy worker
+    leaves new connections to the others.
+    """
+
+    def __init__(self, listener, application, options):
+        super().__init__(
+            listener.getsockname()[:2], RequestHandler, bind_and_activate=False
+        )
+        self.socket.close()
+        self.socket = listener
+        self.server_name = self.server_address[0]
+        self.server_port = self.server_address[1]
+        self.setup_environ()
+        self.set_app(application)
+
+        self.options = options
+        self.adaptive = options.threads == 'auto'
+        threads = options.max_threads if self.adaptive else int(options.threads)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        # Auto sizing starts halfway and settles after the first interval
+        self.limit = ConcurrencyLimit(max(1, threads // 2) if self.adaptive else threads)
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.max_requests = options.max_requests
+        if self.max_requests:
+            self.max_requests += random.randint(0, options.max_requests_jitter)
+        self.max_rss = options.max_rss * 1024 * 1024 if options.max_rss else None
+        self.retiring = False
+
+        # Measured request mix: CPU and wall time of the current interval
+        self.cpu_time = self.wall_time = 0.0
+        self.cpu_share = None
+
+    def get_request(self):
+        # A thread is taken before accepting: while every thread is busy the
+        # connection stays in the listen queue for the other workers
+        self.limit.acquire()
+        try:
+            return super().get_request()
+        except BaseException:
+            # Another worker won the race for the connection
+            self.limit.release()
+            raise
+
+    def process_request(self, request, client_address):
+        try:
+            self.executor.submit(self.process_request_thread, request, client_address)
+        except BaseException:
+            self.limit.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.limit.release()
+            self.request_done(
+                time.thread_time() - cpu_started, time.perf_counter() - started
+            )
+
+    def request_done(self, cpu, wall):
+        with self.lock:
+            self.requests += 1
+            self.cpu_time += cpu
+            self.wall_time += wall
+            if self.adaptive and self.requests % SIZING_INTERVAL == 0:
+                self.resize()
+
+            if self.retiring:
+                return
+            if self.max_requests and self.requests >= self.max_requests:
+                reason = f'{self.requests} requests'
+            elif self.max_rss and resident_memory() > self.max_rss:
+                reason = f'{resident_memory() // (1024 * 1024)} MB resident'
+            else:
+                return
+            self.retiring = True
+
+        logger.info('Worker %d retiring after %s', os.getpid(), reason)
+        # shutdown() waits for serve_forever, which runs in the main thread
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def resize(self):
+        """Sizes the thread limit from the CPU share of the last requests."""
+        if not self.wall_time:
+            return
+        share = self.cpu_time / self.wall_time
+        self.cpu_time = self.wall_time = 0.0
+        if self.cpu_share is None:
+            self.cpu_share = share
+        else:
+            self.cpu_share += SIZING_SMOOTHING * (share - self.cpu_share)
+
+        threads = round(1 / max(self.cpu_share, 1 / self.options.max_threads))
+        threads = max(1, min(self.options.max_threads, threads))
+        if threads != self.limit.limit:
+            logger.info(
+                'Worker %d: requests use %.0f%% CPU, %d threads',
+                os.getpid(), self.cpu_share * 100, threads,
+            )
+            self.limit.resize(threads)
+
+    def stop(self, timeout):
+        """Waits for the requests in flight, at most ``timeout`` seconds."""
+        waiter = threading.Thread(target=self.executor.shutdown, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+
+
+class Arbiter:
+    """The master process: forks, watches and replaces the workers."""
+
+    def __init__(self, options, listener, application):
+        self.options = options
+        self.listener = listener
+        self.application = application
+        self.workers = set()
+        self.stopping = False
+        self.reloading = False
+
+    def run(self):
+        self.setup_signals()
+        self.write_pid()
+        logger.info(
+            'Master %d serving %s with %d workers',
+            os.getpid(), self.options.bind, self.options.workers,
+        )
+        self.spawn_workers()
+
+        if self.options.replaces:
+            # Reload: the new workers are up, the old master can go
+            self.signal_process(self.options.replaces, signal.SIGTERM)
+
+        while self.workers or not self.stopping:
+            self.wait_for_signal()
+            self.reap_workers()
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            if not self.stopping:
+                self.spawn_workers()
+
+        self.remove_pid()
+        logger.info('Master %d stopped', os.getpid())
+
+    def setup_signals(self):
+        self.wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        # Only needs to interrupt select(), reaping happens in the loop
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def handle_stop(self, signum, frame):
+        if not self.stopping:
+            self.stopping = True
+            self.stop_workers(signal.SIGTERM)
+
+    def handle_reload(self, signum, frame):
+        self.reloading = True
+
+    def wait_for_signal(self):
+        try:
+            select.select([self.wakeup_read], [], [], 1.0)
+            while os.read(self.wakeup_read, 512):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def spawn_workers(self):
+        while len(self.workers) < self.options.workers:
+            pid = os.fork()
+            if pid == 0:
+                self.run_worker()
+            self.workers.add(pid)
+
+    def run_worker(self):
+        """Runs in the forked child and never returns."""
+        status = 0
+        try:
+            signal.set_wakeup_fd(-1)
+            for signum in (signal.SIGHUP, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            # Workers all wait on the socket: those that lose the race for a
+            # connection must not block in accept()
+            self.listener.setblocking(False)
+            server = WorkerServer(self.listener, self.application, self.options)
+
+            def graceful(signum, frame):
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+            signal.signal(signal.SIGTERM, graceful)
+            signal.signal(signal.SIGINT, graceful)
+            server.serve_forever()
+            server.stop(self.options.graceful_timeout)
+            # os._exit skips the exit handlers, which flush the write
+            # buffers of the application (contact.buffers)
+            atexit._run_exitfuncs()
+        except Exception:
+            logger.exception('Worker %d failed', os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                code = os.waitstatus_to_exitcode(status)
+                if code and not self.stopping:
+                    # Negative codes are the signal that killed the worker
+                    logger.warning('Worker %d exited with status %d', pid, code)
+
+    def stop_workers(self, signum):
+        for pid in list(self.workers):
+            self.signal_process(pid, signum)
+
+        # Workers that do not finish in time are killed
+        def kill_late():
+            time.sleep(self.options.graceful_timeout + 1)
+            for pid in list(self.workers):
+                self.signal_process(pid, signal.SIGKILL)
+
+        threading.Thread(target=kill_late, daemon=True).start()
+
+    def signal_process(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reload(self):
+        """Starts a new master with the new code on the same socket."""
+        logger.info('Master %d reloading', os.getpid())
+        import subprocess
+
+        environ = dict(os.environ, **{INHERITED_FD_VARIABLE: str(self.listener.fileno())})
+        arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--replaces')]
+        subprocess.Popen(
+            [sys.executable, '-m', 'project.server', *arguments, f'--replaces={os.getpid()}'],
+            env=environ,
+            pass_fds=(self.listener.fileno(),),
+        )
+
+    def write_pid(self):
+        if self.options.pid:
+            with open(self.options.pid, 'w') as file:
+                file.write(f'{os.getpid()}\n')
+
+    def remove_pid(self):
+        if not self.options.pid:
+            return
+        try:
+            with open(self.options.pid) as file:
+                # After a reload the file belongs to the new master
+                if file.read().strip() != str(os.getpid()):
+                    return
+            os.unlink(self.options.pid)
+        except OSError:
+            pass
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m project.server', description='Pre-fork WSGI server.'
+    )
+    parser.add_argument('--bind', default='127.0.0.1:8000', help='host:port to listen on.')
+    parser.add_argument('--backlog', type=int, default=2048, help='Listen queue length.')
+    parser.add_argument(
+        '--workers', type=int,
+        help='Worker processes (default: usable CPUs, within the memory for --max-rss).',
+    )
+    parser.add_argument(
+        '--threads', default='auto',
+        help="Threads per worker, or 'auto' to size them from the request mix.",
+    )
+    parser.add_argument(
+        '--max-threads', type=int, default=16,
+        help="Most threads per worker with --threads auto.",
+    )
+    parser.add_argument(
+        '--max-requests', type=int, default=5000,
+        help='Recycle a worker after this many requests (0: never).',
+    )
+    parser.add_argument(
+        '--max-requests-jitter', type=int, default=500,
+        help='Random extra requests, so workers do not recycle together.',
+    )
+    parser.add_argument(
+        '--max-rss', type=int, default=0,
+        help='Recycle a worker above this resident memory, in megabytes (0: never).',
+    )
+    parser.add_argument(
+        '--graceful-timeout', type=float, default=30,
+        help='Seconds given to requests in flight when a worker stops.',
+    )
+    parser.add_argument('--pid', help='File to write the pid of the master to.')
+    parser.add_argument('--replaces', type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.threads != 'auto' and not options.threads.isdigit():
+        parser.error("--threads must be a number or 'auto'")
+    return options
+
+
+def check_workers(options):
+    """Sets the default worker count, refusing several with a local cache."""
+    from contact.caching import shared_cache
+
+    if shared_cache():
+        if options.workers is None:
+            options.workers = default_workers(options.max_rss * 1024 * 1024)
+        return
+    if options.workers is not None and options.workers > 1:
+        sys.exit(
+            'Several workers need a shared cache: each one would keep its own '
+            'generations and serve stale pages. Set DJANGO_CACHE_URL.'
+        )
+    options.workers = 1
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='[%(process)d] %(message)s')
+
+    inherited = os.environ.pop(INHERITED_FD_VARIABLE, None)
+    if inherited is not None:
+        listener = socket.socket(fileno=int(inherited))
+    else:
+        listener = bind_socket(options.bind, options.backlog)
+
+    # Preload: everything imported here is shared with the workers
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    from project.wsgi import application
+    from django.conf import settings
+    from django.db import connections
+
+    # The URLconf imports every view
+    import_module(settings.ROOT_URLCONF)
+    check_workers(options)
+    # Connections opened while loading must not be shared across processes
+    connections.close_all()
+    # Objects created so far are never collected: the collector would
+    # otherwise touch (and copy) their pages in every worker
+    gc.collect()
+    gc.freeze()
+
+    Arbiter(options, listener, application).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -22,16 +23,24 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-5(ppb3&w76zh3)%_ar^zd$-kh+39u*k$@v5u4x==z#t71@cpnb'
 
+# Production mode is switched on with DJANGO_PRODUCTION=1. It disables
+# DEBUG and enables the production static files pipeline.
+PRODUCTION = os.environ.get('DJANGO_PRODUCTION') == '1'
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = not PRODUCTION
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host
+]
 
 
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # SimpleAdminConfig skips admin autodiscovery at start-up; project.urls
+    # runs it when the URLconf is first loaded.
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -41,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it compresses the response the other middleware finished
+    'project.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,8 +59,40 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, so requests other middleware rejects never take a slot
+    'project.middleware.AdmissionControlMiddleware',
 ]
 
+# Responses smaller than this are sent uncompressed (project.middleware)
+COMPRESSION_MIN_SIZE = 512
+
+# Compression levels by content type and coding ('br', 'zstd', 'gzip'),
+# merged over the defaults of project.middleware.DEFAULT_LEVELS
+COMPRESSION_LEVELS = {
+    'text/html': {'br': 5, 'zstd': 6, 'gzip': 6},
+}
+
+# Admission control (project.middleware): expensive views run at most
+# `limit` at a time per worker, `queue` more wait up to `timeout` seconds,
+# the rest get a 503 with Retry-After. Views not listed are never held.
+ADMISSION_CLASSES = {
+    # LIKE scans over every shard
+    'search': {'limit': 2, 'queue': 4, 'timeout': 1.0, 'retry_after': 2},
+    # Picture uploads: streamed to disk, hashed and their header checked
+    'upload': {'limit': 2, 'queue': 4, 'timeout': 5.0, 'retry_after': 5},
+    # Password hashing (PBKDF2)
+    'auth': {'limit': 2, 'queue': 8, 'timeout': 2.0, 'retry_after': 2},
+}
+
+ADMISSION_VIEWS = {
+    'contact:search': 'search',
+    'POST contact:create': 'upload',
+    'POST contact:update': 'upload',
+    'POST contact:login': 'auth',
+    'POST contact:register': 'auth',
+    'POST contact:user_update': 'auth',
+}
+
 ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
@@ -58,7 +101,7 @@ TEMPLATES = [
         'DIRS': [
             BASE_DIR / 'base_templates'
         ],
-        'APP_DIRS': True,
+        'APP_DIRS': not PRODUCTION,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
@@ -69,6 +112,45 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Templates are compiled once per process and never checked for changes
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# DJANGO_TEMPLATE_PROFILING=1 logs per-template and per-tag render times
+# and sends them in a Server-Timing header.
+TEMPLATE_PROFILING = os.environ.get('DJANGO_TEMPLATE_PROFILING') == '1'
+
+if TEMPLATE_PROFILING:
+    MIDDLEWARE.insert(0, 'contact.profiling.TemplateProfilingMiddleware')
+
+# DJANGO_MEMORY_PROFILING=1 traces allocations per view (tracemalloc) and
+# serves them to staff users at /debug/memory/.
+MEMORY_PROFILING = os.environ.get('DJANGO_MEMORY_PROFILING') == '1'
+
+if MEMORY_PROFILING:
+    MIDDLEWARE.insert(0, 'contact.profiling.MemoryProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'contact.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 WSGI_APPLICATION = 'project.wsgi.application'
 
 
@@ -82,6 +164,61 @@ DATABASES = {
     }
 }
 
+# Contacts are sharded by owner across these databases (see contact.sharding).
+# The first one must be 'default', which also keeps users, sessions and
+# categories. DJANGO_CONTACT_SHARDS=N adds N-1 local SQLite shards; migrate
+# each of them with: python manage.py migrate --database shard1
+CONTACT_SHARD_DATABASES = ['default']
+
+for shard in range(1, int(os.environ.get('DJANGO_CONTACT_SHARDS', '1'))):
+    DATABASES[f'shard{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db-shard{shard}.sqlite3',
+    }
+    CONTACT_SHARD_DATABASES.append(f'shard{shard}')
+
+DATABASE_ROUTERS = ['contact.sharding.ContactShardRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The contact listing generation counters live here. Several workers need
+# a shared backend: DJANGO_CACHE_URL=redis://host:6379/0 selects Redis
+# (project.server refuses to start more than one worker without it).
+
+CACHE_URL = os.environ.get('DJANGO_CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Bump to invalidate every ETag after a deploy that changes the templates.
+HTTP_CACHE_VERSION = '1'
+
+# Buffered writes (contact.buffers): view counts are written in batches
+# every BUFFER_FLUSH_INTERVAL seconds, or once BUFFER_MAX_PENDING wait.
+BUFFER_FLUSH_INTERVAL = 5.0
+BUFFER_MAX_PENDING = 10000
+
+# Memory each worker may use to keep the matching ids of recent searches
+SEARCH_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# Searches matching more contacts are paged by the database, not cached
+SEARCH_CACHE_MAX_IDS = 10_000
+
+# File of the memory-mapped snapshot serving the default listing without
+# queries (contact.snapshot), e.g. DJANGO_CONTACT_SNAPSHOT=/var/lib/agenda/
+# listing.snapshot. Unset, the listing is read from the database.
+CONTACT_SNAPSHOT_PATH = os.environ.get('DJANGO_CONTACT_SNAPSHOT')
+
+# Live list updates (contact.events) stay inside each process unless a Redis
+# URL is set, which relays them to the streams of every worker.
+CONTACT_EVENTS_REDIS_URL = os.environ.get('DJANGO_CONTACT_EVENTS_REDIS_URL')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,9 +260,28 @@ STATICFILES_DIRS = (
 )
 STATIC_ROOT = BASE_DIR / 'static'
 
+# In production `collectstatic` writes hashed names plus .gz/.br variants,
+# and project.wsgi serves them with far-future cache headers.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'project.static.CompressedManifestStaticFilesStorage'
+            if PRODUCTION else
+            'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Contact picture limits, enforced while the upload is streamed
+CONTACT_PICTURE_MAX_SIZE = 5 * 1024 * 1024
+CONTACT_PICTURE_MAX_PIXELS = 24_000_000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
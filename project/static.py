@@ -0,0 +1,252 @@
+"""
+Production static files.
+
+`CompressedManifestStaticFilesStorage` stores hashed file names (via the
+manifest) and writes gzip and brotli variants of every text asset during
+``collectstatic``. `StaticFilesMiddleware` is a WSGI middleware that serves
+those files straight from ``STATIC_ROOT``, picking the best precompressed
+variant and sending far-future immutable cache headers for hashed names.
+`MediaFilesMiddleware` does the same for uploaded pictures. Both are meant
+for deployments that do not have nginx in front of the app.
+"""
+
+import gzip
+import json
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from stat import S_ISREG
+from urllib.parse import urlparse
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.svg', '.html', '.txt', '.json', '.xml',
+}
+
+# Variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+
+
+def compress_file(path):
+    """
+    Writes ``.gz`` (and ``.br`` when brotli is installed) next to a file.
+
+    Variants that are not smaller than the original are not kept.
+    """
+    data = path.read_bytes()
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+
+    for suffix, compressed in variants.items():
+        target = path.with_name(path.name + suffix)
+        if len(compressed) < len(data):
+            target.write_bytes(compressed)
+        elif target.exists():
+            target.unlink()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also precompresses the collected files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, was_processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if hashed_name and not isinstance(was_processed, Exception):
+                processed.add(hashed_name)
+            yield name, hashed_name, was_processed
+
+        if dry_run:
+            return
+
+        for name in processed:
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                compress_file(Path(self.path(name)))
+
+
+def accepted_encodings(header):
+    """Returns the content codings a client accepts (``q=0`` excluded)."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    WSGI middleware serving files under ``url`` from ``root``.
+
+    The directory is indexed once when the middleware is created (files
+    only change on deploy, which restarts the workers), so serving a file
+    costs no ``stat`` calls. Requests for unknown files fall through to the
+    wrapped application.
+
+    Args:
+        application: The WSGI application being wrapped.
+        url (str): URL prefix, e.g. ``settings.STATIC_URL``.
+        root (str | Path): Directory the files are served from.
+        is_immutable (callable): Receives a file name relative to ``root``
+            and tells whether it may be cached forever. Defaults to the
+            hashed names listed in the staticfiles manifest.
+    """
+
+    def __init__(self, application, url, root, is_immutable=None):
+        self.application = application
+        self.prefix = '/' + urlparse(str(url)).path.strip('/') + '/'
+        self.root = Path(root)
+        self.files = self.build_index()
+
+        if is_immutable is None:
+            hashed_names = self.load_manifest()
+            is_immutable = hashed_names.__contains__
+        self.is_immutable = is_immutable
+
+    def load_manifest(self):
+        """Returns the hashed names listed in the staticfiles manifest."""
+        manifest = self.root / ManifestStaticFilesStorage.manifest_name
+        try:
+            paths = json.loads(manifest.read_text()).get('paths', {})
+        except (OSError, ValueError):
+            return set()
+        return set(paths.values())
+
+    def build_index(self):
+        """Maps each servable name to its size, mtime and variants."""
+        files = {}
+        suffixes = {suffix for _, suffix in ENCODINGS}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(directory) / filename
+                if path.suffix in suffixes:
+                    continue
+
+                stat = path.stat()
+                variants = {}
+                for encoding, suffix in ENCODINGS:
+                    variant = path.with_name(filename + suffix)
+                    if variant.exists():
+                        variants[encoding] = (variant, variant.stat().st_size)
+
+                name = path.relative_to(self.root).as_posix()
+                files[name] = (path, stat.st_size, stat.st_mtime, variants)
+        return files
+
+    def find(self, name):
+        """Returns ``(path, size, mtime, variants)`` for a name, or None."""
+        return self.files.get(name)
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD')
+
+        if method not in ('GET', 'HEAD') or not path_info.startswith(self.prefix):
+            return self.application(environ, start_response)
+
+        name = path_info[len(self.prefix):]
+        entry = self.find(name)
+        if entry is None:
+            return self.application(environ, start_response)
+
+        path, size, mtime, variants = entry
+        content_type, _ = mimetypes.guess_type(name)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Last-Modified', formatdate(mtime, usegmt=True)),
+        ]
+        if variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if self.is_immutable(name):
+            headers.append(('Cache-Control', IMMUTABLE_CACHE_CONTROL))
+        else:
+            headers.append(('Cache-Control', DEFAULT_CACHE_CONTROL))
+
+            if self.not_modified(environ, mtime):
+                start_response('304 Not Modified', headers)
+                return []
+
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, _ in ENCODINGS:
+            if encoding in variants and encoding in accepted:
+                path, size = variants[encoding]
+                headers.append(('Content-Encoding', encoding))
+                break
+
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+
+        if method == 'HEAD':
+            return []
+
+        file = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(file, 64 * 1024)
+        return self.iter_file(file)
+
+    @staticmethod
+    def iter_file(file, chunk_size=64 * 1024):
+        """Reads a file in chunks, closing it at the end."""
+        with file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    @staticmethod
+    def not_modified(environ, mtime):
+        """Checks If-Modified-Since against the file modification time."""
+        header = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if not header:
+            return False
+        try:
+            return int(mtime) <= parsedate_to_datetime(header).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+
+class MediaFilesMiddleware(StaticFilesMiddleware):
+    """
+    `StaticFilesMiddleware` for user uploads.
+
+    Uploads appear while the app runs, so files are looked up on each
+    request instead of being indexed at startup. Content-addressed names
+    (see `contact.storage`) are served as immutable.
+    """
+
+    def __init__(self, application, url, root):
+        from contact.storage import is_hashed_name
+
+        super().__init__(application, url, root, is_immutable=is_hashed_name)
+
+    def build_index(self):
+        return {}
+
+    def find(self, name):
+        # Dot directories hold quarantined orphans and uploads in progress
+        if any(part.startswith('.') for part in name.split('/')):
+            return None
+        try:
+            path = Path(safe_join(self.root, name))
+            stat = path.stat()
+        except (SuspiciousFileOperation, ValueError, OSError):
+            return None
+
+        if not S_ISREG(stat.st_mode):
+            return None
+        return path, stat.st_size, stat.st_mtime, {}
@@ -0,0 +1,420 @@
+import gzip
+import http.client
+import json
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve, reverse
+
+from project.middleware import (
+    AdmissionControl, AdmissionControlMiddleware, AdmissionQueue, CompressionMiddleware,
+    negotiate,
+)
+from project.server import (
+    Arbiter, ConcurrencyLimit, WorkerServer, bind_socket, default_workers, parse_args,
+)
+from project.static import (
+    DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, MediaFilesMiddleware, StaticFilesMiddleware,
+    accepted_encodings,
+)
+
+PAGE = ('<html><body>' + '<p>Contato de teste</p>' * 200 + '</body></html>').encode()
+
+
+def fallback(environ, start_response):
+    """The wrapped application: every request it gets is a 404."""
+    start_response('404 Not Found', [])
+    return [b'app']
+
+
+def call(application, path, **environ):
+    """Runs a WSGI GET request; returns the status, headers and body."""
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **environ}
+    response = {}
+
+    def start_response(status, headers):
+        response['status'] = int(status.split()[0])
+        response['headers'] = dict(headers)
+
+    body = b''.join(application(environ, start_response))
+    return response['status'], response['headers'], body
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def respond(self, response, accept='gzip, deflate, br;q=0', **extra):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept, **extra)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate')[0], 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, deflate'))
+        self.assertIsNone(negotiate(''))
+
+    def test_html_is_gzipped(self):
+        page = HttpResponse(PAGE)
+        page['ETag'] = '"abc"'
+        response = self.respond(page)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), PAGE)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_uncompressed_when_not_accepted_small_or_binary(self):
+        cases = [
+            (HttpResponse(PAGE), 'identity'),
+            (HttpResponse(b'<p>oi</p>'), 'gzip'),
+            (HttpResponse(PAGE, content_type='image/png'), 'gzip'),
+            (HttpResponse(PAGE, headers={'Cache-Control': 'no-transform'}), 'gzip'),
+        ]
+        for page, accept in cases:
+            with self.subTest(content_type=page['Content-Type'], accept=accept):
+                response = self.respond(page, accept)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertIn(response.content, (PAGE, b'<p>oi</p>'))
+
+    def test_streaming_response_is_compressed_chunk_by_chunk(self):
+        chunks = [PAGE[i:i + 1000] for i in range(0, len(PAGE), 1000)]
+        response = self.respond(StreamingHttpResponse(iter(chunks)))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        compressed = list(response.streaming_content)
+        # Every chunk is flushed as it comes, not held until the end
+        self.assertGreater(len(compressed), len(chunks))
+        self.assertEqual(gzip.decompress(b''.join(compressed)), PAGE)
+
+    def test_page_with_a_csrf_token_is_padded(self):
+        response = self.respond(HttpResponse(PAGE), CSRF_COOKIE_NEEDS_UPDATE=False)
+
+        content = gzip.decompress(response.content)
+        self.assertTrue(content.startswith(PAGE))
+        self.assertTrue(content[len(PAGE):].startswith(b'<!-- '))
+        self.assertTrue(content.endswith(b' -->'))
+
+
+class AdmissionQueueTests(SimpleTestCase):
+
+    def test_full_class_sheds_without_a_queue(self):
+        queue = AdmissionQueue('search', limit=1, queue=0, timeout=1.0, retry_after=2)
+
+        self.assertEqual(queue.acquire(), 0.0)
+        self.assertIsNone(queue.acquire())
+        queue.release()
+        self.assertEqual(queue.acquire(), 0.0)
+        self.assertEqual(queue.metrics()['shed'], 1)
+        self.assertEqual(queue.metrics()['admitted'], 2)
+
+    def test_queued_request_times_out(self):
+        queue = AdmissionQueue('search', limit=1, queue=1, timeout=0.05, retry_after=2)
+        queue.acquire()
+
+        self.assertIsNone(queue.acquire())
+        self.assertEqual(queue.metrics()['waiting'], 0)
+
+    def test_queued_request_runs_when_a_slot_frees(self):
+        queue = AdmissionQueue('upload', limit=1, queue=1, timeout=5.0, retry_after=2)
+        queue.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(queue.acquire()))
+        waiter.start()
+        while not queue.metrics()['waiting']:
+            time.sleep(0.001)
+
+        # The queue is full: a third request is refused at once
+        self.assertIsNone(queue.acquire())
+        queue.release()
+        waiter.join()
+        self.assertIsNotNone(results[0])
+        self.assertEqual(queue.metrics()['active'], 1)
+
+
+class AdmissionControlMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        self.middleware.control = AdmissionControl(
+            {'search': {'limit': 1, 'queue': 0, 'retry_after': 3}},
+            {'contact:search': 'search'},
+        )
+        self.queue = self.middleware.control.queues['search']
+
+    def request(self, url):
+        request = RequestFactory().get(url)
+        request.resolver_match = resolve(url)
+        return request
+
+    def test_full_class_gets_503_with_retry_after(self):
+        self.queue.acquire()
+
+        request = self.request(reverse('contact:search'))
+        with self.assertLogs('project.middleware', 'WARNING'):
+            response = self.middleware.process_view(request, None, (), {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_slot_is_released_after_the_response(self):
+        request = self.request(reverse('contact:search'))
+        self.assertIsNone(self.middleware.process_view(request, None, (), {}))
+        self.assertEqual(self.queue.metrics()['active'], 1)
+
+        self.middleware(request)
+        self.assertEqual(self.queue.metrics()['active'], 0)
+
+    def test_unmapped_views_are_never_held_back(self):
+        self.queue.acquire()
+
+        request = self.request(reverse('contact:index'))
+        self.assertIsNone(self.middleware.process_view(request, None, (), {}))
+
+
+class CompressedManifestStaticFilesStorageTests(SimpleTestCase):
+
+    def test_collected_text_files_get_a_gzip_variant(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source, root = Path(directory.name) / 'source', Path(directory.name) / 'static'
+        source.mkdir()
+        (source / 'app.css').write_text('body { color: #123456; }\n' * 200)
+        (source / 'logo.png').write_bytes(b'\x89PNG' + os.urandom(500))
+
+        with override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={'staticfiles': {
+                'BACKEND': 'project.static.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+        paths = json.loads((root / 'staticfiles.json').read_text())['paths']
+        css = root / paths['app.css']
+        self.assertEqual(gzip.decompress(css.with_name(css.name + '.gz').read_bytes()),
+                         css.read_bytes())
+        # Binary files are left alone
+        self.assertEqual(list(root.glob('logo*.gz')), [])
+
+
+class StaticFilesMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        (root / 'app.0123456789ab.css').write_bytes(b'css')
+        (root / 'app.0123456789ab.css.gz').write_bytes(b'gz')
+        (root / 'app.0123456789ab.css.br').write_bytes(b'br')
+        (root / 'robots.txt').write_bytes(b'User-agent: *')
+        (root / 'staticfiles.json').write_text(
+            json.dumps({'paths': {'app.css': 'app.0123456789ab.css'}})
+        )
+        self.app = StaticFilesMiddleware(fallback, '/static/', root)
+
+    def get(self, path='/static/app.0123456789ab.css', accept='', **environ):
+        return call(self.app, path, HTTP_ACCEPT_ENCODING=accept, **environ)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, BR;q=0.5, deflate;q=0'), {'gzip', 'br'})
+        self.assertEqual(accepted_encodings('br; q=0.0'), set())
+
+    def test_brotli_then_gzip_then_identity(self):
+        cases = [
+            ('gzip, br', 'br', b'br'),
+            ('br;q=0, gzip', 'gzip', b'gz'),
+            ('deflate', None, b'css'),
+        ]
+        for accept, encoding, body in cases:
+            with self.subTest(accept=accept):
+                status, headers, content = self.get(accept=accept)
+                self.assertEqual((status, content), (200, body))
+                self.assertEqual(headers.get('Content-Encoding'), encoding)
+                self.assertEqual(headers['Content-Length'], str(len(body)))
+                self.assertEqual(headers['Vary'], 'Accept-Encoding')
+                self.assertEqual(headers['Content-Type'], 'text/css')
+
+    def test_hashed_names_are_immutable(self):
+        self.assertEqual(self.get()[1]['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+        _, headers, _ = self.get('/static/robots.txt')
+        self.assertEqual(headers['Cache-Control'], DEFAULT_CACHE_CONTROL)
+        self.assertNotIn('Vary', headers)
+
+    def test_not_modified_since(self):
+        _, headers, _ = self.get('/static/robots.txt')
+
+        status, _, content = self.get(
+            '/static/robots.txt', HTTP_IF_MODIFIED_SINCE=headers['Last-Modified'],
+        )
+        self.assertEqual((status, content), (304, b''))
+        status = self.get(
+            '/static/robots.txt', HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT',
+        )[0]
+        self.assertEqual(status, 200)
+
+    def test_other_requests_fall_through_to_the_application(self):
+        cases = [
+            ('/static/missing.css', 'GET'),
+            ('/static/app.0123456789ab.css.gz', 'GET'),
+            ('/static/app.0123456789ab.css', 'POST'),
+            ('/contact/', 'GET'),
+        ]
+        for path, method in cases:
+            with self.subTest(path=path, method=method):
+                self.assertEqual(self.get(path, REQUEST_METHOD=method)[2], b'app')
+
+    def test_head_sends_no_body(self):
+        status, headers, content = self.get(REQUEST_METHOD='HEAD')
+
+        self.assertEqual((status, content), (200, b''))
+        self.assertEqual(headers['Content-Length'], '3')
+
+class MediaFilesMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.picture = 'pictures/ab/cd/abcd' + '0' * 60 + '.png'
+        for name in (self.picture, '.uploads/upload-1.part', '.quarantine/x/velho.png'):
+            path = Path(media.name) / name
+            path.parent.mkdir(parents=True)
+            path.write_bytes(b'\x89PNG')
+        self.app = MediaFilesMiddleware(fallback, '/media/', media.name)
+
+    def test_hashed_picture_is_served_as_immutable(self):
+        status, headers, body = call(self.app, '/media/' + self.picture)
+
+        self.assertEqual((status, body), (200, b'\x89PNG'))
+        self.assertEqual(headers['Content-Type'], 'image/png')
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_dot_directories_are_never_served(self):
+        for path in (
+            '/media/.uploads/upload-1.part',
+            '/media/.quarantine/x/velho.png',
+            '/media/pictures/../.uploads/upload-1.part',
+            '/media/pictures/ab/../../.quarantine/x/velho.png',
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(call(self.app, path)[0], 404)
+
+
+def hello(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ola']
+
+
+class WorkerServerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.listener = bind_socket('127.0.0.1:0', 16)
+        self.listener.setblocking(False)
+        self.addCleanup(self.listener.close)
+        self.port = self.listener.getsockname()[1]
+
+    def start(self, *argv):
+        server = WorkerServer(self.listener, hello, parse_args(['--threads', '1', *argv]))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def get(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        self.addCleanup(connection.close)
+        connection.request('GET', '/')
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_requests_are_served_and_counted(self):
+        server = self.start('--max-requests', '0')
+
+        self.assertEqual(self.get(), (200, b'ola'))
+        self.assertEqual(self.get(), (200, b'ola'))
+        server.stop(5)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(server.limit.active, 0)
+
+    def test_busy_worker_leaves_connections_in_the_listen_queue(self):
+        server = WorkerServer(self.listener, hello, parse_args(['--threads', '1']))
+        server.limit.acquire()
+        results = []
+
+        def accept():
+            try:
+                results.append(server.get_request())
+            except BlockingIOError as error:
+                results.append(error)
+
+        waiter = threading.Thread(target=accept)
+        waiter.start()
+        client = socket.create_connection(('127.0.0.1', self.port))
+        self.addCleanup(client.close)
+
+        # Still in the listen queue, for another worker to take
+        self.assertTrue(select.select([self.listener], [], [], 5)[0])
+        connection, _ = self.listener.accept()
+        connection.close()
+        self.assertEqual(results, [])
+
+        server.limit.release()
+        waiter.join(5)
+        # Nothing left to accept: the thread it took is given back
+        self.assertIsInstance(results[0], BlockingIOError)
+        self.assertEqual(server.limit.active, 0)
+
+    def test_worker_retires_after_max_requests(self):
+        server = self.start('--max-requests', '2', '--max-requests-jitter', '0')
+
+        self.get()
+        self.get()
+        deadline = time.monotonic() + 5
+        while not server.retiring and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(server.retiring)
+
+
+class ServerSizingTests(SimpleTestCase):
+
+    def test_resized_limit_lets_a_waiting_thread_in(self):
+        limit = ConcurrencyLimit(1)
+        limit.acquire()
+        waiter = threading.Thread(target=limit.acquire)
+        waiter.start()
+
+        limit.resize(2)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(limit.active, 2)
+
+    @mock.patch('project.server.usable_cpus', return_value=8)
+    @mock.patch('project.server.available_memory', return_value=3 * 1024 ** 3)
+    def test_default_workers_fit_in_memory(self, available_memory, usable_cpus):
+        self.assertEqual(default_workers(1024 ** 3), 3)
+        self.assertEqual(default_workers(0), 8)
+        self.assertEqual(default_workers(8 * 1024 ** 3), 1)
+
+    def test_exit_code_of_a_failed_worker_is_logged(self):
+        arbiter = Arbiter(parse_args([]), None, None)
+        pid = os.fork()
+        if pid == 0:
+            os._exit(3)
+        arbiter.workers.add(pid)
+
+        with self.assertLogs('project.server', 'WARNING') as logs:
+            while arbiter.workers:
+                arbiter.reap_workers()
+                time.sleep(0.01)
+        self.assertIn(f'Worker {pid} exited with status 3', logs.output[0])
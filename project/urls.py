@@ -19,6 +19,9 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+# Registers the ModelAdmins (see SimpleAdminConfig in INSTALLED_APPS)
+admin.autodiscover()
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('contact.urls')),
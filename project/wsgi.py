@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.PRODUCTION:
+    # Serve static files and uploads without a web server
+    from project.static import MediaFilesMiddleware, StaticFilesMiddleware
+
+    application = StaticFilesMiddleware(
+        application, settings.STATIC_URL, settings.STATIC_ROOT
+    )
+    application = MediaFilesMiddleware(
+        application, settings.MEDIA_URL, settings.MEDIA_ROOT
+    )
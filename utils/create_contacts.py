@@ -21,7 +21,9 @@ django.setup()
 if __name__ == "__main__":
     import faker
 
+    from contact.caching import bump_listing_generation
     from contact.models import Category, Contact
+    from contact.sharding import assign_ids
 
     Contact.objects.all().delete()
     Category.objects.all().delete()
@@ -57,4 +59,8 @@ if __name__ == "__main__":
             )
         )
     if len(django_contacts) > 0:
-        Contact.objects.bulk_create(django_contacts)
\ No newline at end of file
+        # Contacts without owner live in the default database
+        assign_ids(django_contacts)
+        Contact.objects.bulk_create(django_contacts)
+        # bulk_create does not send post_save, so invalidate the listings here
+        bump_listing_generation()
\ No newline at end of file